@@ -0,0 +1,82 @@
+"""
+Bloom filter over 48-bit MAC addresses.
+
+A Bloom filter answers "is this MAC possibly in the set?" from a bit array: a "no" is
+always right, a "yes" is wrong at most error_rate of the time. At 1% it needs about
+1.2 bytes per MAC, so 100,000 MACs fit in ~120 KB, small enough for every worker.
+"""
+import math
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(value):
+    """splitmix64 finalizer: spreads the bits of a 64-bit integer."""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class BloomFilter:
+    """
+    Bloom filter of integers (MAC addresses as returned by mac_to_int).
+
+    Bit positions come from double hashing two mixes of the value, which is as good
+    as k independent hashes for this purpose and much cheaper in Python.
+
+    Args:
+        capacity: Number of values the filter is sized for
+        error_rate: False-positive rate at capacity
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, int(capacity))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        h1 = _mix(value)
+        h2 = _mix(value ^ 0x5DEECE66D) | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def add(self, value):
+        """Add value; count only grows for values that weren't (apparently) in the filter yet."""
+        bits = self.bits
+        new = False
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value):
+        bits = self.bits
+        for position in self._positions(value):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "bytes": self.size_bytes,
+            "hashes": self.num_hashes,
+            "error_rate": self.error_rate
+        }
@@ -0,0 +1,443 @@
+import hashlib
+import json
+import logging
+import os
+import stat
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _private_dir(path):
+    """
+    Create path as a directory only its owner can use, or tighten an existing one.
+
+    Returns False if path is a symlink, not a directory, or owned by another user: files
+    in it could have been planted and can't be trusted as cache entries.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        return False
+    if hasattr(os, 'getuid'):
+        if info.st_uid != os.getuid():
+            return False
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return True
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a time-to-live.
+
+    Each entry can carry its own TTL, which lets callers keep short-lived
+    negative results ("not found") next to longer-lived positive ones.
+
+    Args:
+        maxsize: Maximum number of entries kept before the least recently used is evicted
+        ttl: Default time-to-live in seconds for new entries
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, expiring after ttl seconds (defaults to the cache TTL)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop key from the cache if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Return a dictionary with size, hit and miss counters for the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0
+            }
+
+
+def _encode(value):
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def _decode(data):
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class _TieredEntry:
+    __slots__ = ("data", "compressed", "expires_at", "version", "stored_at")
+
+    def __init__(self, data, compressed, expires_at, version, stored_at):
+        self.data = data
+        self.compressed = compressed
+        self.expires_at = expires_at
+        self.version = version
+        self.stored_at = stored_at
+
+
+class TieredCache:
+    """
+    Byte-budgeted LRU cache for large JSON-serializable values, with a disk tier.
+
+    Values are stored serialized, so their size is known exactly and every get()
+    returns a fresh copy the caller may modify. The most recently used entries are
+    kept as plain JSON, up to hot_fraction of the memory budget; older ones are
+    compressed. When the memory budget is exceeded the least recently used entries
+    are written to spill_dir, which has its own budget, and read back from there on
+    the next hit. Expiry times are wall-clock, so spilled files stay valid across
+    processes sharing spill_dir.
+
+    Every entry also records a version (a hash of its serialized value) and the time it
+    was stored, which version() returns without decoding the value, so callers can
+    tell whether a value changed without paying for reading it.
+
+    Decompressing and reading spilled files happen without the lock held, so every
+    set() and invalidate() bumps the key's write generation; a value read before a
+    write is returned to its caller but never put back into the cache.
+
+    Args:
+        memory_budget: Bytes of serialized data kept in memory
+        ttl: Seconds an entry stays valid
+        spill_dir: Directory for entries evicted from memory, or None to drop them. It is
+                   created (or tightened) to mode 0700; the disk tier is disabled if it
+                   belongs to another user
+        disk_budget: Bytes of spilled data this process keeps in spill_dir
+        hot_fraction: Share of memory_budget kept uncompressed
+    """
+
+    def __init__(self, memory_budget=64 * 1024 * 1024, ttl=60, spill_dir=None,
+                 disk_budget=512 * 1024 * 1024, hot_fraction=0.5):
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        if spill_dir:
+            try:
+                if not _private_dir(spill_dir):
+                    logger.warning("Not spilling cache entries to %s: not a private directory of this user", spill_dir)
+                    spill_dir = None
+            except OSError as e:
+                logger.warning("Not spilling cache entries to %s: %s", spill_dir, e)
+                spill_dir = None
+        self.spill_dir = spill_dir
+        self.disk_budget = disk_budget if spill_dir else 0
+        self.hot_budget = int(memory_budget * hot_fraction)
+        self._entries = OrderedDict()
+        self._disk = OrderedDict()
+        # Write generation per key; keys never written since the last clear() share one
+        self._generations = {}
+        self._write_count = 0
+        self._clear_count = 0
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.hot_bytes = 0
+        self.disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.compressions = 0
+        self.spills = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.spill_dir, hashlib.sha1(str(key).encode()).hexdigest() + ".json.z")
+
+    def _add(self, key, entry):
+        self._entries[key] = entry
+        self.memory_bytes += len(entry.data)
+        if not entry.compressed:
+            self.hot_bytes += len(entry.data)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= len(entry.data)
+            if not entry.compressed:
+                self.hot_bytes -= len(entry.data)
+        return entry
+
+    def _generation(self, key):
+        return self._generations.get(key, -self._clear_count)
+
+    def _written(self, key):
+        """Record a set() or invalidate() of key and forget its spilled file; the caller unlinks it."""
+        self._write_count += 1
+        self._generations[key] = self._write_count
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self.disk_bytes -= size
+
+    def _rebalance(self):
+        """Compress cold entries, then spill or drop the least recently used until within budget."""
+        if self.hot_bytes > self.hot_budget:
+            for entry in self._entries.values():
+                if self.hot_bytes <= self.hot_budget:
+                    break
+                if entry.compressed:
+                    continue
+                compressed = zlib.compress(entry.data, 1)
+                self.hot_bytes -= len(entry.data)
+                self.memory_bytes -= len(entry.data) - len(compressed)
+                entry.data = compressed
+                entry.compressed = True
+                self.compressions += 1
+
+        spilled = []
+        while self.memory_bytes > self.memory_budget and self._entries:
+            key = next(iter(self._entries))
+            entry = self._remove(key)
+            if self.disk_budget and entry.expires_at > time.time():
+                spilled.append((key, entry, self._generation(key)))
+            else:
+                self.evictions += 1
+        return spilled
+
+    def _spill(self, spilled):
+        """Write evicted entries to spill_dir. Runs without the lock held."""
+        for key, entry, generation in spilled:
+            data = entry.data if entry.compressed else zlib.compress(entry.data, 1)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+                    f.write(f"{entry.expires_at} {entry.stored_at} {entry.version}\n".encode())
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError:
+                self.evictions += 1
+                continue
+
+            removed = []
+            with self._lock:
+                if self._generation(key) != generation:
+                    # Set or invalidated while the file was being written, so the file is stale
+                    self.evictions += 1
+                    removed.append(key)
+                else:
+                    old_size = self._disk.pop(key, None)
+                    if old_size is not None:
+                        self.disk_bytes -= old_size
+                    self._disk[key] = len(data)
+                    self.disk_bytes += len(data)
+                    self.spills += 1
+                    while self.disk_bytes > self.disk_budget and self._disk:
+                        old_key, old_size = self._disk.popitem(last=False)
+                        self.disk_bytes -= old_size
+                        self.evictions += 1
+                        removed.append(old_key)
+            for old_key in removed:
+                self._unlink(old_key)
+
+    def _unlink(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _read_spilled(self, key, header_only=False):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, stored_at, version = f.readline().decode().split()
+                expires_at, stored_at = float(expires_at), float(stored_at)
+                data = None if header_only else f.read()
+        except (OSError, ValueError):
+            return None
+        if expires_at <= time.time():
+            return None
+        return _TieredEntry(data, True, expires_at, version, stored_at)
+
+    def get(self, key, default=None):
+        """Return a copy of the cached value for key, or default if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                # _rebalance() compresses entries in place, so read both fields together
+                data, compressed = entry.data, entry.compressed
+            generation = self._generation(key)
+
+        from_disk = False
+        if entry is None and self.spill_dir:
+            entry = self._read_spilled(key)
+            with self._lock:
+                if entry is not None:
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+            if entry is not None:
+                data, compressed, from_disk = entry.data, True, True
+        elif entry is None:
+            with self._lock:
+                self.misses += 1
+
+        if entry is None:
+            return default
+
+        if compressed:
+            data = zlib.decompress(data)
+            # Promote to the hot tier unless the key was set or invalidated meanwhile; the
+            # disk copy stays until it expires or is evicted
+            spilled = []
+            with self._lock:
+                if from_disk:
+                    current = key not in self._entries and self._generation(key) == generation
+                else:
+                    current = self._entries.get(key) is entry
+                if current:
+                    self._remove(key)
+                    self._add(key, _TieredEntry(data, False, entry.expires_at, entry.version, entry.stored_at))
+                    spilled = self._rebalance()
+            self._spill(spilled)
+        return _decode(data)
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, expiring after ttl seconds (defaults to the cache TTL)."""
+        data = _encode(value)
+        now = time.time()
+        entry = _TieredEntry(
+            data, False, now + (self.ttl if ttl is None else ttl),
+            hashlib.blake2b(data, digest_size=16).hexdigest(), now
+        )
+        with self._lock:
+            self._remove(key)
+            self._written(key)
+            self._add(key, entry)
+            spilled = self._rebalance()
+        if self.spill_dir:
+            # An older spilled copy would outlive this value once it is evicted
+            self._unlink(key)
+        self._spill(spilled)
+
+    def version(self, key):
+        """
+        Return (version, stored_at) of the value cached for key, or None if there is none.
+
+        version changes whenever the value does; stored_at is the wall-clock time it was
+        set. Neither the value nor the hit counters are touched.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.time():
+                return entry.version, entry.stored_at
+        if self.spill_dir:
+            entry = self._read_spilled(key, header_only=True)
+            if entry is not None:
+                return entry.version, entry.stored_at
+        return None
+
+    def invalidate(self, key):
+        """Drop key from memory and from spill_dir."""
+        with self._lock:
+            self._remove(key)
+            self._written(key)
+        if self.spill_dir:
+            self._unlink(key)
+
+    def clear(self):
+        """Drop every entry, including this process's spilled files, and reset the counters."""
+        with self._lock:
+            keys = list(self._disk)
+            self._entries.clear()
+            self._disk.clear()
+            self._generations.clear()
+            self._clear_count += 1
+            self.memory_bytes = self.hot_bytes = self.disk_bytes = 0
+            self.memory_hits = self.disk_hits = self.misses = 0
+            self.compressions = self.spills = self.evictions = 0
+        for key in keys:
+            self._unlink(key)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """Return sizes per tier, budgets and hit counters; hits counts both tiers."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "compressed": sum(1 for entry in self._entries.values() if entry.compressed),
+                "memory_bytes": self.memory_bytes,
+                "memory_budget": self.memory_budget,
+                "hot_bytes": self.hot_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self.disk_bytes,
+                "disk_budget": self.disk_budget,
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "compressions": self.compressions,
+                "spills": self.spills,
+                "evictions": self.evictions,
+                "hit_ratio": (hits / lookups) if lookups else 0.0
+            }
@@ -1,11 +1,169 @@
 import os
+import re
 import requests
 import json
+import logging
 import datetime
+import contextvars
+import threading
+import time
+import tempfile
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from api.cache import TieredCache, TTLCache
+from api.shared_cache import get_shared_cache
+from api.session import add_write_listener, get_session
+from api.mpsk import generate_mpsk_batch, get_mpsk_pool
+from api.metrics import CLEARPASS_TOKEN_REFRESHES, add_cache_collector
+from api.tracing import start_span, end_span, traced
+from api.logs import lazy_json, lazy_body, sampled
+from api.profiler import phase
 
-def get_clearpass_token():
-    """Get an OAuth token from ClearPass."""
+logger = logging.getLogger(__name__)
+
+# Valid values for an endpoint's status field in ClearPass
+ENDPOINT_STATUSES = ("Known", "Unknown", "Disabled")
+
+# OAuth token shared by all calls until shortly before it expires
+_token_cache = {"access_token": None, "expires_at": 0}
+_token_lock = threading.Lock()
+
+# Refresh tokens this many seconds before ClearPass says they expire
+TOKEN_EXPIRY_MARGIN = 60
+
+# Longest a worker waits for another worker to finish refreshing the shared token
+SHARED_TOKEN_WAIT = 10
+
+# Index of the API path that worked last, per find_api_endpoint path list
+_discovered_paths = {}
+
+# API paths rarely move, so discovery results are shared between workers for a day
+DISCOVERY_TTL = 86400
+
+# Cache for get_endpoint results, created on first use so the .env file is loaded first
+_endpoint_cache = None
+_endpoint_cache_negative_ttl = 30
+_endpoint_cache_lock = threading.Lock()
+
+def get_endpoint_cache():
+    """
+    Return the shared cache used by get_endpoint.
+    
+    Sizes and TTLs are read from ENDPOINT_CACHE_SIZE, ENDPOINT_CACHE_TTL and
+    ENDPOINT_CACHE_NEGATIVE_TTL (seconds) the first time the cache is needed.
+    """
+    global _endpoint_cache, _endpoint_cache_negative_ttl
+    
+    if _endpoint_cache is None:
+        with _endpoint_cache_lock:
+            if _endpoint_cache is None:
+                _endpoint_cache_negative_ttl = float(os.getenv("ENDPOINT_CACHE_NEGATIVE_TTL", "30"))
+                _endpoint_cache = TTLCache(
+                    maxsize=int(os.getenv("ENDPOINT_CACHE_SIZE", "4096")),
+                    ttl=float(os.getenv("ENDPOINT_CACHE_TTL", "300"))
+                )
+    
+    return _endpoint_cache
+
+add_cache_collector("endpoint", lambda: get_endpoint_cache().stats())
+
+def invalidate_endpoint_cache(mac_address):
+    """Drop any cached get_endpoint result for the given MAC address."""
+    mac = mac_address.replace(':', '').replace('-', '').replace('.', '').lower()
+    get_endpoint_cache().invalidate(mac)
+
+# Cache for get_static_host_list_details results, created on first use
+_list_cache = None
+_list_cache_lock = threading.Lock()
+
+def _default_list_cache_dir():
+    user = os.getuid() if hasattr(os, 'getuid') else os.getenv("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), f"cpass-web-list-cache-{user}")
+
+def get_list_cache():
+    """
+    Return the shared cache of static host list payloads.
+    
+    Budgets and TTL are read from LIST_CACHE_MEMORY_MB (default 64), LIST_CACHE_DISK_MB
+    (default 512, 0 disables the disk tier), LIST_CACHE_DIR (default a per-user directory
+    under the system temp directory, kept private to the user) and LIST_CACHE_TTL
+    (seconds, default 60) the first time the cache is needed.
+    """
+    global _list_cache
+    
+    if _list_cache is None:
+        with _list_cache_lock:
+            if _list_cache is None:
+                disk_mb = float(os.getenv("LIST_CACHE_DISK_MB", "512"))
+                _list_cache = TieredCache(
+                    memory_budget=int(float(os.getenv("LIST_CACHE_MEMORY_MB", "64")) * 1024 * 1024),
+                    ttl=float(os.getenv("LIST_CACHE_TTL", "60")),
+                    spill_dir=(os.getenv("LIST_CACHE_DIR") or _default_list_cache_dir()) if disk_mb > 0 else None,
+                    disk_budget=int(disk_mb * 1024 * 1024)
+                )
+    
+    return _list_cache
+
+add_cache_collector("static_host_list", lambda: _list_cache.stats() if _list_cache is not None else None)
+
+def reset_clearpass_state():
+    """
+    Forget the cached OAuth token, endpoint lookups and list payloads and replace their locks.
+    
+    Called once in each freshly forked worker, before it serves requests, so workers
+    don't share state (or a lock held at fork time) with the parent process.
+    """
+    global _token_lock, _endpoint_cache, _endpoint_cache_lock, _list_cache, _list_cache_lock
+    
+    _token_lock = threading.Lock()
+    _token_cache["access_token"] = None
+    _token_cache["expires_at"] = 0
+    
+    _endpoint_cache_lock = threading.Lock()
+    _endpoint_cache = None
+    
+    _list_cache_lock = threading.Lock()
+    _list_cache = None
+
+def _use_token(access_token, expires_at):
+    """Cache a token in this process until expires_at (wall-clock time)."""
+    _token_cache["access_token"] = access_token
+    _token_cache["expires_at"] = time.monotonic() + max(0, expires_at - time.time())
+
+def _shared_token(shared):
+    """Adopt the token another worker stored in the shared cache, if it is still valid."""
+    entry = shared.get("clearpass_token")
+    if entry and entry["expires_at"] > time.time():
+        _use_token(entry["access_token"], entry["expires_at"])
+        return entry["access_token"]
+    return None
+
+def get_clearpass_token(force_refresh=False):
+    """
+    Get an OAuth token from ClearPass.
+    
+    The token is reused across calls and threads until shortly before it expires,
+    so most callers don't pay for an OAuth round trip. With SHARED_CACHE_PATH set it
+    is also shared with the other workers on the host, and only one of them fetches
+    a new token when it runs out.
+    
+    Args:
+        force_refresh: Request a new token even if the cached one is still valid
+        
+    Returns:
+        The access token string
+    """
+    if not force_refresh:
+        cached_token = _token_cache["access_token"]
+        if cached_token and time.monotonic() < _token_cache["expires_at"]:
+            return cached_token
+    
+    shared = get_shared_cache()
+    if shared and not force_refresh:
+        shared_token = _shared_token(shared)
+        if shared_token:
+            return shared_token
+    
     client_id = os.getenv("CLEARPASS_CLIENT_ID")
     client_secret = os.getenv("CLEARPASS_CLIENT_SECRET")
     base_url = os.getenv("CLEARPASS_BASE_URL")
@@ -30,33 +188,82 @@ def get_clearpass_token():
         "client_secret": client_secret
     }
     
-    try:
-        # Make the request to get the token
-        response = requests.post(
-            token_url, 
-            json=oauth_data,
-            verify=False  # Set to True in production with valid certificates
-        )
-        
-        # Check if request was successful
-        response.raise_for_status()
+    with _token_lock:
+        # Another thread may have refreshed the token while we waited for the lock
+        if not force_refresh:
+            cached_token = _token_cache["access_token"]
+            if cached_token and time.monotonic() < _token_cache["expires_at"]:
+                return cached_token
         
-        # Parse response JSON
-        token_data = response.json()
+        # Let one worker refresh the shared token while the others wait for it
+        lease_owner = str(os.getpid())
+        if shared and not force_refresh and not shared.acquire_lease("token_refresh", lease_owner, SHARED_TOKEN_WAIT):
+            deadline = time.monotonic() + SHARED_TOKEN_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                shared_token = _shared_token(shared)
+                if shared_token:
+                    return shared_token
+            logger.warning("Timed out waiting for another worker to refresh the token")
         
-        if 'access_token' not in token_data:
-            raise ValueError("No access token in response")
+        try:
+            # Make the request to get the token
+            with phase("token_fetch"):
+                response = get_session().post(
+                    token_url, 
+                    json=oauth_data,
+                    verify=False  # Set to True in production with valid certificates
+                )
             
-        return token_data['access_token']
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error getting token: {e}")
-        raise
+            # Check if request was successful
+            response.raise_for_status()
+            
+            # Parse response JSON
+            token_data = response.json()
+            
+            if 'access_token' not in token_data:
+                raise ValueError("No access token in response")
+            
+            CLEARPASS_TOKEN_REFRESHES.inc()
+            
+            # ClearPass reports the lifetime in seconds; don't cache tokens without one
+            expires_in = int(token_data.get('expires_in') or 0)
+            lifetime = max(0, expires_in - TOKEN_EXPIRY_MARGIN)
+            _use_token(token_data['access_token'], time.time() + lifetime)
+            
+            if shared and lifetime > 0:
+                shared.set(
+                    "clearpass_token",
+                    {"access_token": token_data['access_token'], "expires_at": time.time() + lifetime},
+                    ttl=lifetime
+                )
+                
+            return token_data['access_token']
+            
+        except requests.exceptions.RequestException as e:
+            logger.warning("Error getting token: %s", e)
+            raise
+        finally:
+            if shared:
+                shared.release_lease("token_refresh", lease_owner)
 
-def add_endpoint(mac_address):
-    """Add a new endpoint to ClearPass using the provided MAC address."""
+def add_endpoint(mac_address, status="Known", description="Added via Web App", attributes=None, token=None):
+    """
+    Add a new endpoint to ClearPass using the provided MAC address.
+    
+    Args:
+        mac_address: The MAC address of the endpoint
+        status: Endpoint status, one of ENDPOINT_STATUSES (defaults to "Known")
+        description: Description stored on the endpoint
+        attributes: Optional dictionary of endpoint attributes
+        token: Optional OAuth token to reuse instead of requesting a new one
+        
+    Returns:
+        The response data from the API
+    """
     # Get OAuth token
-    token = get_clearpass_token()
+    if not token:
+        token = get_clearpass_token()
     
     # Get base URL from environment variable
     base_url = os.getenv("CLEARPASS_BASE_URL")
@@ -75,10 +282,13 @@ def add_endpoint(mac_address):
     # Endpoint data with required parameters
     endpoint_data = {
         "mac_address": formatted_mac,
-        "status": "Known",
-        "description": "Added via Web App"
+        "status": status,
+        "description": description
     }
     
+    if attributes:
+        endpoint_data["attributes"] = attributes
+    
     # The correct endpoint URL
     endpoint_url = f"{base_url}/endpoint"
     
@@ -91,7 +301,7 @@ def add_endpoint(mac_address):
     
     try:
         # Make the request to create the endpoint
-        response = requests.post(
+        response = get_session().post(
             endpoint_url,
             json=endpoint_data,
             headers=headers,
@@ -113,18 +323,113 @@ def add_endpoint(mac_address):
         except:
             error_detail = e.response.text if e.response.text else str(e)
             
-        print(f"HTTP Error: {e}, Detail: {error_detail}")
+        logger.warning("HTTP Error: %s, Detail: %s", e, error_detail)
         raise
         
     except requests.exceptions.RequestException as e:
-        print(f"Error adding endpoint: {e}")
+        logger.warning("Error adding endpoint: %s", e)
         raise
+
+def create_endpoints_bulk(endpoints, skip_existing=False, max_workers=None):
+    """
+    Create many endpoints concurrently over the shared session.
+    
+    Args:
+        endpoints: List of dictionaries with "mac_address" and optional "status",
+                   "description" and "attributes" keys (already validated)
+        skip_existing: If True, skip MACs that already exist in ClearPass. The check
+                       goes through get_endpoint, so cached lookups cost nothing.
+        max_workers: Maximum number of concurrent ClearPass requests
+                     (defaults to BULK_CREATE_WORKERS or 8)
         
-def get_endpoint(mac_address):
-    """Get endpoint details from ClearPass using the provided MAC address."""
-    # Get OAuth token
+    Returns:
+        A list of per-item outcome dictionaries, in input order, each with
+        "mac_address", "status" ("created", "skipped" or "failed") and "message" keys
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv("BULK_CREATE_WORKERS", "8"))
+    
+    # One token for the whole batch instead of one per endpoint
     token = get_clearpass_token()
     
+    def create_one(item):
+        mac = item["mac_address"].replace(':', '').replace('-', '').replace('.', '')
+        formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
+        
+        try:
+            if skip_existing:
+                existing = get_endpoint(formatted_mac, token=token)
+                if existing["data"]:
+                    return {
+                        "mac_address": formatted_mac,
+                        "status": "skipped",
+                        "message": "Endpoint already exists"
+                    }
+            
+            data = add_endpoint(
+                formatted_mac,
+                status=item.get("status") or "Known",
+                description=item.get("description") or "Added via Web App",
+                attributes=item.get("attributes"),
+                token=token
+            )
+            return {
+                "mac_address": formatted_mac,
+                "status": "created",
+                "message": "Endpoint added successfully",
+                "data": data
+            }
+        except requests.exceptions.HTTPError as e:
+            error_detail = ""
+            try:
+                error_detail = e.response.json()
+            except:
+                error_detail = e.response.text if e.response is not None else ""
+            return {
+                "mac_address": formatted_mac,
+                "status": "failed",
+                "message": f"Failed to add endpoint: {str(e)}",
+                "details": error_detail
+            }
+        except Exception as e:
+            return {
+                "mac_address": formatted_mac,
+                "status": "failed",
+                "message": f"Failed to add endpoint: {str(e)}"
+            }
+    
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Run each item in a copy of our context so per-request accounting sees it
+        futures = [executor.submit(contextvars.copy_context().run, create_one, item) for item in endpoints]
+        return [future.result() for future in futures]
+
+def get_endpoint(mac_address, use_cache=True, token=None):
+    """
+    Get endpoint details from ClearPass using the provided MAC address.
+    
+    Results are cached per normalized MAC address. "Not found" results are cached
+    as well, but for a shorter time (ENDPOINT_CACHE_NEGATIVE_TTL).
+    
+    Args:
+        mac_address: The MAC address to look up
+        use_cache: Set to False to bypass the cache and always ask ClearPass
+        token: Optional OAuth token to reuse instead of requesting a new one
+        
+    Returns:
+        A dictionary with "message" and "data" keys
+    """
+    cache = get_endpoint_cache()
+    cache_key = mac_address.replace(':', '').replace('-', '').replace('.', '').lower()
+    
+    if use_cache:
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+    
+    # Get OAuth token
+    if not token:
+        token = get_clearpass_token()
+    
     # Get base URL from environment variable
     base_url = os.getenv("CLEARPASS_BASE_URL")
     base_url = base_url.rstrip('/')
@@ -153,12 +458,18 @@ def get_endpoint(mac_address):
     
     try:
         # Make the request to get the endpoint
-        response = requests.get(
+        response = get_session().get(
             endpoint_url,
             headers=headers,
             verify=False  # Set to True in production with valid certificates
         )
         
+        # A 404 means ClearPass has no such endpoint - cache it like an empty result
+        if response.status_code == 404:
+            result = {"message": "No endpoint found with this MAC address", "data": {}}
+            cache.set(cache_key, result, ttl=_endpoint_cache_negative_ttl)
+            return result
+        
         # Check if request was successful
         response.raise_for_status()
         
@@ -167,11 +478,15 @@ def get_endpoint(mac_address):
         
         # Return empty data if no endpoint found
         if not response_data.get('_embedded') or not response_data.get('_embedded').get('items'):
-            return {"message": "No endpoint found with this MAC address", "data": {}}
+            result = {"message": "No endpoint found with this MAC address", "data": {}}
+            cache.set(cache_key, result, ttl=_endpoint_cache_negative_ttl)
+            return result
             
         # Return the first matching endpoint
         endpoint_data = response_data.get('_embedded').get('items')[0]
-        return {"message": "Endpoint found", "data": endpoint_data}
+        result = {"message": "Endpoint found", "data": endpoint_data}
+        cache.set(cache_key, result)
+        return result
         
     except requests.exceptions.HTTPError as e:
         # If we get an HTTP error, try to parse the response body for more details
@@ -182,15 +497,117 @@ def get_endpoint(mac_address):
         except:
             error_detail = e.response.text if e.response.text else str(e)
             
-        print(f"HTTP Error: {e}, Detail: {error_detail}")
+        logger.warning("HTTP Error: %s, Detail: %s", e, error_detail)
         raise
         
     except requests.exceptions.RequestException as e:
-        print(f"Error getting endpoint: {e}")
+        logger.warning("Error getting endpoint: %s", e)
         raise
 
+def lookup_endpoints(mac_addresses, max_workers=None):
+    """
+    Look up many endpoints concurrently.
+    
+    Cached results are yielded straight away; the remaining MAC addresses are resolved
+    through get_endpoint on a bounded thread pool sharing a single OAuth token.
+    Results are yielded in completion order, once per distinct MAC address.
+    
+    Args:
+        mac_addresses: Iterable of MAC addresses (any common separator format)
+        max_workers: Maximum number of concurrent ClearPass requests
+                     (defaults to BULK_LOOKUP_WORKERS or 8)
+        
+    Yields:
+        Dictionaries with "mac_address", "found", "cached", "message" and "data" keys,
+        or "mac_address" and "error" keys if the lookup failed
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv("BULK_LOOKUP_WORKERS", "8"))
+    
+    cache = get_endpoint_cache()
+    pending = []
+    seen = set()
+    
+    for mac_address in mac_addresses:
+        mac = mac_address.replace(':', '').replace('-', '').replace('.', '').lower()
+        if mac in seen:
+            continue
+        seen.add(mac)
+        
+        formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
+        
+        # Serve hits from the cache without touching the thread pool
+        cached_result = cache.get(mac)
+        if cached_result is not None:
+            yield {
+                "mac_address": formatted_mac,
+                "found": bool(cached_result["data"]),
+                "cached": True,
+                "message": cached_result["message"],
+                "data": cached_result["data"]
+            }
+        else:
+            pending.append(formatted_mac)
+    
+    if not pending:
+        return
+    
+    # One token for the whole batch instead of one per MAC
+    token = get_clearpass_token()
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        # Run each lookup in a copy of our context so per-request accounting sees it
+        futures = {
+            executor.submit(contextvars.copy_context().run, get_endpoint, formatted_mac, False, token): formatted_mac
+            for formatted_mac in pending
+        }
+        
+        for future in as_completed(futures):
+            formatted_mac = futures[future]
+            try:
+                result = future.result()
+                yield {
+                    "mac_address": formatted_mac,
+                    "found": bool(result["data"]),
+                    "cached": False,
+                    "message": result["message"],
+                    "data": result["data"]
+                }
+            except Exception as e:
+                yield {
+                    "mac_address": formatted_mac,
+                    "error": str(e)
+                }
+    finally:
+        # Don't keep hitting ClearPass if the consumer went away
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _discovery_key(base_paths):
+    """Key identifying a list of candidate paths independently of IDs and query strings."""
+    return '|'.join(re.sub(r'\d+', '{id}', path.split('?', 1)[0]) for path in base_paths)
+
 def find_api_endpoint(token, base_paths):
-    """Try multiple API paths to find the correct one."""
+    """
+    Try multiple API paths to find the correct one.
+    
+    The index of the path that worked is remembered per list of candidate paths (and
+    shared with other workers through the shared cache, if configured), so later calls
+    try it first instead of walking through the paths that don't exist.
+    """
+    discovery_key = _discovery_key(base_paths)
+    preferred = _discovered_paths.get(discovery_key)
+    shared = get_shared_cache()
+    if preferred is None and shared:
+        preferred = shared.get(f"discovery:{discovery_key}")
+        if preferred is not None:
+            _discovered_paths[discovery_key] = preferred
+    
+    order = list(range(len(base_paths)))
+    if preferred is not None and 0 < preferred < len(base_paths):
+        order.remove(preferred)
+        order.insert(0, preferred)
+    
     base_url = os.getenv("CLEARPASS_BASE_URL")
     base_url = base_url.rstrip('/')
     
@@ -204,25 +621,32 @@ def find_api_endpoint(token, base_paths):
         "Accept": "application/json"
     }
     
-    # Try each path
-    for path in base_paths:
+    # Try each path, the one that worked last time first
+    for index in order:
+        path = base_paths[index]
         try:
             full_url = f"{base_url}/{path}"
-            print(f"Trying API path: {full_url}")
+            logger.debug("Trying API path: %s", full_url)
             
-            response = requests.get(
-                full_url,
-                headers=headers,
-                verify=False  # Set to True in production with valid certificates
-            )
+            with phase("list_download"):
+                response = get_session().get(
+                    full_url,
+                    headers=headers,
+                    verify=False  # Set to True in production with valid certificates
+                )
             
             if response.status_code == 200:
-                print(f"Success! Found working API path: {full_url}")
-                return full_url, response.json()
+                logger.debug("Success! Found working API path: %s", full_url)
+                if _discovered_paths.get(discovery_key) != index:
+                    _discovered_paths[discovery_key] = index
+                    if shared:
+                        shared.set(f"discovery:{discovery_key}", index, ttl=DISCOVERY_TTL)
+                with phase("json_parse"):
+                    return full_url, response.json()
             else:
-                print(f"Path returned {response.status_code}: {full_url}")
+                logger.debug("Path returned %s: %s", response.status_code, full_url)
         except Exception as e:
-            print(f"Error with path {path}: {str(e)}")
+            logger.warning("Error with path %s: %s", path, e)
     
     return None, None
 
@@ -249,12 +673,12 @@ def get_static_host_lists():
     endpoint_url, response_data = find_api_endpoint(token, paths_to_try)
     
     if not endpoint_url:
-        print("Could not find a working API endpoint for static host lists")
+        logger.warning("Could not find a working API endpoint for static host lists")
         return []
     
     # We already have the response data from find_api_endpoint
-    print(f"Processing response data from: {endpoint_url}")
-    print(f"Response data: {json.dumps(response_data, indent=2)[:500]}...")
+    logger.debug("Processing response data from: %s", endpoint_url)
+    logger.debug("Response data: %s", lazy_json(response_data, 500))
     
     # Extract the list items - adapt to response format
     # First try the embedded.items format
@@ -274,7 +698,7 @@ def get_static_host_lists():
         if isinstance(host_lists, list):
             return [{'id': item.get('id', ''), 'name': item.get('name', '')} for item in host_lists]
     
-    print("Could not extract host lists from response format")
+    logger.warning("Could not extract host lists from response format")
     return []
 
 
@@ -301,7 +725,7 @@ def search_mac_across_all_static_host_lists(mac_address):
     static_lists_url = f"{base_url}/static-host-list"
 
     try:
-        response = requests.get(
+        response = get_session().get(
             static_lists_url,
             headers=headers,
             verify=False
@@ -341,7 +765,7 @@ def search_mac_across_all_static_host_lists(mac_address):
 
             # Get the details for this specific list
             list_url = f"{base_url}/static-host-list/{list_id}"
-            list_response = requests.get(
+            list_response = get_session().get(
                 list_url,
                 headers=headers,
                 verify=False
@@ -399,7 +823,7 @@ def search_static_host_list(list_id, mac_address):
     formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
     
     # Log the search
-    print(f"Searching for MAC {formatted_mac} in list ID {list_id}")
+    logger.debug("Searching for MAC %s in list ID %s", formatted_mac, list_id)
     
     # Possible API paths to try for a specific list - with the suggested path first
     paths_to_try = [
@@ -413,7 +837,7 @@ def search_static_host_list(list_id, mac_address):
     endpoint_url, host_list = find_api_endpoint(token, paths_to_try)
     
     if not endpoint_url:
-        print("Could not find a working API endpoint for the specified static host list")
+        logger.warning("Could not find a working API endpoint for the specified static host list")
         return {
             "found": False,
             "message": "Could not access the static host list. The API endpoint may not be available.",
@@ -421,11 +845,11 @@ def search_static_host_list(list_id, mac_address):
         }
     
     # We have a valid response from the API
-    print(f"Found static host list at: {endpoint_url}")
+    logger.debug("Found static host list at: %s", endpoint_url)
     
     # Check if the host list has hosts
     if not host_list.get('hosts'):
-        print(f"List ID {list_id} has no hosts")
+        logger.debug("List ID %s has no hosts", list_id)
         return {
             "found": False,
             "message": "No hosts in this static host list",
@@ -433,7 +857,7 @@ def search_static_host_list(list_id, mac_address):
         }
     
     # Log the number of hosts in the list
-    print(f"List ID {list_id} has {len(host_list['hosts'])} hosts")
+    logger.debug("List ID %s has %s hosts", list_id, len(host_list['hosts']))
     
     # Search for the MAC address in the host list
     matching_hosts = []
@@ -449,11 +873,11 @@ def search_static_host_list(list_id, mac_address):
             # print(f"Comparing: Host MAC '{host_mac}' with Search MAC '{normalized_search_mac}'")
             
             if host_mac == normalized_search_mac:
-                print(f"Found match: {host_mac_raw}")
+                logger.debug("Found match: %s", host_mac_raw)
                 matching_hosts.append(host)
     
     if matching_hosts:
-        print(f"Found {len(matching_hosts)} matching host(s) in list ID {list_id}")
+        logger.debug("Found %s matching host(s) in list ID %s", len(matching_hosts), list_id)
         return {
             "found": True, 
             "message": f"Found {len(matching_hosts)} matching host(s) in the list",
@@ -461,15 +885,49 @@ def search_static_host_list(list_id, mac_address):
             "list_details": host_list
         }
     else:
-        print(f"No matching hosts found in list ID {list_id}")
+        logger.debug("No matching hosts found in list ID %s", list_id)
         return {
             "found": False,
             "message": "MAC address not found in this static host list",
             "list_details": host_list
         }
         
-def get_static_host_list_details(list_id):
-    """Get all devices in a specific static host list."""
+def _list_details_result(host_list):
+    """Build the get_static_host_list_details result for a list's details."""
+    # Return all hosts from the list
+    hosts = host_list.get('hosts', [])
+    
+    return {
+        "success": True,
+        "message": f"Found {len(hosts)} host(s) in the list",
+        "hosts": hosts,
+        "list_details": host_list
+    }
+
+def static_host_list_version(list_id):
+    """
+    Return (version, stored_at) of the cached copy of a static host list, or None if it isn't cached.
+
+    The version changes whenever the cached list does, and reading it doesn't decode the list.
+    """
+    return get_list_cache().version(str(list_id))
+
+def get_static_host_list_details(list_id, use_cache=True):
+    """
+    Get all devices in a specific static host list.
+    
+    Args:
+        list_id: The static host list ID
+        use_cache: Serve the list from the list cache if it is there. Pass False where a
+                   stale copy would be wrong (verifying a write, read-modify-write); the
+                   fresh copy still refreshes the cache.
+    """
+    cache = get_list_cache()
+    cache_key = str(list_id)
+    host_list = cache.get(cache_key) if use_cache else None
+    if host_list is not None:
+        return _list_details_result(host_list)
+    
     # Get OAuth token
     token = get_clearpass_token()
     
@@ -485,7 +943,7 @@ def get_static_host_list_details(list_id):
     endpoint_url, host_list = find_api_endpoint(token, paths_to_try)
     
     if not endpoint_url:
-        print("Could not find a working API endpoint for the specified static host list")
+        logger.warning("Could not find a working API endpoint for the specified static host list")
         return {
             "success": False,
             "message": "Could not access the static host list. The API endpoint may not be available.",
@@ -494,27 +952,18 @@ def get_static_host_list_details(list_id):
         }
     
     # We have a valid response from the API
-    print(f"Found static host list at: {endpoint_url}")
-    print(f"Host list data preview: {json.dumps(host_list, indent=2)[:500]}...")
+    logger.debug("Found static host list at: %s", endpoint_url)
+    logger.debug("Host list data preview: %s", lazy_json(host_list, 500))
     
-    # Return all hosts from the list
-    hosts = host_list.get('hosts', [])
+    cache.set(cache_key, host_list)
     
-    return {
-        "success": True,
-        "message": f"Found {len(hosts)} host(s) in the list",
-        "hosts": hosts,
-        "list_details": host_list
-    }
+    return _list_details_result(host_list)
     
 def create_endpoint_mac_and_add_to_static_host_list(list_id, mac_address, description=None):
     """
     Another approach: First create the MAC as an endpoint, then add it to the static host list.
     Some ClearPass instances require the MAC to exist as an endpoint first.
     """
-    # Import statements moved to the top of the function for clarity
-    import json
-    
     # Get OAuth token
     token = get_clearpass_token()
     
@@ -526,15 +975,15 @@ def create_endpoint_mac_and_add_to_static_host_list(list_id, mac_address, descri
     
     # First create the endpoint
     try:
-        print(f"Creating endpoint for MAC {formatted_mac} before adding to static host list")
+        logger.debug("Creating endpoint for MAC %s before adding to static host list", formatted_mac)
         endpoint_result = add_endpoint(formatted_mac)
-        print(f"Endpoint creation result: {json.dumps(endpoint_result, indent=2)[:500]}...")
+        logger.debug("Endpoint creation result: %s", lazy_json(endpoint_result, 500))
     except Exception as e:
-        print(f"Error creating endpoint: {str(e)}")
+        logger.warning("Error creating endpoint: %s", e)
         # Continue even if endpoint creation fails
     
     # Now try to add to the static host list
-    print(f"Now adding MAC {formatted_mac} to static host list {list_id} after endpoint creation")
+    logger.debug("Now adding MAC %s to static host list %s after endpoint creation", formatted_mac, list_id)
     return add_mac_to_static_host_list_v3(list_id, mac_address, description)
 
 def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
@@ -597,23 +1046,23 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
     ]
     
     # Try each endpoint
-    print("MANAGEMENT API: Attempting to add MAC via management endpoints")
+    logger.debug("MANAGEMENT API: Attempting to add MAC via management endpoints")
     for endpoint in management_endpoints:
         try:
-            print(f"MANAGEMENT API: Trying endpoint {endpoint}")
-            response = requests.post(
+            logger.debug("MANAGEMENT API: Trying endpoint %s", endpoint)
+            response = get_session().post(
                 endpoint,
                 json=new_host,
                 headers=headers,
                 verify=False
             )
-            print(f"Response status: {response.status_code}")
-            print(f"Response content: {response.text[:500]}")
+            logger.debug("Response status: %s", response.status_code)
+            logger.debug("Response content: %s", lazy_body(response, 500))
             
             # Check if it was successful
             if response.status_code in [200, 201, 204]:
                 # Verify by getting the list
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     for host in verify_result["hosts"]:
                         if host.get("mac_address") == formatted_mac:
@@ -623,12 +1072,11 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
                                 "details": new_host
                             }
         except Exception as e:
-            print(f"Error with management endpoint {endpoint}: {str(e)}")
+            logger.warning("Error with management endpoint %s: %s", endpoint, e)
     
     # Try uploading a file with the MAC address (some systems support this)
     try:
         # Create a CSV file with the MAC address
-        import tempfile
         with tempfile.NamedTemporaryFile(mode='w+', suffix='.csv', delete=False) as temp_file:
             temp_file.write(f"mac_address,description\n")
             temp_file.write(f"{formatted_mac},{description or 'Added via Web App'}\n")
@@ -644,20 +1092,20 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
         
         for endpoint in file_endpoints:
             try:
-                print(f"MANAGEMENT API: Trying file import via {endpoint}")
+                logger.debug("MANAGEMENT API: Trying file import via %s", endpoint)
                 with open(temp_file_path, 'rb') as f:
                     files = {'file': (f.name, f, 'text/csv')}
-                    response = requests.post(
+                    response = get_session().post(
                         endpoint,
                         files=files,
                         headers={"Authorization": f"Bearer {token}"},
                         verify=False
                     )
-                print(f"Response status: {response.status_code}")
-                print(f"Response content: {response.text[:500]}")
+                logger.debug("Response status: %s", response.status_code)
+                logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 # Verify
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     for host in verify_result["hosts"]:
                         if host.get("mac_address") == formatted_mac:
@@ -667,7 +1115,7 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
                                 "details": new_host
                             }
             except Exception as e:
-                print(f"Error with file import endpoint {endpoint}: {str(e)}")
+                logger.warning("Error with file import endpoint %s: %s", endpoint, e)
         
         # Clean up the temp file
         try:
@@ -675,7 +1123,7 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
         except:
             pass
     except Exception as e:
-        print(f"Error with file import attempt: {str(e)}")
+        logger.warning("Error with file import attempt: %s", e)
     
     # If all attempts failed, return failure
     return {
@@ -686,7 +1134,7 @@ def add_mac_to_static_host_list_v4(list_id, mac_address, description=None):
 
 def check_if_mac_already_in_list(list_id, formatted_mac):
     """Helper function to check if a MAC address is already in a static host list."""
-    list_details = get_static_host_list_details(list_id)
+    list_details = get_static_host_list_details(list_id, use_cache=False)
     if not list_details["success"]:
         return False, {}
     
@@ -752,7 +1200,7 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
     }
     
     # Try different approaches with verification after each
-    print(f"BRUTE FORCE: Starting attempts to add MAC {formatted_mac} to list {list_id}")
+    logger.debug("BRUTE FORCE: Starting attempts to add MAC %s to list %s", formatted_mac, list_id)
     max_attempts = 3
     
     # APPROACH 1: Direct host endpoints
@@ -769,18 +1217,18 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
     for endpoint in host_endpoints:
         for attempt in range(max_attempts):
             try:
-                print(f"BRUTE FORCE: Attempt {attempt+1} - POST to {endpoint}")
-                response = requests.post(
+                logger.debug("BRUTE FORCE: Attempt %s - POST to %s", attempt+1, endpoint)
+                response = get_session().post(
                     endpoint,
                     json=new_host,
                     headers=headers,
                     verify=False
                 )
-                print(f"Response status: {response.status_code}")
-                print(f"Response content: {response.text[:500]}")
+                logger.debug("Response status: %s", response.status_code)
+                logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 # Even if we get an error, check if it was added
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     for host in verify_result["hosts"]:
                         if host.get("mac_address") == formatted_mac:
@@ -790,7 +1238,7 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
                                 "details": new_host
                             }
             except Exception as e:
-                print(f"Error with endpoint {endpoint}: {str(e)}")
+                logger.warning("Error with endpoint %s: %s", endpoint, e)
     
     # APPROACH 2: Update entire list
     update_endpoints = [
@@ -802,7 +1250,7 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
         for attempt in range(max_attempts):
             try:
                 # Get fresh list data
-                list_details = get_static_host_list_details(list_id)
+                list_details = get_static_host_list_details(list_id, use_cache=False)
                 if not list_details["success"]:
                     continue
                 
@@ -828,30 +1276,30 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
                 current_list["hosts"] = current_hosts
                 
                 # Try PATCH with full list
-                print(f"BRUTE FORCE: Attempt {attempt+1} - PATCH to {endpoint}")
-                response = requests.patch(
+                logger.debug("BRUTE FORCE: Attempt %s - PATCH to %s", attempt+1, endpoint)
+                response = get_session().patch(
                     endpoint,
                     json=current_list,
                     headers=headers,
                     verify=False
                 )
-                print(f"PATCH response: {response.status_code}")
-                print(f"Response content: {response.text[:500]}")
+                logger.debug("PATCH response: %s", response.status_code)
+                logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 # Try PUT if PATCH didn't work
                 if response.status_code not in [200, 201, 204]:
-                    print(f"BRUTE FORCE: Attempt {attempt+1} - PUT to {endpoint}")
-                    response = requests.put(
+                    logger.debug("BRUTE FORCE: Attempt %s - PUT to %s", attempt+1, endpoint)
+                    response = get_session().put(
                         endpoint,
                         json=current_list,
                         headers=headers,
                         verify=False
                     )
-                    print(f"PUT response: {response.status_code}")
-                    print(f"Response content: {response.text[:500]}")
+                    logger.debug("PUT response: %s", response.status_code)
+                    logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 # Always verify after attempt
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     for host in verify_result["hosts"]:
                         if host.get("mac_address") == formatted_mac:
@@ -861,14 +1309,14 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
                                 "details": new_host
                             }
             except Exception as e:
-                print(f"Error with endpoint {endpoint}: {str(e)}")
+                logger.warning("Error with endpoint %s: %s", endpoint, e)
     
     # APPROACH 3: Try with just the hosts array
     for endpoint in update_endpoints:
         for attempt in range(max_attempts):
             try:
                 # Get fresh list data
-                list_details = get_static_host_list_details(list_id)
+                list_details = get_static_host_list_details(list_id, use_cache=False)
                 if not list_details["success"]:
                     continue
                 
@@ -893,18 +1341,18 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
                 hosts_payload = {"hosts": current_hosts}
                 
                 # Try PATCH with just hosts array
-                print(f"BRUTE FORCE: Attempt {attempt+1} - PATCH hosts only to {endpoint}")
-                response = requests.patch(
+                logger.debug("BRUTE FORCE: Attempt %s - PATCH hosts only to %s", attempt+1, endpoint)
+                response = get_session().patch(
                     endpoint,
                     json=hosts_payload,
                     headers=headers,
                     verify=False
                 )
-                print(f"PATCH response: {response.status_code}")
-                print(f"Response content: {response.text[:500]}")
+                logger.debug("PATCH response: %s", response.status_code)
+                logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 # Always verify after attempt
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     for host in verify_result["hosts"]:
                         if host.get("mac_address") == formatted_mac:
@@ -914,10 +1362,10 @@ def add_mac_to_static_host_list_v3(list_id, mac_address, description=None):
                                 "details": new_host
                             }
             except Exception as e:
-                print(f"Error with endpoint {endpoint}: {str(e)}")
+                logger.warning("Error with endpoint %s: %s", endpoint, e)
     
     # After all attempts, check one last time if it was added
-    final_verify = get_static_host_list_details(list_id)
+    final_verify = get_static_host_list_details(list_id, use_cache=False)
     if final_verify["success"]:
         for host in final_verify["hosts"]:
             if host.get("mac_address") == formatted_mac:
@@ -977,24 +1425,24 @@ def add_mac_to_static_host_list_v2(list_id, mac_address, description=None):
     # Try each endpoint
     for endpoint in endpoints_to_try:
         try:
-            print(f"Trying to add host at endpoint: {endpoint}")
-            response = requests.post(
+            logger.debug("Trying to add host at endpoint: %s", endpoint)
+            response = get_session().post(
                 endpoint,
                 json=new_host,
                 headers=headers,
                 verify=False
             )
             
-            print(f"Response status: {response.status_code}")
+            logger.debug("Response status: %s", response.status_code)
             
             try:
-                print(f"Response content: {response.text[:1000]}")
+                logger.debug("Response content: %s", lazy_body(response, 1000))
             except:
-                print("Could not print response content")
+                logger.warning("Could not print response content")
             
             if response.status_code in [200, 201, 204]:
                 # Verify that the MAC was actually added by getting the list again
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     # Check if our MAC is in the updated list
                     found = False
@@ -1010,9 +1458,9 @@ def add_mac_to_static_host_list_v2(list_id, mac_address, description=None):
                             "details": new_host
                         }
                     else:
-                        print(f"WARNING: API returned success status but MAC {formatted_mac} not found in updated list")
+                        logger.warning("API returned success status but MAC %s not found in updated list", formatted_mac)
                         # Try brute force approach when verification fails
-                        print("Switching to brute force method...")
+                        logger.debug("Switching to brute force method...")
                         return add_mac_to_static_host_list_v3(list_id, mac_address, description)
                 return {
                     "success": True,
@@ -1020,10 +1468,10 @@ def add_mac_to_static_host_list_v2(list_id, mac_address, description=None):
                     "details": new_host
                 }
         except Exception as e:
-            print(f"Error with endpoint {endpoint}: {str(e)}")
+            logger.warning("Error with endpoint %s: %s", endpoint, e)
     
     # If all direct host addition methods fail, try brute force method
-    print("Direct methods failed, switching to brute force method...")
+    logger.debug("Direct methods failed, switching to brute force method...")
     return add_mac_to_static_host_list_v3(list_id, mac_address, description)
 
 def add_multiple_macs_to_static_host_list(list_id, mac_list):
@@ -1052,9 +1500,9 @@ def add_multiple_macs_to_static_host_list(list_id, mac_list):
     update_endpoint = f"{base_url}/static-host-list/{list_id}"
     
     # Get the current list to preserve existing entries and other properties
-    list_details = get_static_host_list_details(list_id)
+    list_details = get_static_host_list_details(list_id, use_cache=False)
     if not list_details["success"]:
-        print(f"Failed to get current list details: {list_details['message']}")
+        logger.warning("Failed to get current list details: %s", list_details['message'])
         # Continue with minimal payload if we can't get current details
         current_list = {
             "id": list_id,
@@ -1078,39 +1526,40 @@ def add_multiple_macs_to_static_host_list(list_id, mac_list):
             current_list["host_entries"] = host_entries
     
     # Process each MAC address in the list
-    new_entries = []
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    existing_macs = set()
-    
-    # First build a set of existing MACs for quick lookup
-    if "host_entries" in current_list:
-        for entry in current_list["host_entries"]:
-            if "host_address" in entry:
-                # Normalize MAC format for comparison
-                normalized_mac = entry["host_address"].replace("-", "").replace(":", "").lower()
-                existing_macs.add(normalized_mac)
-    
-    # Process each MAC in the input list
-    for item in mac_list:
-        mac = item["mac_address"].replace(':', '').replace('-', '').replace('.', '')
-        formatted_mac = '-'.join([mac[i:i+2] for i in range(0, len(mac), 2)]).upper()
+    with phase("dedupe"):
+        new_entries = []
+        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        existing_macs = set()
         
-        # Check if this MAC is already in the list
-        normalized_mac = mac.lower()
-        if normalized_mac in existing_macs:
-            print(f"Skipping MAC {formatted_mac} as it's already in the list")
-            continue
-        
-        # Add this MAC to our tracking set to avoid duplicates in the batch
-        existing_macs.add(normalized_mac)
+        # First build a set of existing MACs for quick lookup
+        if "host_entries" in current_list:
+            for entry in current_list["host_entries"]:
+                if "host_address" in entry:
+                    # Normalize MAC format for comparison
+                    normalized_mac = entry["host_address"].replace("-", "").replace(":", "").lower()
+                    existing_macs.add(normalized_mac)
         
-        # Create entry with description if provided
-        description = item.get("description")
-        new_entry = {
-            "host_address": formatted_mac,
-            "host_address_desc": description or f"Added via batch upload on {timestamp}"
-        }
-        new_entries.append(new_entry)
+        # Process each MAC in the input list
+        for item in mac_list:
+            mac = item["mac_address"].replace(':', '').replace('-', '').replace('.', '')
+            formatted_mac = '-'.join([mac[i:i+2] for i in range(0, len(mac), 2)]).upper()
+            
+            # Check if this MAC is already in the list
+            normalized_mac = mac.lower()
+            if normalized_mac in existing_macs:
+                logger.debug("Skipping MAC %s as it's already in the list", formatted_mac, extra=sampled(100))
+                continue
+            
+            # Add this MAC to our tracking set to avoid duplicates in the batch
+            existing_macs.add(normalized_mac)
+            
+            # Create entry with description if provided
+            description = item.get("description")
+            new_entry = {
+                "host_address": formatted_mac,
+                "host_address_desc": description or f"Added via batch upload on {timestamp}"
+            }
+            new_entries.append(new_entry)
     
     # If no new entries, return early
     if not new_entries:
@@ -1147,18 +1596,19 @@ def add_multiple_macs_to_static_host_list(list_id, mac_list):
         "Accept": "application/json"
     }
     
-    print(f"Trying to update static host list with {len(new_entries)} new MAC addresses")
+    logger.debug("Trying to update static host list with %s new MAC addresses", len(new_entries))
     
     try:
         # Make the PATCH request
-        response = requests.patch(
-            update_endpoint,
-            json=minimal_payload,
-            headers=headers,
-            verify=False
-        )
+        with phase("patch"):
+            response = get_session().patch(
+                update_endpoint,
+                json=minimal_payload,
+                headers=headers,
+                verify=False
+            )
         
-        print(f"PATCH response: {response.status_code}")
+        logger.debug("PATCH response: %s", response.status_code)
         
         if response.status_code in [200, 201, 204]:
             return {
@@ -1185,7 +1635,7 @@ def add_multiple_macs_to_static_host_list(list_id, mac_list):
             }
     
     except Exception as e:
-        print(f"Error updating with endpoint {update_endpoint}: {str(e)}")
+        logger.warning("Error updating with endpoint %s: %s", update_endpoint, e)
         return {
             "success": False,
             "message": f"Exception when adding MAC addresses to static host list: {str(e)}",
@@ -1227,9 +1677,9 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
     update_endpoint = f"{base_url}/static-host-list/{list_id}"
     
     # Get the current list to preserve existing entries and other properties
-    list_details = get_static_host_list_details(list_id)
+    list_details = get_static_host_list_details(list_id, use_cache=False)
     if not list_details["success"]:
-        print(f"Failed to get current list details: {list_details['message']}")
+        logger.warning("Failed to get current list details: %s", list_details['message'])
         # Continue with minimal payload if we can't get current details
         current_list = {
             "id": list_id,
@@ -1291,28 +1741,27 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
         "Accept": "application/json"
     }
     
-    print(f"Trying to update static host list with new format at: {update_endpoint}")
-    print(f"Payload: {json.dumps(minimal_payload, indent=2)[:1000]}")
+    logger.debug("Trying to update static host list with new format at: %s", update_endpoint)
+    logger.debug("Payload: %s", lazy_json(minimal_payload, 1000))
     
     try:
         # Make the PATCH request
-        response = requests.patch(
+        response = get_session().patch(
             update_endpoint,
             json=minimal_payload,
             headers=headers,
             verify=False
         )
         
-        print(f"PATCH response: {response.status_code}")
-        print(f"Response content: {response.text[:500]}")
+        logger.debug("PATCH response: %s", response.status_code)
+        logger.debug("Response content: %s", lazy_body(response, 500))
         
         if response.status_code in [200, 201, 204]:
             # Add a short delay before verification to allow changes to propagate
-            import time
             time.sleep(2)
             
             # Verify that the MAC was actually added by getting the list again
-            verify_result = get_static_host_list_details(list_id)
+            verify_result = get_static_host_list_details(list_id, use_cache=False)
             if verify_result["success"]:
                 # Convert formatting to check different variants
                 formatted_mac_colon = formatted_mac.replace('-', ':').lower()
@@ -1339,8 +1788,8 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
                 else:
                     # Since you mentioned the MAC is actually being added despite verification failing,
                     # we'll consider this a success case now
-                    print(f"INFO: API successfully added MAC {formatted_mac} but verification could not find it.")
-                    print("This is expected behavior with this ClearPass instance - changes are successful but not immediately visible in API.")
+                    logger.info("API successfully added MAC %s but verification could not find it.", formatted_mac)
+                    logger.debug("This is expected behavior with this ClearPass instance - changes are successful but not immediately visible in API.")
                     
                     return {
                         "success": True,
@@ -1357,20 +1806,19 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
             
         else:
             # Try with full payload if minimal payload failed
-            print("Minimal payload failed, trying with full payload")
-            response = requests.patch(
+            logger.debug("Minimal payload failed, trying with full payload")
+            response = get_session().patch(
                 update_endpoint,
                 json=current_list,
                 headers=headers,
                 verify=False
             )
             
-            print(f"Full PATCH response: {response.status_code}")
-            print(f"Response content: {response.text[:500]}")
+            logger.debug("Full PATCH response: %s", response.status_code)
+            logger.debug("Response content: %s", lazy_body(response, 500))
             
             if response.status_code in [200, 201, 204]:
                 # Add a short delay before verification
-                import time
                 time.sleep(2)
                 
                 # Success but skip verification detail in response
@@ -1394,7 +1842,7 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
         }
     
     except Exception as e:
-        print(f"Error updating with endpoint {update_endpoint}: {str(e)}")
+        logger.warning("Error updating with endpoint %s: %s", update_endpoint, e)
         return {
             "success": False,
             "message": f"Exception when adding MAC address {formatted_mac} to static host list: {str(e)}",
@@ -1404,7 +1852,7 @@ def add_mac_to_static_host_list_v5(list_id, mac_address, description=None):
 def _add_mac_legacy_method(list_id, formatted_mac, description, token):
     """Legacy method for adding a MAC by updating the entire list."""
     # Get the current list first
-    list_details = get_static_host_list_details(list_id)
+    list_details = get_static_host_list_details(list_id, use_cache=False)
     
     if not list_details["success"]:
         return {
@@ -1461,20 +1909,20 @@ def _add_mac_legacy_method(list_id, formatted_mac, description, token):
     # Try each update method
     for endpoint in potential_endpoints:
         try:
-            print(f"Trying to update whole list at: {endpoint}")
+            logger.debug("Trying to update whole list at: %s", endpoint)
             # Try PATCH first
-            response = requests.patch(
+            response = get_session().patch(
                 endpoint,
                 json=current_list,
                 headers=headers,
                 verify=False
             )
             
-            print(f"PATCH response: {response.status_code}")
+            logger.debug("PATCH response: %s", response.status_code)
             
             if response.status_code in [200, 201, 204]:
                 # Verify that the MAC was actually added by getting the list again
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     # Check if our MAC is in the updated list
                     found = False
@@ -1490,7 +1938,7 @@ def _add_mac_legacy_method(list_id, formatted_mac, description, token):
                             "details": new_host
                         }
                     else:
-                        print(f"WARNING: PATCH returned success status but MAC {formatted_mac} not found in updated list")
+                        logger.warning("PATCH returned success status but MAC %s not found in updated list", formatted_mac)
                         return {
                             "success": False,
                             "message": f"API indicated success but MAC address {formatted_mac} was not added to the list",
@@ -1503,19 +1951,19 @@ def _add_mac_legacy_method(list_id, formatted_mac, description, token):
                 }
                 
             # If PATCH failed, try PUT
-            response = requests.put(
+            response = get_session().put(
                 endpoint,
                 json=current_list,
                 headers=headers,
                 verify=False
             )
             
-            print(f"PUT response: {response.status_code}")
-            print(f"PUT response content: {response.text}")
+            logger.debug("PUT response: %s", response.status_code)
+            logger.debug("PUT response content: %s", lazy_body(response))
             
             if response.status_code in [200, 201, 204]:
                 # Verify that the MAC was actually added by getting the list again
-                verify_result = get_static_host_list_details(list_id)
+                verify_result = get_static_host_list_details(list_id, use_cache=False)
                 if verify_result["success"]:
                     # Check if our MAC is in the updated list
                     found = False
@@ -1531,7 +1979,7 @@ def _add_mac_legacy_method(list_id, formatted_mac, description, token):
                             "details": new_host
                         }
                     else:
-                        print(f"WARNING: PUT returned success status but MAC {formatted_mac} not found in updated list")
+                        logger.warning("PUT returned success status but MAC %s not found in updated list", formatted_mac)
                         return {
                             "success": False,
                             "message": f"API indicated success but MAC address {formatted_mac} was not added to the list",
@@ -1543,7 +1991,7 @@ def _add_mac_legacy_method(list_id, formatted_mac, description, token):
                     "details": new_host
                 }
         except Exception as e:
-            print(f"Error updating with endpoint {endpoint}: {str(e)}")
+            logger.warning("Error updating with endpoint %s: %s", endpoint, e)
     
     # If all methods fail, return error
     return {
@@ -1564,7 +2012,7 @@ def add_mac_to_static_host_list(list_id, mac_address, description=None):
     formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
     
     # Get the current list first to ensure it exists and we have the right format
-    list_details = get_static_host_list_details(list_id)
+    list_details = get_static_host_list_details(list_id, use_cache=False)
     
     if not list_details["success"]:
         return {
@@ -1606,7 +2054,7 @@ def add_mac_to_static_host_list(list_id, mac_address, description=None):
     # First get the current list details to find the right endpoint
     for endpoint in potential_endpoints:
         try:
-            response = requests.get(
+            response = get_session().get(
                 endpoint,
                 headers=headers,
                 verify=False
@@ -1645,76 +2093,76 @@ def add_mac_to_static_host_list(list_id, mac_address, description=None):
     # Update the static host list
     try:
         # Print debugging information
-        print(f"Updating static host list at: {update_endpoint}")
-        print(f"Current list structure: {json.dumps(current_list, indent=2)[:500]}...")
-        print(f"Trying to add host: {json.dumps(new_host, indent=2)}")
+        logger.debug("Updating static host list at: %s", update_endpoint)
+        logger.debug("Current list structure: %s", lazy_json(current_list, 500))
+        logger.debug("Trying to add host: %s", lazy_json(new_host))
         
         # Try different update methods - first try using the hosts array only
         hosts_only_payload = {"hosts": current_hosts}
-        print(f"First attempt - using hosts array only: {json.dumps(hosts_only_payload, indent=2)}")
+        logger.debug("First attempt - using hosts array only: %s", lazy_json(hosts_only_payload))
         
-        response = requests.patch(
+        response = get_session().patch(
             update_endpoint,
             json=hosts_only_payload,
             headers=headers,
             verify=False
         )
         
-        print(f"PATCH response (hosts only): {response.status_code}")
-        print(f"PATCH response content: {response.text}")
+        logger.debug("PATCH response (hosts only): %s", response.status_code)
+        logger.debug("PATCH response content: %s", lazy_body(response))
         
         patch_success = response.status_code in [200, 201, 204]
         
         # If PATCH with hosts array doesn't work, try with the full object
         if not patch_success:
-            print("First attempt failed, trying with full object")
-            response = requests.patch(
+            logger.debug("First attempt failed, trying with full object")
+            response = get_session().patch(
                 update_endpoint,
                 json=current_list,
                 headers=headers,
                 verify=False
             )
-            print(f"PATCH response (full object): {response.status_code}")
-            print(f"PATCH response content: {response.text}")
+            logger.debug("PATCH response (full object): %s", response.status_code)
+            logger.debug("PATCH response content: %s", lazy_body(response))
             patch_success = response.status_code in [200, 201, 204]
         
         # If PATCH doesn't work at all, try PUT
         put_success = False
         if not patch_success:
-            print("PATCH failed, trying PUT")
-            response = requests.put(
+            logger.debug("PATCH failed, trying PUT")
+            response = get_session().put(
                 update_endpoint,
                 json=current_list,
                 headers=headers,
                 verify=False
             )
-            print(f"PUT response: {response.status_code}")
-            print(f"PUT response content: {response.text}")
+            logger.debug("PUT response: %s", response.status_code)
+            logger.debug("PUT response content: %s", lazy_body(response))
             put_success = response.status_code in [200, 201, 204]
         
         # If we still don't have success, try a different endpoint approach
         post_success = False
         if not patch_success and not put_success:
-            print("Standard update methods failed, trying direct host addition")
+            logger.debug("Standard update methods failed, trying direct host addition")
             
             # Try to add the host directly using a POST to the hosts endpoint
             hosts_endpoint = f"{update_endpoint}/hosts"
-            print(f"Trying direct host addition at: {hosts_endpoint}")
+            logger.debug("Trying direct host addition at: %s", hosts_endpoint)
             
-            response = requests.post(
+            response = get_session().post(
                 hosts_endpoint,
                 json=new_host,
                 headers=headers,
                 verify=False
             )
-            print(f"POST to hosts endpoint response: {response.status_code}")
-            print(f"POST response content: {response.text}")
+            logger.debug("POST to hosts endpoint response: %s", response.status_code)
+            logger.debug("POST response content: %s", lazy_body(response))
             post_success = response.status_code in [200, 201, 204]
         
         # Check if any request was successful
         if patch_success or put_success or post_success:
             # Verify that the MAC was actually added by getting the list again
-            verify_result = get_static_host_list_details(list_id)
+            verify_result = get_static_host_list_details(list_id, use_cache=False)
             if verify_result["success"]:
                 # Check if our MAC is in the updated list
                 found = False
@@ -1731,7 +2179,7 @@ def add_mac_to_static_host_list(list_id, mac_address, description=None):
                         "details": new_host
                     }
                 else:
-                    print(f"WARNING: API returned success status but MAC {formatted_mac} not found in updated list")
+                    logger.warning("API returned success status but MAC %s not found in updated list", formatted_mac)
                     return {
                         "success": False,
                         "message": f"API indicated success but MAC address {formatted_mac} was not added to the list",
@@ -1763,14 +2211,14 @@ def add_mac_to_static_host_list(list_id, mac_address, description=None):
         except:
             error_detail = e.response.text if e.response.text else str(e)
             
-        print(f"HTTP Error: {e}, Detail: {error_detail}")
+        logger.warning("HTTP Error: %s, Detail: %s", e, error_detail)
         return {
             "success": False,
             "message": f"Failed to update static host list: {str(e)}",
             "details": error_detail
         }
     except Exception as e:
-        print(f"Error updating static host list: {e}")
+        logger.warning("Error updating static host list: %s", e)
         return {
             "success": False,
             "message": f"Failed to update static host list: {str(e)}"
@@ -1809,9 +2257,9 @@ def register_guest_device(mac_address, email, device_name=None, role_id=None):
     # First try to create an endpoint if it doesn't exist
     try:
         endpoint_result = add_endpoint(formatted_mac)
-        print(f"Endpoint creation result: {json.dumps(endpoint_result, indent=2)}")
+        logger.debug("Endpoint creation result: %s", lazy_json(endpoint_result))
     except Exception as e:
-        print(f"Error creating endpoint: {str(e)}")
+        logger.warning("Error creating endpoint: %s", e)
         # Continue even if endpoint creation fails, as we'll try guest registration next
     
     # Try different possible paths for guest device registration
@@ -1850,16 +2298,16 @@ def register_guest_device(mac_address, email, device_name=None, role_id=None):
     for path in potential_paths:
         try:
             endpoint_url = f"{base_url}/{path}"
-            print(f"Trying to register guest device at {endpoint_url}")
+            logger.debug("Trying to register guest device at %s", endpoint_url)
             
-            response = requests.post(
+            response = get_session().post(
                 endpoint_url,
                 json=device_data,
                 headers=headers,
                 verify=False
             )
             
-            print(f"Response status: {response.status_code}")
+            logger.debug("Response status: %s", response.status_code)
             
             if response.status_code in [200, 201, 204]:
                 try:
@@ -1875,7 +2323,7 @@ def register_guest_device(mac_address, email, device_name=None, role_id=None):
                         "data": {"status": "Success, no JSON content returned"}
                     }
         except Exception as e:
-            print(f"Error using path {path}: {str(e)}")
+            logger.warning("Error using path %s: %s", path, e)
     
     # If we reach here, let's try to find the correct endpoint structure
     try:
@@ -1889,8 +2337,8 @@ def register_guest_device(mac_address, email, device_name=None, role_id=None):
                 break
         
         if guest_endpoint:
-            print(f"Found guest endpoint at {guest_endpoint}, trying to register device")
-            response = requests.post(
+            logger.debug("Found guest endpoint at %s, trying to register device", guest_endpoint)
+            response = get_session().post(
                 f"{guest_endpoint}/devices",
                 json=device_data,
                 headers=headers,
@@ -1904,7 +2352,7 @@ def register_guest_device(mac_address, email, device_name=None, role_id=None):
                     "data": response.json() if response.text else {"status": "Success, no content returned"}
                 }
     except Exception as e:
-        print(f"Error during guest endpoint exploration: {str(e)}")
+        logger.warning("Error during guest endpoint exploration: %s", e)
     
     # As a last resort, let's try with the direct endpoint name since we already created the endpoint
     return {
@@ -2014,13 +2462,13 @@ def create_device_direct(mac_address, email, device_name=None):
     # Try all endpoint URLs with all payload versions
     for endpoint_url in endpoint_urls:
         for payload in payload_versions:
-            print(f"Trying to create device at endpoint: {endpoint_url}")
+            logger.debug("Trying to create device at endpoint: %s", endpoint_url)
             
             try:
                 # For endpoints ending with the MAC, use PUT
                 if any(formatted_mac in endpoint_url for formatted_mac in [formatted_mac_colon, formatted_mac_hyphen, formatted_mac_plain]):
-                    print(f"Using PUT request with payload: {json.dumps(payload)[:200]}...")
-                    response = requests.put(
+                    logger.debug("Using PUT request with payload: %s", lazy_json(payload, 200))
+                    response = get_session().put(
                         endpoint_url,
                         json=payload,
                         headers=headers,
@@ -2028,16 +2476,16 @@ def create_device_direct(mac_address, email, device_name=None):
                     )
                 # For collection endpoints, use POST
                 else:
-                    print(f"Using POST request with payload: {json.dumps(payload)[:200]}...")
-                    response = requests.post(
+                    logger.debug("Using POST request with payload: %s", lazy_json(payload, 200))
+                    response = get_session().post(
                         endpoint_url,
                         json=payload,
                         headers=headers,
                         verify=False
                     )
                 
-                print(f"Response status: {response.status_code}")
-                print(f"Response content: {response.text[:500] if response.text else 'No content'}")
+                logger.debug("Response status: %s", response.status_code)
+                logger.debug("Response content: %s", lazy_body(response, 500))
                 
                 if response.status_code in [200, 201, 204]:
                     try:
@@ -2059,14 +2507,14 @@ def create_device_direct(mac_address, email, device_name=None):
                             "payload_used": payload
                         }
             except Exception as e:
-                print(f"Error with endpoint {endpoint_url}: {str(e)}")
+                logger.warning("Error with endpoint %s: %s", endpoint_url, e)
     
     # If we get here, we've tried all endpoints and payloads and none worked
     # As a fallback, try using the standard endpoint creation method
     try:
-        print("Trying fallback method - standard endpoint creation")
+        logger.debug("Trying fallback method - standard endpoint creation")
         endpoint_result = add_endpoint(formatted_mac_colon)
-        print(f"Fallback endpoint creation result: {json.dumps(endpoint_result, indent=2)}")
+        logger.debug("Fallback endpoint creation result: %s", lazy_json(endpoint_result))
         return {
             "success": True,
             "message": f"Successfully created device {formatted_mac_colon} using fallback method",
@@ -2074,7 +2522,7 @@ def create_device_direct(mac_address, email, device_name=None):
             "method": "fallback"
         }
     except Exception as e:
-        print(f"Fallback method failed: {str(e)}")
+        logger.warning("Fallback method failed: %s", e)
         return {
             "success": False,
             "message": f"Failed to create device {formatted_mac_colon} after trying all endpoints",
@@ -2176,25 +2624,25 @@ def set_device_mpsk(mac_address, mpsk_password):
     # Try all endpoint URLs with all payload versions
     for endpoint_url in endpoint_urls:
         for payload in payload_versions:
-            print(f"Trying to set MPSK for device at endpoint: {endpoint_url}")
-            print(f"Using payload: {json.dumps(payload)}")
+            logger.debug("Trying to set MPSK for device at endpoint: %s", endpoint_url)
+            logger.debug("Using payload: %s", lazy_json(payload))
             
             try:
                 # Try PATCH first
-                print("Attempting PATCH method")
-                response = requests.patch(
+                logger.debug("Attempting PATCH method")
+                response = get_session().patch(
                     endpoint_url,
                     json=payload,
                     headers=headers,
                     verify=False
                 )
                 
-                print(f"PATCH response status: {response.status_code}")
-                print(f"PATCH response content: {response.text[:500] if response.text else 'No content'}")
+                logger.debug("PATCH response status: %s", response.status_code)
+                logger.debug("PATCH response content: %s", lazy_body(response, 500))
                 
                 # If PATCH didn't work, try PUT
                 if response.status_code not in [200, 201, 204]:
-                    print("PATCH failed, trying PUT method")
+                    logger.debug("PATCH failed, trying PUT method")
                     # For PUT we need the full device data, so create a more complete payload
                     # First add the MAC address to the payload if not present
                     if "mac_address" not in payload:
@@ -2204,14 +2652,14 @@ def set_device_mpsk(mac_address, mpsk_password):
                     else:
                         put_payload = payload
                     
-                    response = requests.put(
+                    response = get_session().put(
                         endpoint_url,
                         json=put_payload,
                         headers=headers,
                         verify=False
                     )
-                    print(f"PUT response status: {response.status_code}")
-                    print(f"PUT response content: {response.text[:500] if response.text else 'No content'}")
+                    logger.debug("PUT response status: %s", response.status_code)
+                    logger.debug("PUT response content: %s", lazy_body(response, 500))
                 
                 # If successful with either method
                 if response.status_code in [200, 201, 204]:
@@ -2236,17 +2684,17 @@ def set_device_mpsk(mac_address, mpsk_password):
                             "payload_used": payload
                         }
             except Exception as e:
-                print(f"Error with endpoint {endpoint_url}: {str(e)}")
+                logger.warning("Error with endpoint %s: %s", endpoint_url, e)
     
     # If we got here, neither approach worked - create a custom solution that sets the password directly
     try:
-        print("All standard methods failed. Trying alternative approach - create a new device with MPSK integrated")
+        logger.warning("All standard methods failed. Trying alternative approach - create a new device with MPSK integrated")
         
         # First get any existing device data
         try:
             # Get device endpoint
             device_url = f"{base_url}/device/mac/{formatted_mac_colon}"
-            get_response = requests.get(
+            get_response = get_session().get(
                 device_url,
                 headers=headers,
                 verify=False
@@ -2254,7 +2702,7 @@ def set_device_mpsk(mac_address, mpsk_password):
             
             if get_response.status_code == 200:
                 existing_device = get_response.json()
-                print(f"Found existing device: {json.dumps(existing_device)[:500]}")
+                logger.debug("Found existing device: %s", lazy_json(existing_device, 500))
                 
                 # Update with MPSK
                 if 'attributes' not in existing_device:
@@ -2264,7 +2712,7 @@ def set_device_mpsk(mac_address, mpsk_password):
                 existing_device['attributes']['mpsk_enabled'] = True
                 
                 # Update the device
-                put_response = requests.put(
+                put_response = get_session().put(
                     device_url,
                     json=existing_device,
                     headers=headers,
@@ -2280,10 +2728,10 @@ def set_device_mpsk(mac_address, mpsk_password):
                     }
             
             # If the GET or PUT failed, fall through to the next method
-            print("Existing device update method failed")
+            logger.debug("Existing device update method failed")
             
         except Exception as e:
-            print(f"Error getting existing device: {str(e)}")
+            logger.warning("Error getting existing device: %s", e)
         
         # Create a completely new device with MPSK included
         complete_device = {
@@ -2301,12 +2749,12 @@ def set_device_mpsk(mac_address, mpsk_password):
             try:
                 method = "POST" if url.endswith("device") or url.endswith("devices") else "PUT"
                 
-                print(f"Trying to create device with MPSK at {url} using {method}")
+                logger.debug("Trying to create device with MPSK at %s using %s", url, method)
                 
                 if method == "POST":
-                    response = requests.post(url, json=complete_device, headers=headers, verify=False)
+                    response = get_session().post(url, json=complete_device, headers=headers, verify=False)
                 else:
-                    response = requests.put(url, json=complete_device, headers=headers, verify=False)
+                    response = get_session().put(url, json=complete_device, headers=headers, verify=False)
                     
                 if response.status_code in [200, 201, 204]:
                     return {
@@ -2316,10 +2764,10 @@ def set_device_mpsk(mac_address, mpsk_password):
                         "data": {"status": f"Success using {method} to {url}"}
                     }
             except Exception as e:
-                print(f"Error with {method} to {url}: {str(e)}")
+                logger.warning("Error with %s to %s: %s", method, url, e)
         
         # Final fallback - we'll fake success since we've tried everything
-        print("WARNING: All MPSK methods failed. The device is created but MPSK setting may not have succeeded.")
+        logger.warning("All MPSK methods failed. The device is created but MPSK setting may not have succeeded.")
         return {
             "success": True,  # Return success anyway to show password to user
             "message": f"Device created but MPSK setting may not have been applied.",
@@ -2328,7 +2776,7 @@ def set_device_mpsk(mac_address, mpsk_password):
         }
         
     except Exception as e:
-        print(f"Critical error in MPSK setting: {str(e)}")
+        logger.warning("Critical error in MPSK setting: %s", e)
         return {
             "success": True,  # Return success anyway to show password to user
             "message": f"Device created but error occurred when setting MPSK: {str(e)}",
@@ -2340,6 +2788,8 @@ def generate_pronounceable_mpsk(length=20):
     Generate a pronounceable MPSK password of specified length.
     
     This is a local implementation since the ClearPass API endpoint may not be accessible.
+    Passwords come from the operating system CSPRNG; default-length passwords are served
+    from a pre-generated pool (see api.mpsk) so generation stays off the request path.
     
     Args:
         length: Length of the password (default is 20)
@@ -2347,43 +2797,11 @@ def generate_pronounceable_mpsk(length=20):
     Returns:
         A pronounceable password string
     """
-    import random
-    import string
+    pool = get_mpsk_pool()
+    if length == pool.length:
+        return pool.take(1)[0]
     
-    # Define vowels and consonants for pronounceable words
-    vowels = 'aeiou'
-    consonants = 'bcdfghjklmnpqrstvwxyz'
-    
-    # Generate pattern: consonant+vowel pairs plus special characters
-    password = []
-    
-    # Generate pairs of consonant+vowel to make pronounceable sequences
-    pairs_needed = (length - 4) // 2  # Reserve 4 chars for required character types
-    for _ in range(pairs_needed):
-        password.append(random.choice(consonants))
-        password.append(random.choice(vowels))
-    
-    # Add at least one uppercase letter
-    password.append(random.choice(string.ascii_uppercase))
-    
-    # Add at least one digit
-    password.append(random.choice(string.digits))
-    
-    # Add at least one special character
-    password.append(random.choice('!@#$%^&*()-_=+'))
-    
-    # Fill any remaining characters needed to reach exact length
-    remaining = length - len(password)
-    if remaining > 0:
-        password.extend(random.choice(string.ascii_lowercase) for _ in range(remaining))
-    
-    # Shuffle the password to ensure random order
-    random.shuffle(password)
-    
-    # Join to get the final password
-    mpsk = ''.join(password)
-    print(f"Generated new pronounceable MPSK: {mpsk}")
-    return mpsk
+    return generate_mpsk_batch(1, length)[0]
 
 def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_password=None, role_id=2):
     """
@@ -2408,7 +2826,6 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
     # If no MPSK password was provided, generate a new pronounceable one
     if not mpsk_password:
         mpsk_password = generate_pronounceable_mpsk(20)
-        print(f"Generated new pronounceable MPSK: {mpsk_password}")
     
     # Setup API access
     base_url = os.getenv("CLEARPASS_BASE_URL")
@@ -2449,19 +2866,20 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
     }
     
     # Create the device
-    print(f"STEP 1: Creating device {formatted_mac} at {device_create_url}")
-    print(f"Creation payload: {json.dumps(device_data)}")
+    logger.debug("STEP 1: Creating device %s at %s", formatted_mac, device_create_url)
+    logger.debug("Creation payload: %s", lazy_json(device_data))
     
+    create_span = start_span("create_device", mac_address=formatted_mac)
     try:
-        create_response = requests.post(
+        create_response = get_session().post(
             device_create_url,
             json=device_data,
             headers=headers,
             verify=False
         )
         
-        print(f"Device creation response status: {create_response.status_code}")
-        print(f"Device creation response: {create_response.text[:200]}")
+        logger.debug("Device creation response status: %s", create_response.status_code)
+        logger.debug("Device creation response: %s", lazy_body(create_response, 200))
         
         device_creation_success = create_response.status_code in [200, 201, 204]
         
@@ -2474,16 +2892,16 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
             }
         else:
             # If first attempt failed, try with PUT to /device endpoint
-            print("POST to /device failed, trying PUT to /device")
-            create_response = requests.put(
+            logger.debug("POST to /device failed, trying PUT to /device")
+            create_response = get_session().put(
                 device_create_url,
                 json=device_data,
                 headers=headers,
                 verify=False
             )
             
-            print(f"Device PUT response status: {create_response.status_code}")
-            print(f"Device PUT response: {create_response.text[:200]}")
+            logger.debug("Device PUT response status: %s", create_response.status_code)
+            logger.debug("Device PUT response: %s", lazy_body(create_response, 200))
             
             device_creation_success = create_response.status_code in [200, 201, 204]
             
@@ -2504,7 +2922,7 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
                     "data": create_response.text[:500]
                 }
     except Exception as e:
-        print(f"Error creating device: {str(e)}")
+        logger.warning("Error creating device: %s", e)
         device_result = {
             "success": False,
             "message": f"Error creating device: {str(e)}",
@@ -2512,6 +2930,9 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
         }
         device_creation_success = False
     
+    create_span.set_attribute("success", device_creation_success)
+    end_span(create_span)
+    
     # STEP 2: Set the MPSK using /device/mac/{macaddr} endpoint
     mpsk_url = f"{base_url}/device/mac/{formatted_mac}"
     
@@ -2521,20 +2942,21 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
         "mpsk_enable": 1  # Ensure MPSK is enabled
     }
     
-    print(f"STEP 2: Setting MPSK for device {formatted_mac} at {mpsk_url}")
-    print(f"MPSK payload: {json.dumps(mpsk_data)}")
+    logger.debug("STEP 2: Setting MPSK for device %s at %s", formatted_mac, mpsk_url)
+    logger.debug("MPSK payload: %s", lazy_json(mpsk_data))
     
+    mpsk_span = start_span("set_mpsk", mac_address=formatted_mac)
     try:
         # Use PATCH to update the device with MPSK
-        mpsk_response = requests.patch(
+        mpsk_response = get_session().patch(
             mpsk_url,
             json=mpsk_data,
             headers=headers,
             verify=False
         )
         
-        print(f"MPSK setting response status: {mpsk_response.status_code}")
-        print(f"MPSK setting response: {mpsk_response.text[:200]}")
+        logger.debug("MPSK setting response status: %s", mpsk_response.status_code)
+        logger.debug("MPSK setting response: %s", lazy_body(mpsk_response, 200))
         
         mpsk_setting_success = mpsk_response.status_code in [200, 201, 204]
         
@@ -2547,22 +2969,22 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
             }
         else:
             # If PATCH failed, let's try with a PUT request
-            print("PATCH failed, trying PUT request for MPSK setting")
+            logger.debug("PATCH failed, trying PUT request for MPSK setting")
             
             # For PUT we need to include the MAC address
             put_mpsk_data = mpsk_data.copy()
             put_mpsk_data["mac_address"] = formatted_mac
             put_mpsk_data["status"] = "Known"
             
-            mpsk_response = requests.put(
+            mpsk_response = get_session().put(
                 mpsk_url,
                 json=put_mpsk_data,
                 headers=headers,
                 verify=False
             )
             
-            print(f"MPSK PUT response status: {mpsk_response.status_code}")
-            print(f"MPSK PUT response: {mpsk_response.text[:200]}")
+            logger.debug("MPSK PUT response status: %s", mpsk_response.status_code)
+            logger.debug("MPSK PUT response: %s", lazy_body(mpsk_response, 200))
             
             mpsk_setting_success = mpsk_response.status_code in [200, 201, 204]
             
@@ -2583,7 +3005,7 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
                     "data": mpsk_response.text[:500]
                 }
     except Exception as e:
-        print(f"Error setting MPSK: {str(e)}")
+        logger.warning("Error setting MPSK: %s", e)
         mpsk_result = {
             "success": False,
             "message": f"Error setting MPSK: {str(e)}",
@@ -2591,6 +3013,9 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
         }
         mpsk_setting_success = False
     
+    mpsk_span.set_attribute("success", mpsk_setting_success)
+    end_span(mpsk_span)
+    
     # Return the results - we always return success:True so the UI shows the password
     return {
         "device_creation": device_result,
@@ -2603,6 +3028,54 @@ def register_device_with_mpsk(mac_address, email, device_name=None, mpsk_passwor
         "success": device_creation_success or mpsk_setting_success or True  # At least return the password
     }
 
+def provision_device_with_mpsk(device):
+    """
+    Create one device and set its MPSK, returning a flat report row.
+    
+    This is the per-item worker for bulk MPSK provisioning jobs.
+    
+    Args:
+        device: Dictionary with "mac_address", "email", "mpsk_password" and optional
+                "device_name" and "role_id" keys
+        
+    Returns:
+        A dictionary suitable for a CSV report row
+    """
+    # Job workers have no request span, so each device gets its own trace
+    with traced("provision_device", mac_address=device["mac_address"]):
+        result = register_device_with_mpsk(
+            device["mac_address"],
+            device["email"],
+            device.get("device_name") or None,
+            device["mpsk_password"],
+            device.get("role_id") or 2
+        )
+    
+    device_created = result["device_creation"].get("success", False)
+    mpsk_set = result["mpsk_setting"].get("success", False)
+    
+    if device_created and mpsk_set:
+        status = "provisioned"
+    elif device_created or mpsk_set:
+        status = "partial"
+    else:
+        status = "failed"
+    
+    return {
+        "mac_address": result["mac_address"],
+        "email": result["email"],
+        "device_name": result["device_name"],
+        "role_id": result["role_id"],
+        "mpsk_password": result["mpsk_password"],
+        "device_created": device_created,
+        "mpsk_set": mpsk_set,
+        "status": status,
+        "message": "; ".join([
+            result["device_creation"].get("message", ""),
+            result["mpsk_setting"].get("message", "")
+        ])
+    }
+
 def explore_api_endpoints():
     """Get available API endpoints from ClearPass to aid in debugging."""
     # Get OAuth token
@@ -2649,16 +3122,16 @@ def explore_api_endpoints():
             test_url = test_url[:-4]  # Remove trailing /api if present
             
         try:
-            print(f"Exploring API endpoint: {test_url}")
+            logger.debug("Exploring API endpoint: %s", test_url)
             # Make the request to get the API structure
-            response = requests.get(
+            response = get_session().get(
                 test_url,
                 headers=headers,
                 verify=False  # Set to True in production with valid certificates
             )
             
             status = response.status_code
-            print(f"Response status: {status}")
+            logger.debug("Response status: %s", status)
             
             if status == 200:
                 try:
@@ -2668,9 +3141,9 @@ def explore_api_endpoints():
                         "status": status,
                         "data": data
                     }
-                    print(f"Found valid endpoint: {test_url}")
+                    logger.info("Found valid endpoint: %s", test_url)
                 except Exception as e:
-                    print(f"Error parsing JSON from {test_url}: {str(e)}")
+                    logger.warning("Error parsing JSON from %s: %s", test_url, e)
                     results[path or "root"] = {
                         "status": status,
                         "error": f"Invalid JSON: {str(e)}",
@@ -2682,7 +3155,7 @@ def explore_api_endpoints():
                     "error": response.reason
                 }
         except Exception as e:
-            print(f"Error exploring {test_url}: {str(e)}")
+            logger.warning("Error exploring %s: %s", test_url, e)
             results[path or "root"] = {
                 "status": "error",
                 "error": str(e)
@@ -2714,15 +3187,15 @@ def explore_api_endpoints():
         if path not in results:  # Skip if we already tested this path
             test_url = f"{base_url}/{path}"
             try:
-                print(f"Testing specific path: {test_url}")
-                response = requests.get(
+                logger.debug("Testing specific path: %s", test_url)
+                response = get_session().get(
                     test_url,
                     headers=headers,
                     verify=False
                 )
                 
                 status = response.status_code
-                print(f"Response status: {status}")
+                logger.debug("Response status: %s", status)
                 
                 if status == 200:
                     try:
@@ -2731,7 +3204,7 @@ def explore_api_endpoints():
                             "status": status,
                             "data": data
                         }
-                        print(f"Found valid endpoint: {test_url}")
+                        logger.info("Found valid endpoint: %s", test_url)
                     except Exception as e:
                         results[path] = {
                             "status": status,
@@ -2749,4 +3222,13 @@ def explore_api_endpoints():
                     "error": str(e)
                 }
     
-    return results
\ No newline at end of file
+    return results
+
+
+def _apply_write(method, url, payload, response):
+    """Write listener that keeps the list cache, endpoint cache and mirror in step with writes."""
+    # Imported on use because api.write_through (and the mirror it updates) import this module
+    from api.write_through import apply_write
+    apply_write(method, url, payload, response)
+
+add_write_listener(_apply_write)
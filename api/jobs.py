@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from api.metrics import JOB_DURATION, JOB_ITEMS_PROCESSED, JOBS_RUNNING
+
+# Jobs kept in memory, oldest first
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+class Job:
+    """
+    A background job that runs one worker function over a list of items.
+
+    Results are stored in input order, so a finished job can be turned into a report
+    that lines up with the uploaded file.
+    """
+
+    def __init__(self, kind, items):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.items = items
+        self.total = len(items)
+        self.completed = 0
+        self.status = "queued"
+        self.error = None
+        self.results = [None] * len(items)
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def _record(self, index, result):
+        with self._lock:
+            self.results[index] = result
+            self.completed += 1
+        JOB_ITEMS_PROCESSED.inc(kind=self.kind, status=(result or {}).get("status", "unknown"))
+
+    def to_dict(self, include_results=False):
+        """Return a JSON-serializable summary of the job."""
+        with self._lock:
+            elapsed = None
+            if self.started_at:
+                elapsed = (self.finished_at or time.time()) - self.started_at
+
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "total": self.total,
+                "completed": self.completed,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "elapsed_seconds": elapsed,
+                "items_per_second": (self.completed / elapsed) if elapsed else None
+            }
+
+            if include_results:
+                data["results"] = list(self.results)
+
+            return data
+
+
+def start_job(kind, items, worker, max_workers=None):
+    """
+    Start a background job that calls worker(item) for every item.
+
+    The job runs on its own thread and fans the items out over a bounded thread pool.
+    Exceptions raised by the worker are recorded as {"status": "error"} results so one
+    bad item doesn't stop the batch.
+
+    Args:
+        kind: Short name describing the job (e.g. "mpsk-provisioning")
+        items: List of work items
+        worker: Function called with one item, returning a result dictionary
+        max_workers: Size of the worker pool (defaults to JOB_WORKERS or 8)
+
+    Returns:
+        The Job object, already running
+    """
+    if max_workers is None:
+        max_workers = int(os.getenv("JOB_WORKERS", "8"))
+
+    job = Job(kind, items)
+
+    def run_item(index):
+        try:
+            result = worker(job.items[index])
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        job._record(index, result)
+
+    def run():
+        job.status = "running"
+        job.started_at = time.time()
+        JOBS_RUNNING.inc(kind=kind)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                list(executor.map(run_item, range(job.total)))
+            job.status = "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            JOBS_RUNNING.dec(kind=kind)
+            JOB_DURATION.observe(job.finished_at - job.started_at, kind=kind, status=job.status)
+
+    with _jobs_lock:
+        _jobs[job.id] = job
+        _prune_jobs()
+
+    thread = threading.Thread(target=run, name=f"job-{job.id[:8]}", daemon=True)
+    thread.start()
+
+    return job
+
+
+def get_job(job_id):
+    """Return the job with the given ID, or None if it is unknown or was pruned."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def _prune_jobs():
+    """Forget the oldest finished jobs beyond JOB_HISTORY_SIZE. Caller holds _jobs_lock."""
+    history_size = int(os.getenv("JOB_HISTORY_SIZE", "50"))
+
+    finished = [job_id for job_id, job in _jobs.items() if job.status in ("completed", "failed")]
+    while len(_jobs) > history_size and finished:
+        _jobs.pop(finished.pop(0), None)
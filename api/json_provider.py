@@ -0,0 +1,57 @@
+"""
+Flask JSON provider tuned for large API responses.
+
+Uses orjson when it is installed and the standard library otherwise. Either way
+responses are compact and keys keep their insertion order: Flask's default provider
+sorts every object's keys, which costs noticeable time on 50k-entry host lists.
+Responses are indented only in debug mode.
+"""
+import json
+
+from flask.json.provider import JSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dates keep Flask's HTTP-date format instead of orjson's RFC 3339; int keys become strings
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+class FastJSONProvider(JSONProvider):
+    """JSON provider that prefers orjson and never sorts keys."""
+
+    mimetype = "application/json"
+
+    @property
+    def encoder(self):
+        return "orjson" if orjson else "json"
+
+    def _dumps_bytes(self, obj, pretty=False):
+        if orjson:
+            try:
+                return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if pretty else 0))
+            except (orjson.JSONEncodeError, TypeError):
+                # e.g. integers beyond 64 bits; the stdlib handles them
+                pass
+        if pretty:
+            return json.dumps(obj, default=_default, indent=2).encode()
+        return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for specific options (e.g. the tojson filter) get the stdlib
+            kwargs.setdefault("default", _default)
+            return json.dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self._dumps_bytes(obj, pretty=self._app.debug) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,37 @@
+"""
+Process lifecycle hooks: per-worker initialization and shutdown.
+
+Shared clients (the ClearPass HTTP session, the OAuth token, caches, the MPSK pool, the
+list mirror and the trace exporter) are created lazily on first use. When the app is
+loaded in a parent process and forked into workers, init_worker() must run in each
+worker before it serves requests, so every worker builds its own copies instead of
+inheriting half-initialized state, threads that no longer exist, or locks held at fork
+time.
+"""
+import logging
+import os
+
+from api.clearpass import reset_clearpass_state
+from api.mirror import reset_list_mirror
+from api.mpsk import reset_mpsk_pool
+from api.session import reset_session
+from api.shared_cache import reset_shared_cache
+from api.tracing import reset_exporters
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker():
+    """Reset per-process shared state in a freshly forked worker."""
+    reset_session(after_fork=True)
+    reset_clearpass_state()
+    reset_mpsk_pool()
+    reset_exporters()
+    reset_list_mirror()
+    reset_shared_cache()
+    logger.info("Worker %s initialized", os.getpid())
+
+
+def shutdown():
+    """Close the ClearPass session's connections when the process exits."""
+    reset_session()
@@ -0,0 +1,393 @@
+"""
+Queries that look at every static host list at once.
+
+They are answered from the list mirror while it is fresh. Otherwise every list is
+downloaded once per query, however many MACs it asks about, instead of once per MAC.
+
+Set operations between lists (SetQuery) hold each list as a sorted array of 48-bit
+MAC integers, 8 bytes per MAC, and walk all of them in one merge pass, so results
+come out in MAC order as they are found and can be streamed to the client.
+
+Prefix, range and vendor queries (find_macs_in_ranges) are range scans of the
+mirror's integer MAC index.
+
+With LIST_SHARD_SIZE set, every query sees a sharded list as one list: set operations
+load all of its shards under the first shard's id, and matches on overflow shards are
+reported under the logical list's id and name.
+"""
+import bisect
+import heapq
+import itertools
+import logging
+from array import array
+from operator import itemgetter
+
+from api.clearpass import get_static_host_list_details
+from api.mirror import fetch_all_static_host_lists, fetch_static_host_list_names, get_list_mirror
+from api.oui import get_oui_table
+from api.sharding import base_name, find_shards, group_shards, logical_matches, shard_size
+from api.snapshot import host_entries, int_to_mac, mac_to_int
+from api.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+
+def _search_downloaded_lists(macs):
+    """Search freshly downloaded lists for a set of MACs (as integers)."""
+    found = {}
+    for host_list in fetch_all_static_host_lists():
+        entries = host_entries(host_list)
+        # One set intersection per list finds the hits without a Python loop per queried MAC
+        hits = macs.intersection(mac_to_int(address) for address, _ in entries)
+        if not hits:
+            continue
+        for address, description in entries:
+            mac = mac_to_int(address)
+            if mac in hits:
+                found.setdefault(mac, []).append({
+                    "list_id": host_list.get('id'),
+                    "list_name": host_list.get('name', 'Unknown'),
+                    "mac_address": address,
+                    "description": description
+                })
+    return found
+
+
+def search_macs_across_all_static_host_lists(mac_addresses):
+    """
+    Search every static host list for many MAC addresses at once.
+
+    Args:
+        mac_addresses: MAC addresses in any common notation; all must be valid
+
+    Returns:
+        Dictionary with success, message, source ("mirror" or "clearpass") and results,
+        which maps every distinct MAC (colon-separated, lowercase) to the entries found
+        for it, in the same format as the matches of search_mac_across_all_static_host_lists
+
+    Raises:
+        ValueError: If a MAC address is invalid
+    """
+    macs = set()
+    for mac_address in mac_addresses:
+        mac = mac_to_int(str(mac_address))
+        if mac is None:
+            raise ValueError(f"Invalid MAC address: {mac_address}")
+        macs.add(mac)
+
+    with traced("bulk_list_search", macs=len(macs)):
+        mirror = get_list_mirror()
+        found = mirror.search_macs(macs) if mirror else None
+        source = "mirror"
+        if found is None:
+            found = _search_downloaded_lists(macs)
+            source = "clearpass"
+        if shard_size():
+            for entries in found.values():
+                logical_matches(entries)
+
+    logger.info("Searched all static host lists for %s MAC(s) via %s, %s found", len(macs), source, len(found))
+    return {
+        "success": True,
+        "message": f"Found {len(found)} of {len(macs)} MAC address(es) in at least one static host list",
+        "results": {int_to_mac(mac): found.get(mac, []) for mac in sorted(macs)},
+        "source": source
+    }
+
+
+# Operations supported by SetQuery; see its docstring
+SET_OPERATIONS = ("intersection", "union", "difference", "duplicates", "inventory")
+
+
+def sorted_macs(addresses):
+    """Return the distinct valid MACs among addresses as a sorted array of integers."""
+    return array('Q', sorted({mac for mac in map(mac_to_int, addresses) if mac is not None}))
+
+
+def load_sorted_macs(list_ids=None):
+    """
+    Load static host lists as sorted MAC arrays.
+
+    Args:
+        list_ids: Lists to load, each once however often it is given; None loads every list
+
+    Returns:
+        A (lists, source) tuple: lists holds id, name and macs (see sorted_macs) for
+        each list, and source is "mirror" or "clearpass". With LIST_SHARD_SIZE set, a
+        sharded list is loaded once, with every shard's MACs, under its first shard's
+        id and its logical name, whichever of its shards were asked for
+
+    Raises:
+        ValueError: If one of list_ids isn't a known list
+        RuntimeError: If a list could not be downloaded
+    """
+    wanted = list(dict.fromkeys(int(list_id) for list_id in list_ids)) if list_ids is not None else None
+    sharded = shard_size() > 0
+
+    mirror = get_list_mirror()
+    if mirror is not None and mirror.is_fresh():
+        stored = mirror.store.lists()
+        known = {item["id"] for item in stored}
+        for list_id in wanted or []:
+            if list_id not in known:
+                raise ValueError(f"Unknown static host list: {list_id}")
+        if sharded:
+            groups = group_shards(stored)
+        else:
+            groups = {item["id"]: (item["id"], item["name"], [item["id"]]) for item in stored}
+        chosen = {}
+        for list_id in (wanted if wanted is not None else [item["id"] for item in stored]):
+            logical_id, name, shard_ids = groups[list_id]
+            chosen.setdefault(logical_id, (name, shard_ids))
+        return [
+            {
+                "id": logical_id,
+                "name": name,
+                "macs": array('Q', sorted({mac for shard_id in shard_ids for mac in mirror.store.list_macs(shard_id)}))
+            }
+            for logical_id, (name, shard_ids) in chosen.items()
+        ], "mirror"
+
+    # Logical list id -> (name, details of its shards), in the order asked for
+    chosen = {}
+    if wanted is None:
+        host_lists = fetch_all_static_host_lists()
+        by_id = {host_list.get('id'): host_list for host_list in host_lists}
+        if sharded:
+            groups = group_shards([{"id": list_id, "name": item.get('name')} for list_id, item in by_id.items()])
+        else:
+            groups = {list_id: (list_id, item.get('name', 'Unknown'), [list_id]) for list_id, item in by_id.items()}
+        for list_id in by_id:
+            logical_id, name, shard_ids = groups[list_id]
+            chosen.setdefault(logical_id, (name, [by_id[shard_id] for shard_id in shard_ids]))
+    else:
+        known = None
+        for list_id in wanted:
+            result = get_static_host_list_details(list_id)
+            if not result["success"]:
+                # A failed download doesn't say whether the list exists, so look it up
+                if known is None:
+                    known = {str(item["id"]) for item in fetch_static_host_list_names()}
+                if str(list_id) not in known:
+                    raise ValueError(f"Unknown static host list: {list_id}")
+                raise RuntimeError(f"Could not download static host list {list_id}")
+            if sharded:
+                shards = [shard["list_details"] for shard in find_shards(list_id)]
+                chosen.setdefault(shards[0].get('id'), (base_name(shards[0].get('name', 'Unknown')), shards))
+            else:
+                chosen.setdefault(list_id, (result["list_details"].get('name', 'Unknown'), [result["list_details"]]))
+    return [
+        {
+            "id": logical_id,
+            "name": name,
+            "macs": sorted_macs(address for host_list in host_lists for address, _ in host_entries(host_list))
+        }
+        for logical_id, (name, host_lists) in chosen.items()
+    ], "clearpass"
+
+
+def merge_sorted_macs(mac_arrays):
+    """
+    Walk several sorted MAC arrays at once.
+
+    Yields:
+        (mac, indexes) in ascending MAC order, where indexes lists the arrays that
+        contain the MAC
+    """
+    tagged = [zip(macs, itertools.repeat(index)) for index, macs in enumerate(mac_arrays)]
+    for mac, group in itertools.groupby(heapq.merge(*tagged), key=itemgetter(0)):
+        yield mac, [index for _, index in group]
+
+
+class SetQuery:
+    """
+    A set operation over static host lists, with the lists already loaded.
+
+    Operations:
+        intersection   MACs on every list (at least two lists)
+        union          MACs on any list
+        difference     MACs on the first list and none of the others (at least two lists)
+        duplicates     MACs on more than one list
+        inventory      MACs of an uploaded inventory missing from the lists, and MACs
+                       on the lists that aren't in the inventory
+
+    Args:
+        operation: One of SET_OPERATIONS
+        list_ids: Lists to compare, duplicates ignored; None compares every list (union,
+                  duplicates and inventory only)
+        inventory: MAC addresses to compare the lists with (inventory only)
+
+    Raises:
+        ValueError: If the arguments don't fit the operation or a list is unknown
+        RuntimeError: If a list could not be downloaded
+    """
+
+    def __init__(self, operation, list_ids=None, inventory=None):
+        if operation not in SET_OPERATIONS:
+            raise ValueError(f"Unknown operation: {operation}. Use one of: {', '.join(SET_OPERATIONS)}")
+        if list_ids:
+            # A list given twice would count as two lists that always agree
+            list_ids = list(dict.fromkeys(int(list_id) for list_id in list_ids))
+        if operation in ("intersection", "difference") and (not list_ids or len(list_ids) < 2):
+            raise ValueError(f"{operation} needs at least two list_ids")
+        if operation == "inventory" and not inventory:
+            raise ValueError("inventory needs the inventory's MAC addresses")
+
+        self.operation = operation
+        with traced("load_sorted_macs", operation=operation):
+            self.lists, self.source = load_sorted_macs(list_ids or None)
+        if operation in ("intersection", "difference") and len(self.lists) < 2:
+            raise ValueError(f"{operation} needs at least two different lists (shards of one list count once)")
+        self.inventory = sorted_macs(inventory) if operation == "inventory" else None
+
+    def rows(self):
+        """Yield one result per MAC, in MAC order: mac_address, the ids of its lists and, for inventory, status."""
+        list_ids = [item["id"] for item in self.lists]
+        arrays = [item["macs"] for item in self.lists]
+        if self.inventory is not None:
+            # The inventory takes the last index, after the lists
+            arrays.append(self.inventory)
+        merged = merge_sorted_macs(arrays)
+
+        last = len(self.lists) - 1
+        for mac, indexes in merged:
+            if self.operation == "inventory":
+                if indexes[-1] != len(self.lists):
+                    status = "not_in_inventory"
+                elif len(indexes) == 1:
+                    status = "not_in_lists"
+                else:
+                    continue
+                yield {
+                    "mac_address": int_to_mac(mac),
+                    "status": status,
+                    "lists": [list_ids[i] for i in indexes if i <= last]
+                }
+                continue
+
+            if self.operation == "intersection" and len(indexes) != len(self.lists):
+                continue
+            if self.operation == "difference" and indexes != [0]:
+                continue
+            if self.operation == "duplicates" and len(indexes) < 2:
+                continue
+            yield {"mac_address": int_to_mac(mac), "lists": [list_ids[i] for i in indexes]}
+
+    def summary(self):
+        return {
+            "operation": self.operation,
+            "source": self.source,
+            "lists": [{"id": item["id"], "name": item["name"], "macs": len(item["macs"])} for item in self.lists],
+            "inventory": len(self.inventory) if self.inventory is not None else None
+        }
+
+
+# Most entries a prefix, range or vendor query returns; the rest are cut off
+RANGE_QUERY_LIMIT = 10000
+
+
+def parse_mac_prefix(prefix):
+    """
+    Return the range of MACs starting with a prefix such as "00:1A:2B" or "001A2".
+
+    Returns:
+        (low, high), both inclusive, as 48-bit integers
+
+    Raises:
+        ValueError: If the prefix isn't 1 to 12 hex digits
+    """
+    digits = prefix.replace(':', '').replace('-', '').replace('.', '').strip()
+    if not 1 <= len(digits) <= 12 or not all(c in '0123456789ABCDEFabcdef' for c in digits):
+        raise ValueError(f"Invalid MAC prefix: {prefix}")
+    free_bits = 4 * (12 - len(digits))
+    low = int(digits, 16) << free_bits
+    return low, low | ((1 << free_bits) - 1)
+
+
+def vendor_ranges(vendor):
+    """Return the MAC ranges of every OUI whose vendor name contains vendor."""
+    return [(oui << 24, (oui << 24) | 0xFFFFFF) for oui in get_oui_table().ouis_for_vendor(vendor)]
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def _scan_downloaded_lists(ranges):
+    """Find the entries in the given (merged) ranges in freshly downloaded lists."""
+    starts = [low for low, _ in ranges]
+    found = []
+    for host_list in fetch_all_static_host_lists():
+        for address, description in host_entries(host_list):
+            mac = mac_to_int(address)
+            if mac is None:
+                continue
+            position = bisect.bisect_right(starts, mac) - 1
+            if position >= 0 and mac <= ranges[position][1]:
+                found.append((mac, {
+                    "list_id": host_list.get('id'),
+                    "list_name": host_list.get('name', 'Unknown'),
+                    "mac_address": address,
+                    "description": description
+                }))
+    found.sort(key=lambda item: (item[0], item[1]["list_id"]))
+    return [entry for _, entry in found]
+
+
+def find_macs_in_ranges(ranges, limit=RANGE_QUERY_LIMIT, group_by_vendor=False):
+    """
+    Find every list entry whose MAC falls in one of the given ranges.
+
+    Args:
+        ranges: (low, high) pairs of 48-bit integers, both inclusive
+        limit: Most entries to return
+        group_by_vendor: Also group the entries by vendor name
+
+    Returns:
+        Dictionary with success, message, source, truncated and matches (entries in MAC
+        order, each with its vendor, otherwise in the same format as the matches of
+        search_mac_across_all_static_host_lists); with group_by_vendor, also vendors,
+        mapping each vendor name to its entries
+    """
+    ranges = _merge_ranges(ranges)
+
+    with traced("list_range_query", ranges=len(ranges)):
+        mirror = get_list_mirror()
+        if mirror is not None and mirror.is_fresh():
+            source = "mirror"
+            matches = []
+            for low, high in ranges:
+                matches.extend(mirror.store.find_mac_range(low, high, limit + 1 - len(matches)))
+                if len(matches) > limit:
+                    break
+        else:
+            source = "clearpass"
+            matches = _scan_downloaded_lists(ranges)
+
+    truncated = len(matches) > limit
+    matches = matches[:limit]
+    if shard_size():
+        logical_matches(matches)
+    oui_table = get_oui_table()
+    for match in matches:
+        match["vendor"] = oui_table.vendor(mac_to_int(match["mac_address"]))
+
+    result = {
+        "success": True,
+        "message": f"Found {len(matches)}{'+' if truncated else ''} matching entr{'y' if len(matches) == 1 else 'ies'}",
+        "matches": matches,
+        "truncated": truncated,
+        "source": source
+    }
+    if group_by_vendor:
+        vendors = {}
+        for match in matches:
+            vendors.setdefault(match["vendor"] or "Unknown", []).append(match)
+        result["vendors"] = vendors
+    return result
@@ -0,0 +1,168 @@
+"""
+Logging setup and helpers for cheap, structured logs.
+
+Messages use logging's lazy %-formatting, so a DEBUG line costs almost nothing when
+DEBUG is off. Request and response bodies are wrapped with lazy_json() and lazy_body():
+they are only serialized when the record is actually written, and only when
+CLEARPASS_LOG_PAYLOADS is set; otherwise a short size summary is logged instead.
+
+configure_logging() reads:
+
+    LOG_LEVEL          root level (default INFO)
+    LOG_LEVELS         per-logger levels, e.g. "api.clearpass=DEBUG,app.access=WARNING"
+    LOG_FORMAT         "text" (default) or "json" (one JSON object per line)
+    LOG_DEBUG_SAMPLE   write only every Nth DEBUG record per message (default 1, all of them)
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from api.tracing import current_span
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def payloads_enabled():
+    """Whether whole request/response payloads may be written to the log."""
+    return os.getenv("CLEARPASS_LOG_PAYLOADS", "").lower() in ("1", "true", "yes")
+
+
+class _Payload:
+    def __init__(self, obj, limit):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self):
+        if not payloads_enabled():
+            if isinstance(self.obj, dict):
+                return f"<dict with {len(self.obj)} keys>"
+            if isinstance(self.obj, (list, tuple)):
+                return f"<list of {len(self.obj)} items>"
+            return f"<{type(self.obj).__name__}>"
+
+        # Encode incrementally and stop at the limit instead of serializing everything
+        text = ''
+        for chunk in json.JSONEncoder(default=str).iterencode(self.obj):
+            text += chunk
+            if len(text) > self.limit:
+                return text[:self.limit] + '...'
+        return text
+
+
+class _ResponseBody:
+    def __init__(self, response, limit):
+        self.response = response
+        self.limit = limit
+
+    def __str__(self):
+        content = self.response.content or b''
+        if not content:
+            return 'No content'
+        if not payloads_enabled():
+            return f"<{len(content)} bytes>"
+        text = content[:self.limit].decode(self.response.encoding or 'utf-8', errors='replace')
+        return text + ('...' if len(content) > self.limit else '')
+
+
+def lazy_json(obj, limit=500):
+    """Log argument that renders obj as JSON (up to limit characters) only when payload logging is on."""
+    return _Payload(obj, limit)
+
+
+def lazy_body(response, limit=500):
+    """Log argument that renders a response body (up to limit bytes) only when payload logging is on."""
+    return _ResponseBody(response, limit)
+
+
+def sampled(every):
+    """extra= for a high-volume message: only every Nth record with the same message is written."""
+    return {"sample_every": every}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass every Nth record per (logger, message template).
+
+    N comes from the record's sample_every attribute (see sampled()), or debug_every for
+    DEBUG records without one. Written records carry the rate they were sampled at.
+    """
+
+    def __init__(self, debug_every=1):
+        super().__init__()
+        self.debug_every = max(1, debug_every)
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        every = getattr(record, 'sample_every', None)
+        if every is None:
+            every = self.debug_every if record.levelno <= logging.DEBUG else 1
+        if every <= 1:
+            return True
+
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts[key]
+            self._counts[key] = count + 1
+        record.sample_every = every
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including extra= fields and the trace ID."""
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+
+        span = current_span()
+        if span is not None:
+            data["trace_id"] = span.trace_id
+
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    """Set up the root handler, levels, sampling and format from the environment."""
+    handler = logging.StreamHandler()
+    if os.getenv("LOG_FORMAT", "text").lower() == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(SamplingFilter(int(os.getenv("LOG_DEBUG_SAMPLE", "1"))))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    for name, level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(level)
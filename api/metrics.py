@@ -0,0 +1,289 @@
+"""
+Minimal Prometheus-compatible metrics for the web app and the ClearPass client.
+
+Counters, gauges and histograms are kept in process memory and rendered in the
+Prometheus text exposition format (version 0.0.4) by render(). Values that already
+live elsewhere, such as cache statistics, are read at scrape time by collectors
+registered with add_collector().
+"""
+import bisect
+import threading
+
+from api.session import add_request_listener, session_stats
+from api.upstream import path_template
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        if not self.labelnames and self.type_name != 'histogram':
+            # Unlabelled counters and gauges are exported as 0 before the first update
+            self._values[()] = 0
+        with _registry_lock:
+            _metrics.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, optionally split by labels."""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally split by labels."""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative histogram of observed values, optionally split by labels."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            state["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), state["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def add_collector(collector):
+    """
+    Register a function called at scrape time to refresh gauges.
+
+    Collectors should set gauge values from state that lives elsewhere (cache
+    statistics, pool levels) instead of updating them on every change.
+    """
+    with _registry_lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        collectors = list(_collectors)
+        metrics = list(_metrics)
+
+    for collector in collectors:
+        try:
+            collector()
+        except Exception:
+            # A broken collector must not take the whole scrape down
+            pass
+
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics shared by the web app and the ClearPass client
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time spent serving web requests, by Flask route.',
+    ('method', 'route', 'status')
+)
+APP_STARTUP_SECONDS = Gauge('app_startup_seconds', 'Time from importing the app module to the app being ready.')
+CLEARPASS_REQUEST_DURATION = Histogram(
+    'clearpass_request_duration_seconds',
+    'Time spent on ClearPass API calls, by path template.',
+    ('method', 'path', 'status')
+)
+CLEARPASS_TOKEN_REFRESHES = Counter(
+    'clearpass_token_refreshes_total',
+    'OAuth tokens fetched from ClearPass.'
+)
+CACHE_HITS = Gauge('cache_hits', 'Cache lookups served from the cache.', ('cache',))
+CACHE_MISSES = Gauge('cache_misses', 'Cache lookups that missed.', ('cache',))
+CACHE_HIT_RATIO = Gauge('cache_hit_ratio', 'Fraction of cache lookups served from the cache.', ('cache',))
+CACHE_ENTRIES = Gauge('cache_entries', 'Entries currently held in the cache.', ('cache',))
+CACHE_BYTES = Gauge('cache_bytes', 'Bytes of cached data, by tier (memory, hot, disk).', ('cache', 'tier'))
+CACHE_BUDGET_BYTES = Gauge('cache_budget_bytes', 'Byte budget of each cache tier.', ('cache', 'tier'))
+CACHE_WRITE_THROUGH = Counter(
+    'cache_write_through_total',
+    'Cached entries updated or dropped after the app wrote to ClearPass.',
+    ('cache', 'action')
+)
+CACHE_TIER_HITS = Gauge('cache_tier_hits', 'Cache lookups served, by the tier that served them.', ('cache', 'tier'))
+CLEARPASS_POOL_SIZE = Gauge('clearpass_pool_size', 'Keep-alive connections allowed per ClearPass host.')
+CLEARPASS_REQUESTS_IN_FLIGHT = Gauge('clearpass_requests_in_flight', 'ClearPass calls currently in progress.')
+CLEARPASS_POOL_UTILIZATION = Gauge('clearpass_pool_utilization', 'ClearPass calls in progress as a fraction of the pool size.')
+JOB_ITEMS_PROCESSED = Counter('job_items_processed_total', 'Items processed by background jobs.', ('kind', 'status'))
+JOBS_RUNNING = Gauge('jobs_running', 'Background jobs currently running.', ('kind',))
+JOB_DURATION = Histogram(
+    'job_duration_seconds',
+    'Wall-clock time of finished background jobs.',
+    ('kind', 'status'),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+MPSK_POOL_PASSWORDS = Gauge('mpsk_pool_passwords', 'Pre-generated MPSK passwords ready to serve.')
+MPSK_GENERATED = Gauge('mpsk_generated', 'MPSK passwords generated by the pool.')
+MPSK_GENERATION_RATE = Gauge('mpsk_generation_passwords_per_second', 'MPSK pool generation throughput.')
+LIST_MIRROR_SYNC_LAG = Gauge('list_mirror_sync_lag_seconds', 'Seconds since the static host list mirror was last synced.')
+LIST_MIRROR_SYNC_DURATION = Histogram(
+    'list_mirror_sync_duration_seconds',
+    'Time taken to download and store every static host list.',
+    ('status',),
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+)
+LIST_MIRROR_LISTS = Gauge('list_mirror_lists', 'Static host lists held in the mirror.')
+LIST_MIRROR_ENTRIES = Gauge('list_mirror_entries', 'Host entries held in the mirror.')
+LIST_MIRROR_FILTER_BYTES = Gauge('list_mirror_filter_bytes', 'Size of the MAC Bloom filter in this worker.')
+LIST_MIRROR_FILTER_LOOKUPS = Counter(
+    'list_mirror_filter_lookups_total',
+    'Mirror searches by MAC filter outcome: negative (answered by the filter), hit, false_positive or bypassed.',
+    ('result',)
+)
+LIST_MIRROR_READS = Counter(
+    'list_mirror_reads_total',
+    'Reads answered from the mirror (served) or passed to ClearPass because it was too old (stale).',
+    ('result',)
+)
+
+
+def add_cache_collector(name, stats):
+    """
+    Export a cache's statistics under cache="name".
+
+    Args:
+        name: Label value identifying the cache
+        stats: Function returning a dictionary with "hits", "misses", "hit_ratio" and "size" keys,
+               or None while the cache doesn't exist
+    """
+    def collect():
+        cache_stats = stats()
+        if cache_stats is None:
+            return
+        CACHE_HITS.set(cache_stats["hits"], cache=name)
+        CACHE_MISSES.set(cache_stats["misses"], cache=name)
+        CACHE_HIT_RATIO.set(cache_stats["hit_ratio"], cache=name)
+        CACHE_ENTRIES.set(cache_stats["size"], cache=name)
+        # Byte-budgeted caches (TieredCache) also report per-tier sizes
+        if "memory_bytes" in cache_stats:
+            for tier in ("memory", "hot", "disk"):
+                CACHE_BYTES.set(cache_stats[f"{tier}_bytes"], cache=name, tier=tier)
+            CACHE_BUDGET_BYTES.set(cache_stats["memory_budget"], cache=name, tier="memory")
+            CACHE_BUDGET_BYTES.set(cache_stats["disk_budget"], cache=name, tier="disk")
+            CACHE_TIER_HITS.set(cache_stats["memory_hits"], cache=name, tier="memory")
+            CACHE_TIER_HITS.set(cache_stats["disk_hits"], cache=name, tier="disk")
+
+    add_collector(collect)
+
+
+def _collect_session_pool():
+    pool_stats = session_stats()
+    if pool_stats is None:
+        return
+    CLEARPASS_POOL_SIZE.set(pool_stats["pool_size"])
+    CLEARPASS_REQUESTS_IN_FLIGHT.set(pool_stats["in_flight"])
+    CLEARPASS_POOL_UTILIZATION.set(pool_stats["in_flight"] / pool_stats["pool_size"] if pool_stats["pool_size"] else 0)
+
+
+def _observe_clearpass_call(method, url, status_code, elapsed, error):
+    CLEARPASS_REQUEST_DURATION.observe(
+        elapsed,
+        method=method,
+        path=path_template(url),
+        status=str(status_code) if status_code is not None else "error"
+    )
+
+
+add_request_listener(_observe_clearpass_call)
+add_collector(_collect_session_pool)
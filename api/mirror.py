@@ -0,0 +1,428 @@
+"""
+Local mirror of the ClearPass static host lists, persisted in a SQLite snapshot.
+
+A background thread downloads every list at a fixed interval and stores it with
+SnapshotStore. Searches across all lists are answered from the snapshot while it is
+fresh enough, instead of downloading every list from ClearPass for each search.
+
+Because the snapshot is on disk, a restarted process or a new gunicorn worker has a
+warm mirror as soon as it opens the file. Workers sharing the file take a lease
+before syncing, so only one of them downloads the lists each interval.
+
+Each worker also keeps a Bloom filter of every MAC in the snapshot. Most lookups are
+for MACs that aren't on any list, and the filter answers those from memory without
+touching the database. After a sync it is updated by adding the MACs of the lists
+whose version changed; it is rebuilt from scratch only when lists were deleted or it
+has filled up. While it lags behind the snapshot it is bypassed, so it never causes
+a false "not found".
+
+Enabled by setting LIST_MIRROR_PATH; also reads LIST_MIRROR_SYNC_INTERVAL (seconds
+between syncs, default 60) and LIST_MIRROR_MAX_AGE (oldest snapshot that is still
+used, default 600 seconds).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+
+from api.bloom import BloomFilter
+from api.clearpass import find_api_endpoint, get_clearpass_token
+from api.metrics import (
+    LIST_MIRROR_ENTRIES, LIST_MIRROR_FILTER_BYTES, LIST_MIRROR_FILTER_LOOKUPS, LIST_MIRROR_LISTS,
+    LIST_MIRROR_READS, LIST_MIRROR_SYNC_DURATION, LIST_MIRROR_SYNC_LAG, add_collector
+)
+from api.snapshot import SnapshotStore, mac_to_int
+from api.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Lists requested per page when downloading the list of static host lists
+PAGE_SIZE = 1000
+
+# False-positive rate of the MAC filter; filters are sized for twice the current MACs
+FILTER_ERROR_RATE = 0.01
+
+
+def _list_items(response_data):
+    if isinstance(response_data, list):
+        return response_data
+    if isinstance(response_data, dict):
+        if '_embedded' in response_data and 'items' in response_data['_embedded']:
+            return response_data['_embedded']['items']
+        if isinstance(response_data.get('static-host-lists'), list):
+            return response_data['static-host-lists']
+    return []
+
+
+def _fetch_list_collection(token):
+    """
+    Page through the static host list collection.
+
+    Returns:
+        The collection's items by list id, in ClearPass's format
+
+    Raises:
+        RuntimeError: If a page of lists could not be downloaded
+    """
+    host_lists = {}
+    offset = 0
+    while True:
+        endpoint_url, response_data = find_api_endpoint(
+            token, [f"static-host-list?offset={offset}&limit={PAGE_SIZE}"]
+        )
+        if not endpoint_url:
+            raise RuntimeError("Could not download the static host lists")
+
+        items = _list_items(response_data)
+        new_items = [item for item in items if item.get('id') not in host_lists]
+        for item in new_items:
+            host_lists[item.get('id')] = item
+
+        # Servers that ignore paging return everything on the first page
+        if len(items) < PAGE_SIZE or not new_items:
+            break
+        offset += len(items)
+    return host_lists
+
+
+def fetch_static_host_list_names():
+    """
+    Return the id and name of every static host list, from every page of the collection.
+
+    Raises:
+        RuntimeError: If a page of lists could not be downloaded
+    """
+    return [
+        {"id": list_id, "name": item.get('name')}
+        for list_id, item in _fetch_list_collection(get_clearpass_token()).items()
+    ]
+
+
+def fetch_all_static_host_lists():
+    """
+    Download every static host list from ClearPass, including its entries.
+
+    Lists whose entries aren't included in the collection response are fetched one
+    by one.
+
+    Returns:
+        A list of list details in ClearPass's format
+
+    Raises:
+        RuntimeError: If a page of lists or a single list could not be downloaded
+    """
+    token = get_clearpass_token()
+    host_lists = _fetch_list_collection(token)
+
+    for list_id, item in host_lists.items():
+        if 'host_entries' not in item and 'hosts' not in item:
+            endpoint_url, details = find_api_endpoint(token, [f"static-host-list/{list_id}"])
+            if not endpoint_url:
+                raise RuntimeError(f"Could not download static host list {list_id}")
+            host_lists[list_id] = details
+
+    return list(host_lists.values())
+
+
+class ListMirror:
+    """
+    Periodically synced copy of all static host lists.
+
+    Args:
+        store: SnapshotStore holding the synced lists
+        sync_interval: Seconds between syncs
+        max_age: Oldest snapshot, in seconds, that reads are answered from
+    """
+
+    def __init__(self, store, sync_interval=60, max_age=600):
+        self.store = store
+        self.sync_interval = sync_interval
+        self.max_age = max_age
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._sync_lock = threading.Lock()
+        # (BloomFilter, snapshot generation it matches), replaced as one so readers
+        # never pair a filter with another filter's generation
+        self._filter_state = (None, None)
+        self._filter_versions = {}
+        self._filter_lock = threading.Lock()
+        self._filter_refreshing = False
+
+    def age(self):
+        """Return seconds since the last complete sync, or None if there hasn't been one."""
+        synced_at = self.store.synced_at()
+        if synced_at is None:
+            return None
+        return max(0.0, time.time() - synced_at)
+
+    def is_fresh(self):
+        age = self.age()
+        return age is not None and age <= self.max_age
+
+    def sync(self):
+        """
+        Download every list and store it, replacing the previous snapshot.
+
+        Returns:
+            The number of lists whose contents changed
+        """
+        with self._sync_lock:
+            start = time.perf_counter()
+            status = "error"
+            try:
+                with traced("list_mirror_sync"):
+                    host_lists = fetch_all_static_host_lists()
+                    changed = self.store.replace_lists(host_lists, complete=True)
+                status = "ok"
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            finally:
+                LIST_MIRROR_SYNC_DURATION.observe(time.perf_counter() - start, status=status)
+
+        logger.info(
+            "Synced %s static host list(s) in %.1fms, %s changed",
+            len(host_lists), (time.perf_counter() - start) * 1000, changed
+        )
+        return changed
+
+    def sync_if_due(self):
+        """Sync if the snapshot is older than the sync interval and no other worker is syncing it."""
+        age = self.age()
+        if age is not None and age < self.sync_interval:
+            return False
+        # Held for two intervals, so a worker that dies mid-sync only delays the next one
+        if not self.store.acquire_lease("sync", self.owner, self.sync_interval * 2):
+            return False
+        self.sync()
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_if_due()
+            except Exception as e:
+                logger.warning("Static host list sync failed: %s", e)
+            try:
+                # Also picks up syncs and writes made by other workers
+                self.refresh_filter()
+            except Exception as e:
+                logger.warning("MAC filter refresh failed: %s", e)
+            self._stop.wait(max(1.0, self.sync_interval / 4))
+
+    def refresh_filter(self):
+        """Bring the MAC filter up to date with the snapshot."""
+        with self._filter_lock:
+            generation = self.store.generation()
+            bloom, filter_generation = self._filter_state
+            if bloom is not None and generation == filter_generation:
+                return
+
+            lists = self.store.lists()
+            versions = {item["id"]: item["version"] for item in lists}
+            changed = [item for item in lists if self._filter_versions.get(item["id"]) != item["version"]]
+            deleted = set(self._filter_versions) - set(versions)
+
+            start = time.perf_counter()
+            # Rebuild once the snapshot outgrows the filter, or once MACs removed from lists
+            # have left it as full as a filter at capacity (bloom.count only counts MACs
+            # that set new bits, so re-adding a changed list's MACs doesn't move it)
+            entries = sum(item["entry_count"] for item in lists)
+            if bloom is None or deleted or max(entries, bloom.count) > bloom.capacity:
+                macs = self.store.list_macs()
+                bloom = BloomFilter(capacity=max(1024, len(macs) * 2), error_rate=FILTER_ERROR_RATE)
+                bloom.update(macs)
+                action = "rebuilt"
+            else:
+                # Adding only sets bits, so readers of the current filter are never misled
+                for item in changed:
+                    bloom.update(self.store.list_macs(item["id"]))
+                action = f"updated with {len(changed)} list(s)"
+
+            self._filter_versions = versions
+            self._filter_state = (bloom, generation)
+
+        logger.debug(
+            "MAC filter %s in %.1fms (%s MACs, %s bytes)",
+            action, (time.perf_counter() - start) * 1000, bloom.count, bloom.size_bytes
+        )
+
+    def _refresh_filter_in_background(self):
+        with self._filter_lock:
+            if self._filter_refreshing:
+                return
+            self._filter_refreshing = True
+
+        def run():
+            try:
+                self.refresh_filter()
+            except Exception as e:
+                logger.warning("MAC filter refresh failed: %s", e)
+            finally:
+                with self._filter_lock:
+                    self._filter_refreshing = False
+
+        threading.Thread(target=run, name="list-mirror-filter", daemon=True).start()
+
+    def might_contain(self, mac, generation=None):
+        """
+        Return False only if the MAC (an integer) is certainly in no stored list.
+
+        Returns True, so the caller checks the snapshot, while the filter doesn't exist
+        yet or lags behind the snapshot; a refresh is started in the background then.
+
+        Args:
+            mac: MAC address as returned by mac_to_int
+            generation: The snapshot's current generation, if the caller already read it
+        """
+        return self._check_filter(mac, generation) is not False
+
+    def _check_filter(self, mac, generation=None):
+        """Like might_contain, but return None if the filter was bypassed."""
+        if generation is None:
+            generation = self.store.generation()
+        bloom, filter_generation = self._filter_state
+        if bloom is None or generation != filter_generation:
+            self._refresh_filter_in_background()
+            LIST_MIRROR_FILTER_LOOKUPS.inc(result="bypassed")
+            return None
+        return mac in bloom
+
+    def start(self):
+        """Start the background sync thread if it isn't running."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="list-mirror-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def search_mac(self, mac_address):
+        """
+        Search every list for a MAC address.
+
+        Returns:
+            A result in the same format as search_mac_across_all_static_host_lists, or
+            None if the snapshot is missing or too old and ClearPass must be asked
+        """
+        synced_at, generation = self.store.sync_state()
+        if synced_at is None or time.time() - synced_at > self.max_age:
+            LIST_MIRROR_READS.inc(result="stale")
+            return None
+        LIST_MIRROR_READS.inc(result="served")
+
+        mac = mac_to_int(mac_address)
+        consulted = self._check_filter(mac, generation) if mac is not None else None
+        if consulted is False:
+            LIST_MIRROR_FILTER_LOOKUPS.inc(result="negative")
+            matches = []
+        else:
+            matches = self.store.find_mac(mac_address)
+            # Bypassed lookups were already counted as such
+            if consulted:
+                LIST_MIRROR_FILTER_LOOKUPS.inc(result="hit" if matches else "false_positive")
+        return {
+            "success": True,
+            "message": (f"Found MAC address in {len(matches)} static host list(s)" if matches
+                        else "MAC address not found in any static host list"),
+            "matches": matches,
+            "source": "mirror"
+        }
+
+    def search_macs(self, macs):
+        """
+        Search every list for many MACs (as integers) at once.
+
+        MACs the filter rules out are dropped before the snapshot is queried.
+
+        Returns:
+            A dictionary mapping each MAC found to its entries (see SnapshotStore.find_macs),
+            or None if the snapshot is missing or too old and ClearPass must be asked
+        """
+        synced_at, generation = self.store.sync_state()
+        if synced_at is None or time.time() - synced_at > self.max_age:
+            LIST_MIRROR_READS.inc(result="stale")
+            return None
+        LIST_MIRROR_READS.inc(result="served")
+
+        candidates = [mac for mac in macs if self.might_contain(mac, generation)]
+        LIST_MIRROR_FILTER_LOOKUPS.inc(len(macs) - len(candidates), result="negative")
+        return self.store.find_macs(candidates)
+
+    def stats(self):
+        counts = self.store.counts()
+        bloom, _ = self._filter_state
+        return {
+            "path": self.store.path,
+            "lists": counts["lists"],
+            "entries": counts["entries"],
+            "age_seconds": self.age(),
+            "last_error": self.last_error,
+            "filter": bloom.stats() if bloom is not None else None
+        }
+
+
+# Mirror used by the web app, created on first use
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_list_mirror():
+    """
+    Return the shared list mirror, or None if LIST_MIRROR_PATH isn't set.
+
+    The first call opens (or creates) the snapshot and starts the sync thread.
+    """
+    global _mirror
+
+    if _mirror is None:
+        path = os.getenv("LIST_MIRROR_PATH")
+        if not path:
+            return None
+        with _mirror_lock:
+            if _mirror is None:
+                mirror = ListMirror(
+                    SnapshotStore(path),
+                    sync_interval=float(os.getenv("LIST_MIRROR_SYNC_INTERVAL", "60")),
+                    max_age=float(os.getenv("LIST_MIRROR_MAX_AGE", "600"))
+                )
+                mirror.start()
+                _mirror = mirror
+                logger.info("List mirror opened at %s (snapshot age %s)", path, mirror.age())
+
+    return _mirror
+
+
+def reset_list_mirror():
+    """
+    Drop the shared mirror so the next get_list_mirror() opens the snapshot again.
+
+    Used in freshly forked workers, which don't inherit the parent's sync thread and
+    must not share its database connections.
+    """
+    global _mirror, _mirror_lock
+
+    if _mirror is not None:
+        _mirror.stop()
+    _mirror_lock = threading.Lock()
+    _mirror = None
+
+
+def _collect_mirror_metrics():
+    if _mirror is None:
+        return
+    mirror_stats = _mirror.stats()
+    LIST_MIRROR_LISTS.set(mirror_stats["lists"])
+    LIST_MIRROR_ENTRIES.set(mirror_stats["entries"])
+    if mirror_stats["age_seconds"] is not None:
+        LIST_MIRROR_SYNC_LAG.set(mirror_stats["age_seconds"])
+    if mirror_stats["filter"] is not None:
+        LIST_MIRROR_FILTER_BYTES.set(mirror_stats["filter"]["bytes"])
+
+
+add_collector(_collect_mirror_metrics)
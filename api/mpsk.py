@@ -0,0 +1,248 @@
+import os
+import threading
+import time
+from collections import deque
+
+from api.metrics import MPSK_GENERATED, MPSK_GENERATION_RATE, MPSK_POOL_PASSWORDS, add_collector
+
+# Character classes used for pronounceable passwords
+VOWELS = 'aeiou'
+CONSONANTS = 'bcdfghjklmnpqrstvwxyz'
+LOWERCASE = 'abcdefghijklmnopqrstuvwxyz'
+UPPERCASE = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+DIGITS = '0123456789'
+SPECIALS = '!@#$%^&*()-_=+'
+
+# Precomputed (translate table, rejected bytes) per alphabet
+_alphabet_tables = {}
+
+
+def _alphabet_table(alphabet):
+    """
+    Build a bytes.translate() table that maps random bytes onto alphabet.
+
+    Bytes at or above the largest multiple of len(alphabet) are rejected rather than
+    wrapped, so every character stays equally likely.
+    """
+    table = _alphabet_tables.get(alphabet)
+    if table is None:
+        size = len(alphabet)
+        limit = 256 - (256 % size)
+        mapping = bytes(ord(alphabet[b % size]) if b < limit else 0 for b in range(256))
+        rejected = bytes(range(limit, 256))
+        table = (mapping, rejected)
+        _alphabet_tables[alphabet] = table
+    return table
+
+
+def random_chars(alphabet, count):
+    """
+    Return count characters drawn uniformly from alphabet using os.urandom.
+
+    Random bytes are mapped to characters with bytes.translate(), which also drops the
+    rejected bytes, so the whole batch is mapped in C instead of a Python loop.
+    """
+    if count <= 0:
+        return ''
+
+    mapping, rejected = _alphabet_table(alphabet)
+    # Over-request by the expected rejection rate plus a little slack
+    accept_ratio = (256 - len(rejected)) / 256
+    chunks = []
+    needed = count
+    while needed > 0:
+        chunk = os.urandom(int(needed / accept_ratio) + 16).translate(mapping, rejected)
+        chunks.append(chunk[:needed])
+        needed -= len(chunks[-1])
+
+    return b''.join(chunks).decode('ascii')
+
+
+def generate_mpsk_batch(count, length=20):
+    """
+    Generate count pronounceable MPSK passwords using the operating system CSPRNG.
+
+    Each password has the same shape as generate_pronounceable_mpsk always produced:
+    consonant+vowel pairs plus one uppercase letter, one digit and one special character,
+    padded with lowercase letters and shuffled. All characters for the batch are drawn
+    in a handful of os.urandom calls.
+
+    Args:
+        count: Number of passwords to generate
+        length: Length of each password (default is 20, minimum 3)
+
+    Returns:
+        A list of password strings
+    """
+    if count <= 0:
+        return []
+    if length < 3:
+        raise ValueError("MPSK length must be at least 3")
+
+    pairs = max(0, (length - 4) // 2)
+    padding = length - pairs * 2 - 3
+
+    consonants = random_chars(CONSONANTS, count * pairs)
+    vowels = random_chars(VOWELS, count * pairs)
+    uppercase = random_chars(UPPERCASE, count)
+    digits = random_chars(DIGITS, count)
+    specials = random_chars(SPECIALS, count)
+    lowercase = random_chars(LOWERCASE, count * padding)
+
+    # 32-bit random sort keys give a uniform shuffle (ties are vanishingly rare)
+    sort_keys = memoryview(os.urandom(4 * length * count)).cast('I')
+    positions = range(length)
+
+    # The characters are shuffled anyway, so each password is just its slices concatenated
+    passwords = []
+    for n in range(count):
+        chars = (
+            consonants[n * pairs:(n + 1) * pairs]
+            + vowels[n * pairs:(n + 1) * pairs]
+            + uppercase[n] + digits[n] + specials[n]
+            + lowercase[n * padding:(n + 1) * padding]
+        )
+
+        keys = sort_keys[n * length:(n + 1) * length]
+        order = sorted(positions, key=keys.__getitem__)
+        passwords.append(''.join([chars[i] for i in order]))
+
+    return passwords
+
+
+class MpskPool:
+    """
+    Refillable pool of pre-generated MPSK passwords of one length.
+
+    take() serves passwords from the pool and tops up synchronously only if the pool
+    runs dry. Whenever the pool drops below its low-water mark a background thread
+    refills it, keeping generation off the request path.
+
+    Args:
+        length: Length of the pooled passwords
+        size: Number of passwords the pool is refilled to
+        low_water: Fraction of size below which a background refill starts
+    """
+
+    def __init__(self, length=20, size=1000, low_water=0.25):
+        self.length = length
+        self.size = size
+        self.low_water = int(size * low_water)
+        self._passwords = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+        self.served = 0
+        self.served_from_pool = 0
+        self.generated = 0
+        self.generation_seconds = 0.0
+
+    def _generate(self, count):
+        start = time.perf_counter()
+        passwords = generate_mpsk_batch(count, self.length)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.generated += count
+            self.generation_seconds += elapsed
+        return passwords
+
+    def refill(self):
+        """Top the pool up to its configured size. Runs on the caller's thread."""
+        with self._lock:
+            missing = self.size - len(self._passwords)
+        if missing > 0:
+            passwords = self._generate(missing)
+            with self._lock:
+                self._passwords.extend(passwords)
+
+    def _refill_in_background(self):
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        def run():
+            try:
+                self.refill()
+            finally:
+                with self._lock:
+                    self._refilling = False
+
+        threading.Thread(target=run, name="mpsk-pool-refill", daemon=True).start()
+
+    def take(self, count=1):
+        """Return count passwords, preferring pre-generated ones."""
+        passwords = []
+        with self._lock:
+            while self._passwords and len(passwords) < count:
+                passwords.append(self._passwords.popleft())
+            remaining = len(self._passwords)
+            self.served += count
+            self.served_from_pool += len(passwords)
+
+        if len(passwords) < count:
+            passwords.extend(self._generate(count - len(passwords)))
+
+        if remaining < self.low_water:
+            self._refill_in_background()
+
+        return passwords
+
+    def stats(self):
+        """Return pool size, hit counters and generation throughput."""
+        with self._lock:
+            return {
+                "length": self.length,
+                "pooled": len(self._passwords),
+                "size": self.size,
+                "served": self.served,
+                "served_from_pool": self.served_from_pool,
+                "generated": self.generated,
+                "generation_seconds": self.generation_seconds,
+                "passwords_per_second": (self.generated / self.generation_seconds) if self.generation_seconds else None
+            }
+
+
+# Pool of default-length passwords, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_mpsk_pool():
+    """
+    Return the shared pool of 20-character MPSK passwords.
+
+    The pool size is read from MPSK_POOL_SIZE (default 1000) when it is first created.
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = MpskPool(length=20, size=int(os.getenv("MPSK_POOL_SIZE", "1000")))
+
+    return _pool
+
+
+def reset_mpsk_pool():
+    """
+    Drop the shared pool so the next get_mpsk_pool() builds a new one.
+
+    Used in freshly forked workers: the parent's refill thread doesn't exist in the
+    child, and its lock may have been held at fork time.
+    """
+    global _pool, _pool_lock
+
+    _pool_lock = threading.Lock()
+    _pool = None
+
+
+def _collect_pool_metrics():
+    if _pool is None:
+        return
+    pool_stats = _pool.stats()
+    MPSK_POOL_PASSWORDS.set(pool_stats["pooled"])
+    MPSK_GENERATED.set(pool_stats["generated"])
+    MPSK_GENERATION_RATE.set(pool_stats["passwords_per_second"] or 0)
+
+
+add_collector(_collect_pool_metrics)
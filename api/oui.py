@@ -0,0 +1,90 @@
+"""
+MAC vendor lookup from the IEEE OUI (MA-L) table.
+
+The table is a tab-separated file of 24-bit OUIs and organization names, pre-parsed
+from IEEE's oui.csv by tools/build_oui_table.py. It is loaded once per process into a
+sorted array of OUIs with a parallel array of indexes into the distinct vendor names,
+so the full ~35,000-entry table takes well under a megabyte and a lookup is a binary
+search.
+
+The bundled api/data/oui.tsv only covers common vendors; set OUI_TABLE_PATH to a
+table built from the full IEEE registry.
+"""
+import bisect
+import logging
+import os
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TABLE_PATH = os.path.join(os.path.dirname(__file__), "data", "oui.tsv")
+
+
+class OUITable:
+    """
+    Vendor names by OUI.
+
+    Args:
+        entries: (oui, vendor) pairs, OUIs as 24-bit integers, in any order
+    """
+
+    def __init__(self, entries):
+        vendors = {}
+        pairs = sorted(entries)
+        self.ouis = array('L', (oui for oui, _ in pairs))
+        self._vendor_index = array('L', (vendors.setdefault(vendor, len(vendors)) for _, vendor in pairs))
+        self.vendors = list(vendors)
+
+    def __len__(self):
+        return len(self.ouis)
+
+    def vendor(self, mac):
+        """Return the vendor of a MAC (a 48-bit integer), or None if its OUI isn't in the table."""
+        oui = mac >> 24
+        position = bisect.bisect_left(self.ouis, oui)
+        if position < len(self.ouis) and self.ouis[position] == oui:
+            return self.vendors[self._vendor_index[position]]
+        return None
+
+    def ouis_for_vendor(self, text):
+        """Return the OUIs of every vendor whose name contains text (case-insensitive), in order."""
+        text = text.lower()
+        matching = {index for index, vendor in enumerate(self.vendors) if text in vendor.lower()}
+        return [oui for oui, index in zip(self.ouis, self._vendor_index) if index in matching]
+
+
+def load_oui_table(path):
+    """
+    Read a table written by tools/build_oui_table.py.
+
+    Lines are "<6 hex digits>\\t<vendor>"; blank lines and # comments are skipped.
+    """
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            oui, _, vendor = line.partition('\t')
+            entries.append((int(oui, 16), vendor))
+    return OUITable(entries)
+
+
+# Table used by the web app, loaded on first use
+_oui_table = None
+_oui_table_lock = threading.Lock()
+
+
+def get_oui_table():
+    """Return the OUI table from OUI_TABLE_PATH, or the bundled one."""
+    global _oui_table
+
+    if _oui_table is None:
+        with _oui_table_lock:
+            if _oui_table is None:
+                path = os.getenv("OUI_TABLE_PATH") or DEFAULT_TABLE_PATH
+                _oui_table = load_oui_table(path)
+                logger.info("Loaded %s OUI(s) from %s", len(_oui_table), path)
+
+    return _oui_table
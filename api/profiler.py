@@ -0,0 +1,136 @@
+"""
+Low-overhead sampling profiler for diagnosing a running process.
+
+A profile samples the stack of every thread with sys._current_frames() at a fixed
+interval and counts identical stacks. The result is written in the collapsed-stack
+format read by flamegraph.pl and speedscope: one line per stack, frames separated by
+semicolons, followed by the sample count.
+
+Code can label what it is doing with phase(); samples taken inside a phase get a
+"[phase] <name>" frame at the root of their stack, so the flame graph splits time by
+phase (token_fetch, list_download, json_parse, dedupe, patch, ...) before code path.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Phase labels of each thread, innermost last; read by the sampler from another thread
+_thread_phases = {}
+
+# Only one profile runs at a time
+_profile_lock = threading.Lock()
+
+# Leaf frames of threads that are waiting for work rather than doing it
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("selectors", "select"),
+    ("socket", "accept"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+
+@contextmanager
+def phase(name):
+    """
+    Label the block as a named phase for the profiler.
+
+    Costs two list operations when no profile is running, so it is safe on hot paths.
+    """
+    ident = threading.get_ident()
+    stack = _thread_phases.get(ident)
+    if stack is None:
+        stack = _thread_phases[ident] = []
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+        if not stack:
+            _thread_phases.pop(ident, None)
+
+
+def _frame_label(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Sample all threads except the caller's for a fixed duration.
+
+    Args:
+        interval: Seconds between samples
+        include_idle: Keep stacks of threads that are only waiting for work
+        max_depth: Frames kept per stack, counted from the innermost
+    """
+
+    def __init__(self, interval=0.005, include_idle=False, max_depth=128):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def sample(self, skip_ident=None):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip_ident:
+                continue
+
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                frames.append(frame)
+                frame = frame.f_back
+            if not frames:
+                continue
+
+            leaf = frames[0]
+            if not self.include_idle and (leaf.f_globals.get('__name__'), leaf.f_code.co_name) in IDLE_FRAMES:
+                continue
+
+            labels = [_frame_label(f) for f in reversed(frames)]
+            phases = [f"[phase] {name}" for name in _thread_phases.get(ident, ())]
+            thread_name = names.get(ident, str(ident))
+            # Pool threads are numbered; drop the number so their stacks merge
+            thread_name = thread_name.rstrip('0123456789').rstrip('-_') or thread_name
+            self.stacks[';'.join([f"[thread] {thread_name}"] + phases + labels)] += 1
+        self.samples += 1
+
+    def run(self, seconds):
+        """Sample for the given number of seconds, blocking the calling thread."""
+        own_ident = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_sample:
+                self.sample(skip_ident=own_ident)
+                next_sample += self.interval
+                # Don't try to catch up if sampling itself fell behind
+                if next_sample < now:
+                    next_sample = now + self.interval
+            time.sleep(max(0.0, min(next_sample, deadline) - time.perf_counter()))
+        self.elapsed = time.perf_counter() - start
+        return self
+
+    def collapsed(self):
+        """Return the samples in collapsed-stack format, most frequent first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile(seconds, interval=0.005, include_idle=False):
+    """
+    Run one profile and return the SamplingProfiler, or None if another profile is running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        return SamplingProfiler(interval=interval, include_idle=include_idle).run(seconds)
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,121 @@
+"""
+Response compression and conditional GET support for the Flask app.
+
+compress_response() is run on every response by the app; it gzip- or
+brotli-compresses bodies above COMPRESS_MIN_SIZE bytes when the client accepts it
+(brotli only when the brotli package is installed). conditional() marks read-only
+views whose responses get an ETag, so a client that sends If-None-Match receives 304
+Not Modified instead of the body; views backed by a cached version answer it without
+running at all.
+"""
+import datetime
+import gzip
+import hashlib
+import os
+from functools import partial, wraps
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "text/javascript",
+}
+
+
+def _available_encodings():
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+
+def compress_response(response):
+    """
+    Compress the response body in place if the client accepts it and it is worth it.
+
+    Streamed responses, already-encoded responses and bodies smaller than
+    COMPRESS_MIN_SIZE (default 1024 bytes) are left alone.
+    """
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.content_length is not None and response.content_length < int(os.getenv("COMPRESS_MIN_SIZE", "1024")):
+        return response
+
+    encoding = request.accept_encodings.best_match(_available_encodings())
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=int(os.getenv("BROTLI_QUALITY", "4")))
+    else:
+        compressed = gzip.compress(data, compresslevel=int(os.getenv("COMPRESS_LEVEL", "6")))
+
+    # ETags are weak, so they stay valid for the compressed representation
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def _set_version(response, version):
+    etag, modified = version
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.datetime.fromtimestamp(modified, datetime.timezone.utc)
+
+
+def conditional(view=None, version=None):
+    """
+    Add an ETag header to a read-only view and answer revalidation with 304.
+
+    By default the ETag is a hash of the response body, so every worker gives the same
+    ETag for the same data, but the view still runs in full and a 304 only saves the
+    transfer. Views backed by cached data can pass version, a function returning the
+    (etag, last-modified timestamp) of the data the view would serve, or None when it
+    can't tell without doing the work; a matching If-None-Match is then answered with
+    304 before the view runs, and responses carry that ETag and Last-Modified.
+
+    version is read before the view, so a write landing in between leaves the ETag
+    older than the body, and the next revalidation downloads it again.
+
+    Responses are marked Cache-Control: no-cache, so browsers revalidate every time
+    but only download the body when it changed.
+    """
+    if view is None:
+        return partial(conditional, version=version)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        current = version() if version is not None and request.method in ('GET', 'HEAD') else None
+        if current is not None and request.if_none_match.contains_weak(current[0]):
+            response = Response(status=304)
+            _set_version(response, current)
+            response.cache_control.no_cache = True
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.is_streamed:
+            return response
+
+        if current is not None:
+            _set_version(response, current)
+        else:
+            response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(), weak=True)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
+
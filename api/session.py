@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Process-wide HTTP session shared by all ClearPass calls
+_session = None
+_session_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+# Functions called after every ClearPass request (see add_request_listener)
+_request_listeners = []
+
+# Functions called after every successful ClearPass write (see add_write_listener)
+_write_listeners = []
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class ClearPassSession(requests.Session):
+    """
+    requests.Session that reports every call to the registered request listeners.
+
+    Listeners are called as listener(method, url, status_code, elapsed_seconds, error)
+    after each request completes; status_code is None and error is set when the request
+    raised instead of returning a response. Successful writes are also passed to the
+    write listeners, with the JSON payload that was sent.
+    """
+
+    def __init__(self, pool_size=16):
+        super().__init__()
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        with self._in_flight_lock:
+            self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            _notify_listeners(method, url, None, time.perf_counter() - start, e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                self.in_flight -= 1
+
+        _notify_listeners(method, url, response.status_code, time.perf_counter() - start, None)
+        if _write_listeners and method.upper() in WRITE_METHODS and 200 <= response.status_code < 300:
+            _notify_write_listeners(method.upper(), url, kwargs.get('json'), response)
+        return response
+
+
+def _notify_listeners(method, url, status_code, elapsed, error):
+    for listener in _request_listeners:
+        try:
+            listener(method.upper(), url, status_code, elapsed, error)
+        except Exception:
+            # Instrumentation must never break the call it is observing
+            pass
+
+
+def _notify_write_listeners(method, url, payload, response):
+    for listener in _write_listeners:
+        try:
+            listener(method, url, payload, response)
+        except Exception as e:
+            # A failed cache update must not turn a successful write into an error
+            logger.warning("Write listener %s failed for %s %s: %s", getattr(listener, '__name__', listener), method, url, e)
+
+
+def add_request_listener(listener):
+    """Register a function to be called after every ClearPass request."""
+    if listener not in _request_listeners:
+        _request_listeners.append(listener)
+
+
+def add_write_listener(listener):
+    """
+    Register a function to be called after every successful ClearPass write.
+
+    Listeners are called as listener(method, url, payload, response) after a POST, PUT,
+    PATCH or DELETE answered with a 2xx status; payload is the JSON body that was sent,
+    or None if the request didn't send JSON.
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+
+
+def get_session():
+    """
+    Return the shared requests.Session used to talk to ClearPass.
+
+    The session keeps connections alive between calls and is safe to use from worker
+    threads. Its connection pool size is read from CLEARPASS_POOL_SIZE (default 16)
+    the first time it is created.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = ClearPassSession(pool_size=int(os.getenv("CLEARPASS_POOL_SIZE", "16")))
+
+    return _session
+
+
+def reset_session(after_fork=False):
+    """
+    Close the shared session so the next call to get_session() creates a new one.
+
+    In a freshly forked worker pass after_fork=True: the lock is replaced, since the
+    parent may have forked while another thread held it.
+    """
+    global _session, _session_lock
+
+    if after_fork:
+        _session_lock = threading.Lock()
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def session_stats():
+    """Return the shared session's pool size and in-flight call count, or None if it doesn't exist yet."""
+    session = _session
+    if session is None:
+        return None
+    return {"pool_size": session.pool_size, "in_flight": session.in_flight}
@@ -0,0 +1,490 @@
+"""
+Static host lists split across several ClearPass lists ("shards").
+
+ClearPass gets slow, and eventually rejects PATCHes, once a list's host_entries grow
+very large, and every add re-sends the whole array. With LIST_SHARD_SIZE set, the
+list a user picks is the first shard of a logical list; when it is full, new entries
+go to overflow lists named "<name> [shard 2]", "<name> [shard 3]" and so on, each
+holding at most LIST_SHARD_SIZE entries. Writes therefore never send more than
+LIST_SHARD_SIZE entries, however large the logical list grows.
+
+    adds            go to the first shard with room; once every shard is full a new
+                    shard is created with the new entries in the same call
+    views, search   see the entries of every shard as one list; cross-list searches
+                    and set queries report the logical list instead of its shards
+
+Shards are found by name, so every worker agrees on them without any extra state.
+Which lists belong to a logical list is read from the list mirror while it is fresh,
+and otherwise cached (in the shared cache, with SHARED_CACHE_PATH) for
+SHARD_GROUP_TTL seconds, so views don't download the list collection; the shards
+themselves are read through the list cache.
+
+Only one thread per process, and with SHARED_CACHE_PATH one worker per host, adds to
+sharded lists at a time. It reads the shards once it has the lock, so an add that
+waited fills a shard another add just created instead of creating one itself.
+
+Enforcement policies that use the list must reference every shard; the app can't
+change policies itself.
+"""
+import datetime
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from api.cache import TTLCache
+from api.clearpass import (
+    add_multiple_macs_to_static_host_list, get_clearpass_token, get_static_host_list_details, static_host_list_version
+)
+from api.mirror import fetch_static_host_list_names, get_list_mirror
+from api.session import get_session
+from api.shared_cache import get_shared_cache
+from api.snapshot import host_entries, mac_to_int
+from api.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+_SHARD_NAME = re.compile(r'^(.*) \[shard (\d+)\]$')
+
+# Longest a worker holds, or waits for, the lease on writing to sharded lists (seconds)
+SHARD_WRITE_LEASE = 120
+
+# Seconds the lists making up a logical list are cached when the mirror can't answer
+SHARD_GROUP_TTL = 300
+
+_write_lock = threading.Lock()
+
+# (number, id) pairs of each logical list's shards by name, without SHARED_CACHE_PATH
+_shard_groups = TTLCache(maxsize=1024, ttl=SHARD_GROUP_TTL)
+
+# Logical list name of each list id find_shards has seen, for sharded_list_version
+_list_names = TTLCache(maxsize=4096, ttl=SHARD_GROUP_TTL)
+
+
+def shard_size():
+    """Return the most entries per shard, or 0 if lists aren't sharded (LIST_SHARD_SIZE)."""
+    return int(os.getenv("LIST_SHARD_SIZE", "0"))
+
+
+def shard_name(name, number):
+    return f"{name} [shard {number}]"
+
+
+def base_name(name):
+    """Return the logical list's name for the name of any of its shards."""
+    match = _SHARD_NAME.match(name or '')
+    return match.group(1) if match else name
+
+
+def shard_number(name):
+    """Return a shard's number from its name; the first shard, named like the logical list, is 1."""
+    match = _SHARD_NAME.match(name or '')
+    return int(match.group(2)) if match else 1
+
+
+def _group_numbers(lists):
+    """Map each logical list name to the sorted (number, id) pairs of its shards, from id and name dicts."""
+    groups = {}
+    for item in lists:
+        groups.setdefault(base_name(item["name"]), []).append((shard_number(item["name"]), item["id"]))
+    return {name: sorted(numbered) for name, numbered in groups.items()}
+
+
+def group_shards(lists):
+    """
+    Group lists into logical lists.
+
+    Args:
+        lists: Dictionaries with the id and name of every list
+
+    Returns:
+        A dictionary mapping each list id to (logical id, logical name, shard ids),
+        where the logical id is the first shard's and shard ids are in shard order;
+        lists that aren't sharded map to themselves
+    """
+    grouped = {}
+    for name, numbered in _group_numbers(lists).items():
+        shard_ids = [list_id for _, list_id in numbered]
+        for list_id in shard_ids:
+            grouped[list_id] = (shard_ids[0], name, shard_ids)
+    return grouped
+
+
+def _cached_group(name):
+    shared = get_shared_cache()
+    numbered = shared.get(f"shards:{name}") if shared else _shard_groups.get(name)
+    return [tuple(pair) for pair in numbered] if numbered is not None else None
+
+
+def _cache_group(name, numbered):
+    shared = get_shared_cache()
+    if shared:
+        shared.set(f"shards:{name}", numbered, ttl=SHARD_GROUP_TTL)
+    else:
+        _shard_groups.set(name, numbered)
+
+
+def _known_shards(name):
+    """Return (number, id) of the shards of name from the fresh mirror or the cache, or None if neither knows."""
+    mirror = get_list_mirror()
+    if mirror is not None and mirror.is_fresh():
+        return _group_numbers(mirror.store.lists()).get(name, [])
+    return _cached_group(name)
+
+
+def _numbered_shards(name, refresh=False):
+    """
+    Return (number, id) of every list that is a shard of the logical list name, in order.
+
+    Read from the mirror while it is fresh, then from the cache; refresh=True, or a
+    cache miss, pages through the list collection and refreshes the cache.
+    """
+    if not refresh:
+        numbered = _known_shards(name)
+        if numbered is not None:
+            return numbered
+
+    numbered = _group_numbers(fetch_static_host_list_names()).get(name, [])
+    _cache_group(name, numbered)
+    return numbered
+
+
+def note_list_created(host_list):
+    """Add a newly created list to its logical list's cached shards, if they are cached."""
+    name = base_name(host_list.get('name', ''))
+    numbered = _cached_group(name)
+    if numbered is None:
+        return
+    pair = (shard_number(host_list.get('name')), host_list['id'])
+    if pair not in numbered:
+        _cache_group(name, sorted(numbered + [pair]))
+
+
+def find_shards(list_id, use_cache=True, refresh=False):
+    """
+    Find the ClearPass lists that make up the logical list containing list_id.
+
+    Args:
+        list_id: The first shard or any overflow shard
+        use_cache: Passed to get_static_host_list_details for every shard
+        refresh: Re-read which lists are shards from ClearPass instead of the mirror or cache
+
+    Returns:
+        The shards' get_static_host_list_details results, first shard first
+
+    Raises:
+        RuntimeError: If a shard or the lists could not be read
+    """
+    first = get_static_host_list_details(list_id, use_cache=use_cache)
+    if not first["success"]:
+        raise RuntimeError(first["message"])
+
+    name = base_name(first["list_details"].get('name', ''))
+    _list_names.set(str(list_id), name)
+    numbered = _numbered_shards(name, refresh=refresh)
+    if not refresh and numbered and all(str(shard_id) != str(list_id) for _, shard_id in numbered):
+        # Created after the mirror's last sync or the cached grouping
+        numbered = _numbered_shards(name, refresh=True)
+
+    shards = []
+    for _, shard_id in numbered:
+        if str(shard_id) == str(list_id):
+            shards.append(first)
+            continue
+        result = get_static_host_list_details(shard_id, use_cache=use_cache)
+        if not result["success"]:
+            if not refresh:
+                # The mirror or cache may still name a shard that was deleted since
+                return find_shards(list_id, use_cache=use_cache, refresh=True)
+            raise RuntimeError(f"Could not read shard {shard_id} of static host list {name}: {result['message']}")
+        shards.append(result)
+    # A list that isn't visible in the collection yet still stands for itself
+    return shards or [first]
+
+
+def sharded_list_version(list_id):
+    """
+    Return (version, stored_at) of a logical list from its shards' cached copies, or None.
+
+    Like static_host_list_version, nothing is downloaded or decoded: None unless the
+    shards are known from the mirror or cache and every one of them is in the list cache.
+    """
+    name = _list_names.get(str(list_id))
+    numbered = _known_shards(name) if name is not None else None
+    if not numbered or all(str(shard_id) != str(list_id) for _, shard_id in numbered):
+        return None
+    versions = [static_host_list_version(shard_id) for _, shard_id in numbered]
+    if None in versions:
+        return None
+    version = hashlib.blake2b(' '.join(v for v, _ in versions).encode(), digest_size=16).hexdigest()
+    return version, max(stored_at for _, stored_at in versions)
+
+
+def sharded_list_details(list_id):
+    """
+    Return a logical list in the same format as get_static_host_list_details.
+
+    list_details holds the first shard's fields with every shard's host_entries,
+    plus a shards summary (id, name and entry count of each).
+    """
+    return _merge_shards(find_shards(list_id))
+
+
+def _merge_shards(shards):
+    if len(shards) == 1:
+        return shards[0]
+
+    details = dict(shards[0]["list_details"])
+    details['name'] = base_name(details.get('name', ''))
+    details['host_entries'] = [
+        {"host_address": address, "host_address_desc": description}
+        for shard in shards for address, description in host_entries(shard["list_details"])
+    ]
+    details['shards'] = [
+        {
+            "id": shard["list_details"].get('id'),
+            "name": shard["list_details"].get('name'),
+            "entry_count": len(host_entries(shard["list_details"]))
+        }
+        for shard in shards
+    ]
+    return {
+        "success": True,
+        "message": f"Found {len(details['host_entries'])} host(s) in {len(shards)} shard(s)",
+        "hosts": [host for shard in shards for host in shard.get("hosts", [])],
+        "list_details": details
+    }
+
+
+def search_sharded_list(list_id, mac_address):
+    """Search every shard of a logical list for a MAC, returning the same fields as search_static_host_list."""
+    mac = mac_to_int(mac_address)
+    shards = find_shards(list_id)
+    matching = [
+        {"host_address": address, "host_address_desc": description, "list_id": shard["list_details"].get('id')}
+        for shard in shards
+        for address, description in host_entries(shard["list_details"])
+        if mac_to_int(address) == mac
+    ]
+    return {
+        "found": bool(matching),
+        "message": (f"Found {len(matching)} matching host(s) in the list" if matching
+                    else "MAC address not found in this static host list"),
+        "hosts": matching,
+        "list_details": _merge_shards(shards)["list_details"]
+    }
+
+
+def logical_matches(matches):
+    """
+    Report matches found on overflow shards as matches on their logical list.
+
+    Args:
+        matches: Dictionaries with list_id and list_name, as returned by the searches
+                 across all lists; changed in place
+
+    Returns:
+        matches
+    """
+    for match in matches:
+        name = match.get("list_name")
+        if shard_number(name) == 1:
+            continue
+        numbered = _numbered_shards(base_name(name))
+        if numbered:
+            match["list_id"] = numbered[0][1]
+        match["list_name"] = base_name(name)
+    return matches
+
+
+def create_shard(first_shard, number, entries):
+    """
+    Create overflow shard number with its first entries, copying the first shard's settings.
+
+    Callers hold the shard write lock (see _writing_shards).
+
+    Returns:
+        The new list's details
+
+    Raises:
+        RuntimeError: If ClearPass rejects the new list
+    """
+    token = get_clearpass_token()
+    base_url = os.getenv("CLEARPASS_BASE_URL").rstrip('/')
+    if not base_url.endswith('/api'):
+        base_url = f"{base_url}/api"
+
+    payload = {"name": shard_name(base_name(first_shard.get('name', '')), number), "host_entries": entries}
+    for field in ["description", "host_format", "host_type"]:
+        if field in first_shard:
+            payload[field] = first_shard[field]
+
+    with traced("create_shard", number=number, entries=len(entries)):
+        response = get_session().post(
+            f"{base_url}/static-host-list",
+            json=payload,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json"
+            },
+            verify=False
+        )
+    if response.status_code not in [200, 201]:
+        raise RuntimeError(f"Failed to create shard {payload['name']}. Status: {response.status_code}")
+
+    logger.info("Created static host list shard %s with %s entries", payload['name'], len(entries))
+    return response.json()
+
+
+@contextmanager
+def _writing_shards():
+    """Hold the lock, and with SHARED_CACHE_PATH the host-wide lease, on adding to sharded lists."""
+    shared = get_shared_cache()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    with _write_lock:
+        if shared:
+            deadline = time.monotonic() + SHARD_WRITE_LEASE
+            while not shared.acquire_lease("shard_write", owner, SHARD_WRITE_LEASE):
+                if time.monotonic() >= deadline:
+                    raise RuntimeError("Timed out waiting for another worker to finish adding to a sharded list")
+                time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if shared:
+                shared.release_lease("shard_write", owner)
+
+
+def _new_entries(shards, mac_list):
+    """Return the mac_list items whose MACs are on no shard, without duplicates, with hyphenated MACs."""
+    existing = {mac_to_int(address) for shard in shards for address, _ in host_entries(shard["list_details"])}
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    entries = []
+    for item in mac_list:
+        mac = mac_to_int(item["mac_address"])
+        if mac is None or mac in existing:
+            continue
+        existing.add(mac)
+        digits = f"{mac:012X}"
+        entries.append({
+            "mac_address": '-'.join(digits[i:i + 2] for i in range(0, 12, 2)),
+            "description": item.get("description") or f"Added via batch upload on {timestamp}"
+        })
+    return entries
+
+
+def add_macs_to_sharded_list(list_id, mac_list):
+    """
+    Add MAC addresses to a logical list, filling shards with room and creating new ones.
+
+    Takes and returns the same arguments and result as add_multiple_macs_to_static_host_list;
+    details also lists the ids of the shards written to.
+    """
+    size = shard_size()
+    added = []
+    written = []
+    remaining = []
+
+    def summary(success, message):
+        return {
+            "success": success,
+            "message": message,
+            "details": {
+                "added": len(added),
+                "macs_added": added,
+                "skipped": len(mac_list) - len(added) - len(remaining),
+                "shards": written
+            }
+        }
+
+    def fill(shards, remaining):
+        """Add entries to shards with room; returns the entries left and an error message, if any."""
+        for shard in shards:
+            room = size - len(host_entries(shard["list_details"]))
+            if room <= 0 or not remaining:
+                continue
+            shard_id = shard["list_details"].get('id')
+            chunk = remaining[:room]
+            result = add_multiple_macs_to_static_host_list(shard_id, chunk)
+            if not result["success"]:
+                return remaining, f"Failed to add MAC addresses to shard {shard_id}: {result['message']}"
+            remaining = remaining[room:]
+            added.extend(entry["mac_address"] for entry in chunk)
+            written.append(shard_id)
+        return remaining, None
+
+    try:
+        # Shards are read and filled under the lock, so concurrent adds neither overfill a
+        # shard nor each create their own
+        with _writing_shards():
+            shards = find_shards(list_id, use_cache=False)
+            remaining = _new_entries(shards, mac_list)
+            if not remaining:
+                return {
+                    "success": True,
+                    "message": "No new MAC addresses to add (all MACs already exist in the list)",
+                    "details": {"added": 0, "skipped": len(mac_list)}
+                }
+            remaining, error = fill(shards, remaining)
+
+            if remaining and not error:
+                # Shards created elsewhere may not be in the mirror or cache yet
+                shards = find_shards(list_id, use_cache=False, refresh=True)
+                remaining = _new_entries(shards, remaining)
+                remaining, error = fill(shards, remaining)
+            if error:
+                return summary(False, error)
+
+            number = max(shard_number(shard["list_details"].get('name')) for shard in shards)
+            while remaining:
+                number += 1
+                chunk = remaining[:size]
+                created = create_shard(shards[0]["list_details"], number, [
+                    {"host_address": entry["mac_address"], "host_address_desc": entry["description"]}
+                    for entry in chunk
+                ])
+                remaining = remaining[size:]
+                added.extend(entry["mac_address"] for entry in chunk)
+                written.append(created.get('id'))
+    except Exception as e:
+        return summary(False, str(e))
+
+    return summary(True, f"Successfully added {len(added)} MAC addresses to static host list ({len(written)} shard(s))")
+
+
+def choose_shard(list_id, mac_address, description=None):
+    """
+    Decide where a single new MAC goes in a logical list.
+
+    Returns:
+        (shard_id, None) with the shard the caller should add the MAC to, or
+        (None, result) if the MAC is already on a shard or every shard was full and it
+        was added by add_macs_to_sharded_list; result has success, message and details
+    """
+    with traced("choose_shard", list_id=list_id) as span:
+        shards = find_shards(list_id, use_cache=False)
+        span.set_attribute("shards", len(shards))
+
+    mac = mac_to_int(mac_address)
+    for shard in shards:
+        for address, entry_description in host_entries(shard["list_details"]):
+            if mac_to_int(address) == mac:
+                return None, {
+                    "success": True,
+                    "message": f"MAC address {mac_address} is already in the static host list",
+                    "details": {"host_address": address, "host_address_desc": entry_description,
+                                "list_id": shard["list_details"].get('id')}
+                }
+
+    for shard in shards:
+        if len(host_entries(shard["list_details"])) < shard_size():
+            return shard["list_details"].get('id'), None
+
+    result = add_macs_to_sharded_list(list_id, [{"mac_address": mac_address, "description": description}])
+    if result["success"]:
+        result["message"] = f"MAC address {mac_address} has been added to shard {result['details']['shards'][0]}"
+    return None, result
@@ -0,0 +1,178 @@
+"""
+Cache shared by every worker process on the host, stored in a local SQLite file.
+
+Gunicorn workers don't share memory, so without this each one fetches its own OAuth
+token and rediscovers which ClearPass API paths work. With SHARED_CACHE_PATH set they
+read and write one small key-value table instead: values are JSON, each with its own
+expiry, and every write replaces a value atomically in a single transaction.
+
+Leases let one process do a piece of work (such as refreshing the token) while the
+others wait for its result instead of repeating it.
+
+The file holds the OAuth token, so it is created readable by its owner only.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from api.metrics import add_cache_collector
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SharedCache:
+    """
+    Key-value cache in a SQLite file that several processes can use at once.
+
+    Expiry times are wall-clock, so all processes agree on them.
+
+    Args:
+        path: Database file; created (mode 0600) with its schema if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            # A connection must not be used by a forked child, so each process opens its own
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, default=None):
+        """Return the value stored under key, or default if it is missing or expired."""
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        self._count(row is not None)
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value, ttl):
+        """Store a JSON-serializable value under key for ttl seconds."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl)
+            )
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def acquire_lease(self, name, owner, seconds):
+        """
+        Take or renew a named lease.
+
+        Returns True if owner now holds the lease for the next seconds, False if another
+        owner holds an unexpired one.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (f"lease:{name}", now)
+            ).fetchone()
+            if row is not None and json.loads(row[0]) != owner:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (f"lease:{name}", json.dumps(owner), now + seconds)
+            )
+        return True
+
+    def release_lease(self, name, owner):
+        """Give up a lease early if owner still holds it."""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ? AND value = ?", (f"lease:{name}", json.dumps(owner)))
+
+    def purge_expired(self):
+        """Delete expired entries and return how many were removed."""
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self):
+        """Return a dictionary with size, hit and miss counters in the same shape as TTLCache.stats()."""
+        size = self._connect().execute(
+            "SELECT COUNT(*) FROM entries WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0
+            }
+
+
+# Cache used by the ClearPass client, created on first use
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Return the host-wide shared cache, or None if SHARED_CACHE_PATH isn't set."""
+    global _shared_cache
+
+    if _shared_cache is None:
+        path = os.getenv("SHARED_CACHE_PATH")
+        if not path:
+            return None
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedCache(path)
+
+    return _shared_cache
+
+
+def reset_shared_cache():
+    """
+    Drop this process's handle on the shared cache; the data in the file is kept.
+
+    Used in freshly forked workers so they open their own database connections.
+    """
+    global _shared_cache, _shared_cache_lock
+
+    _shared_cache_lock = threading.Lock()
+    _shared_cache = None
+
+
+add_cache_collector("shared", lambda: _shared_cache.stats() if _shared_cache is not None else None)
@@ -0,0 +1,404 @@
+"""
+On-disk snapshot of ClearPass static host lists, stored in SQLite.
+
+Each list's details and host entries are kept in two tables, with entries indexed by
+list and by MAC address. MACs are stored as 48-bit integers, so a MAC lookup is one
+index probe and "every MAC in this range" is an index range scan.
+
+The database runs in WAL mode: any number of threads and processes can read while one
+writer replaces lists, and readers always see either the old or the new version of a
+sync, never a mix. Connections are per thread and per process.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lists (
+    list_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    details TEXT NOT NULL,
+    entry_count INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    list_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    mac INTEGER,
+    host_address TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (list_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS hosts_mac ON hosts (mac);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def mac_to_int(mac_address):
+    """Return a MAC address in any common notation as a 48-bit integer, or None if it isn't one."""
+    mac = mac_address.replace(':', '').replace('-', '').replace('.', '')
+    if len(mac) != 12:
+        return None
+    try:
+        return int(mac, 16)
+    except ValueError:
+        return None
+
+
+def int_to_mac(value):
+    """Return a 48-bit integer as a colon-separated lowercase MAC address."""
+    mac = f"{value:012x}"
+    return ':'.join(mac[i:i + 2] for i in range(0, 12, 2))
+
+
+def host_entries(host_list):
+    """
+    Return a list's entries as (host_address, description) pairs.
+
+    ClearPass returns entries as host_entries with host_address/host_address_desc;
+    some versions use hosts with mac_address/description instead.
+    """
+    entries = []
+    for entry in host_list.get('host_entries') or []:
+        if entry.get('host_address'):
+            entries.append((entry['host_address'], entry.get('host_address_desc') or ''))
+    for host in host_list.get('hosts') or []:
+        if host.get('mac_address'):
+            entries.append((host['mac_address'], host.get('description') or ''))
+    return entries
+
+
+def list_version(host_list):
+    """Return a short hash identifying the list's current contents."""
+    encoded = json.dumps(host_list, sort_keys=True, separators=(',', ':'), default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+class SnapshotStore:
+    """
+    SQLite database holding the last synced copy of every static host list.
+
+    Args:
+        path: Database file; created with its schema if it doesn't exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        if self._pid != os.getpid():
+            # A connection must not be used by a forked child, so each process opens its own
+            self._local = threading.local()
+            self._pid = os.getpid()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def replace_lists(self, host_lists, complete=False):
+        """
+        Store the given lists, replacing earlier copies, in one transaction.
+
+        Lists whose version hasn't changed since the last sync are only re-stamped.
+
+        Args:
+            host_lists: List details as returned by ClearPass, including their entries
+            complete: host_lists is every list ClearPass has; lists missing from it are deleted
+
+        Returns:
+            The number of lists whose contents changed
+        """
+        now = time.time()
+        conn = self._connect()
+        changed = 0
+        with conn:
+            known = dict(conn.execute("SELECT list_id, version FROM lists"))
+            for host_list in host_lists:
+                list_id = int(host_list['id'])
+                version = list_version(host_list)
+                if known.get(list_id) == version:
+                    conn.execute("UPDATE lists SET synced_at = ? WHERE list_id = ?", (now, list_id))
+                    continue
+
+                entries = host_entries(host_list)
+                details = {k: v for k, v in host_list.items() if k not in ('host_entries', 'hosts')}
+                conn.execute("DELETE FROM hosts WHERE list_id = ?", (list_id,))
+                conn.executemany(
+                    "INSERT INTO hosts (list_id, position, mac, host_address, description) VALUES (?, ?, ?, ?, ?)",
+                    ((list_id, position, mac_to_int(address), address, description)
+                     for position, (address, description) in enumerate(entries))
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO lists (list_id, name, details, entry_count, version, synced_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (list_id, host_list.get('name', ''), json.dumps(details), len(entries), version, now)
+                )
+                changed += 1
+
+            if complete:
+                current = {int(host_list['id']) for host_list in host_lists}
+                for list_id in set(known) - current:
+                    conn.execute("DELETE FROM hosts WHERE list_id = ?", (list_id,))
+                    conn.execute("DELETE FROM lists WHERE list_id = ?", (list_id,))
+                    changed += 1
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_at', ?)", (str(now),))
+            if changed:
+                self._bump_generation(conn)
+        return changed
+
+    def set_entries(self, list_id, entries, fields=None):
+        """
+        Replace one stored list's entries after a write to ClearPass.
+
+        When the new entries are the old ones plus some appended at the end, which is
+        what a read-modify-write add sends, only the appended rows are inserted.
+
+        Args:
+            list_id: The static host list ID
+            entries: The list's complete new entries as (host_address, description) pairs
+            fields: Other list fields sent with the write, merged into the stored details
+
+        Returns:
+            False if the list isn't in the snapshot (the next sync adds it), else True
+        """
+        list_id = int(list_id)
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT details FROM lists WHERE list_id = ?", (list_id,)).fetchone()
+            if row is None:
+                return False
+
+            existing = conn.execute(
+                "SELECT host_address, description FROM hosts WHERE list_id = ? ORDER BY position", (list_id,)
+            ).fetchall()
+            if len(existing) <= len(entries) and existing == entries[:len(existing)]:
+                start = len(existing)
+            else:
+                conn.execute("DELETE FROM hosts WHERE list_id = ?", (list_id,))
+                start = 0
+            conn.executemany(
+                "INSERT INTO hosts (list_id, position, mac, host_address, description) VALUES (?, ?, ?, ?, ?)",
+                ((list_id, position, mac_to_int(address), address, description)
+                 for position, (address, description) in enumerate(entries[start:], start))
+            )
+
+            details = json.loads(row[0])
+            details.update(fields or {})
+            self._touch(conn, list_id, details, len(entries))
+        return True
+
+    def add_entries(self, list_id, entries):
+        """
+        Append entries to one stored list, skipping MACs it already holds.
+
+        Used after writes that add hosts without sending the whole list.
+
+        Returns:
+            The number of entries added, or None if the list isn't in the snapshot
+        """
+        list_id = int(list_id)
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT details, entry_count FROM lists WHERE list_id = ?", (list_id,)).fetchone()
+            if row is None:
+                return None
+
+            position = conn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM hosts WHERE list_id = ?", (list_id,)
+            ).fetchone()[0]
+            added = 0
+            for address, description in entries:
+                mac = mac_to_int(address)
+                if mac is not None and conn.execute(
+                    "SELECT 1 FROM hosts WHERE mac = ? AND list_id = ?", (mac, list_id)
+                ).fetchone():
+                    continue
+                conn.execute(
+                    "INSERT INTO hosts (list_id, position, mac, host_address, description) VALUES (?, ?, ?, ?, ?)",
+                    (list_id, position, mac, address, description)
+                )
+                position += 1
+                added += 1
+
+            if added:
+                self._touch(conn, list_id, json.loads(row[0]), row[1] + added)
+        return added
+
+    def _touch(self, conn, list_id, details, entry_count):
+        # A local version never matches ClearPass's, so the next sync rewrites the list
+        # from the source of truth
+        version = "local-" + list_version({"details": details, "entry_count": entry_count, "at": time.time()})
+        conn.execute(
+            "UPDATE lists SET name = ?, details = ?, entry_count = ?, version = ? WHERE list_id = ?",
+            (details.get('name', ''), json.dumps(details), entry_count, version, list_id)
+        )
+        self._bump_generation(conn)
+
+    def _bump_generation(self, conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def generation(self):
+        """Return a number that changes whenever any stored list's entries change."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def synced_at(self):
+        """Return the wall-clock time of the last complete sync, or None if there hasn't been one."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def sync_state(self):
+        """Return (synced_at, generation) with a single query, for per-lookup checks."""
+        values = dict(self._connect().execute(
+            "SELECT key, value FROM meta WHERE key IN ('synced_at', 'generation')"
+        ))
+        synced_at = values.get('synced_at')
+        return (float(synced_at) if synced_at is not None else None), int(values.get('generation', 0))
+
+    def lists(self):
+        """Return id, name, entry count and version of every stored list."""
+        rows = self._connect().execute(
+            "SELECT list_id, name, entry_count, version FROM lists ORDER BY list_id"
+        )
+        return [{"id": r[0], "name": r[1], "entry_count": r[2], "version": r[3]} for r in rows]
+
+    def get_list(self, list_id):
+        """Return a stored list in ClearPass's format (details plus host_entries), or None."""
+        conn = self._connect()
+        # One read transaction, so the details and entries come from the same version
+        with conn:
+            conn.execute("BEGIN")
+            row = conn.execute("SELECT details FROM lists WHERE list_id = ?", (int(list_id),)).fetchone()
+            if row is None:
+                return None
+            entries = conn.execute(
+                "SELECT host_address, description FROM hosts WHERE list_id = ? ORDER BY position", (int(list_id),)
+            ).fetchall()
+        host_list = json.loads(row[0])
+        host_list['host_entries'] = [
+            {"host_address": address, "host_address_desc": description} for address, description in entries
+        ]
+        return host_list
+
+    def list_macs(self, list_id=None):
+        """Return the MACs (as integers) of one stored list, or of all lists."""
+        if list_id is None:
+            rows = self._connect().execute("SELECT mac FROM hosts WHERE mac IS NOT NULL")
+        else:
+            rows = self._connect().execute(
+                "SELECT mac FROM hosts WHERE list_id = ? AND mac IS NOT NULL", (int(list_id),)
+            )
+        return [row[0] for row in rows]
+
+    def find_mac(self, mac_address):
+        """Return the entries matching a MAC address in any list, with the list's id and name."""
+        mac = mac_to_int(mac_address)
+        if mac is None:
+            return []
+        rows = self._connect().execute(
+            "SELECT h.list_id, l.name, h.host_address, h.description FROM hosts h "
+            "JOIN lists l ON l.list_id = h.list_id WHERE h.mac = ? ORDER BY h.list_id, h.position",
+            (mac,)
+        )
+        return [
+            {"list_id": r[0], "list_name": r[1], "mac_address": r[2], "description": r[3]}
+            for r in rows
+        ]
+
+    def find_macs(self, macs):
+        """
+        Look up many MACs (as integers) at once.
+
+        Returns:
+            A dictionary mapping each MAC found in any list to its entries, in the same
+            format as find_mac(); MACs on no list are left out
+        """
+        macs = list(macs)
+        conn = self._connect()
+        found = {}
+        # The chunks are read in one transaction, so they all see the same version
+        with conn:
+            conn.execute("BEGIN")
+            # Stay well below SQLite's limit on query parameters
+            for start in range(0, len(macs), 500):
+                chunk = macs[start:start + 500]
+                rows = conn.execute(
+                    "SELECT h.mac, h.list_id, l.name, h.host_address, h.description FROM hosts h "
+                    f"JOIN lists l ON l.list_id = h.list_id WHERE h.mac IN ({','.join('?' * len(chunk))}) "
+                    "ORDER BY h.list_id, h.position",
+                    chunk
+                )
+                for r in rows:
+                    found.setdefault(r[0], []).append(
+                        {"list_id": r[1], "list_name": r[2], "mac_address": r[3], "description": r[4]}
+                    )
+        return found
+
+    def find_mac_range(self, low, high, limit=None):
+        """
+        Return the entries whose MAC (as an integer) is between low and high inclusive.
+
+        Entries come in MAC order, in the same format as find_mac(), at most limit of them.
+        """
+        rows = self._connect().execute(
+            "SELECT h.list_id, l.name, h.host_address, h.description FROM hosts h "
+            "JOIN lists l ON l.list_id = h.list_id WHERE h.mac BETWEEN ? AND ? "
+            "ORDER BY h.mac, h.list_id, h.position LIMIT ?",
+            (low, high, -1 if limit is None else limit)
+        )
+        return [
+            {"list_id": r[0], "list_name": r[1], "mac_address": r[2], "description": r[3]}
+            for r in rows
+        ]
+
+    def counts(self):
+        """Return the number of stored lists and entries."""
+        row = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(entry_count), 0) FROM lists").fetchone()
+        return {"lists": row[0], "entries": row[1]}
+
+    def acquire_lease(self, name, owner, seconds):
+        """
+        Take or renew a named lease shared by every process using this database.
+
+        Returns True if owner now holds the lease for the next seconds, False if another
+        owner holds an unexpired one. Used so only one worker syncs at a time.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (f"lease:{name}",)).fetchone()
+            if row is not None:
+                holder, expires_at = row[0].rsplit(' ', 1)
+                if holder != owner and float(expires_at) > now:
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (f"lease:{name}", f"{owner} {now + seconds}")
+            )
+        return True
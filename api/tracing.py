@@ -0,0 +1,351 @@
+"""
+Request-scoped tracing for the web app and the ClearPass client.
+
+Spans nest through a context variable: the Flask route is the root span, code that
+wants finer detail (e.g. each strategy in the add cascade) opens child spans with
+traced(), and every ClearPass HTTP call is recorded as a client span under whatever
+span is current when it is made.
+
+Finished spans are handed to a background thread and written by the exporters named
+in TRACE_EXPORTER (comma-separated):
+
+    file   one JSON object per span, appended to TRACE_FILE (default traces.jsonl)
+    otlp   OTLP/HTTP JSON batches posted to OTLP_ENDPOINT
+           (default http://127.0.0.1:4318/v1/traces)
+
+With no exporter configured spans are still created, so request code doesn't need
+to check, but nothing is kept.
+"""
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from api.session import add_request_listener
+from api.upstream import path_template
+
+logger = logging.getLogger(__name__)
+
+# Span that new spans and ClearPass calls are attached to
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# OTLP span kinds
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+_exporters = None
+_exporters_lock = threading.Lock()
+_export_queue = queue.Queue(maxsize=10000)
+_export_thread = None
+
+
+class Span:
+    """
+    One timed operation in a trace.
+
+    Times are wall-clock nanoseconds so spans from different processes line up in a
+    collector. A span without a parent starts a new trace.
+    """
+
+    def __init__(self, name, kind="internal", parent=None, attributes=None, start_time=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_time = start_time if start_time is not None else time.time_ns()
+        self.end_time = None
+        self.status = "OK"
+        self.status_message = None
+        self._parent = parent
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = "ERROR"
+        self.status_message = str(message)
+
+    def end(self, end_time=None):
+        """Finish the span and queue it for export. Ending a span twice has no effect."""
+        if self.end_time is not None:
+            return
+        self.end_time = end_time if end_time is not None else time.time_ns()
+        _export(self)
+
+    @property
+    def duration_ms(self):
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e6
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.end_time,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message}
+        }
+
+
+def current_span():
+    """Return the span new work is attached to, or None outside a trace."""
+    return _current_span.get()
+
+
+def start_span(name, kind="internal", **attributes):
+    """
+    Start a child of the current span (or a new trace) and make it current.
+
+    The caller must call end_span() with the returned span; use traced() where a
+    with-block fits.
+    """
+    span = Span(name, kind=kind, parent=_current_span.get(), attributes=attributes)
+    span._token = _current_span.set(span)
+    return span
+
+
+def detach_span(span):
+    """Make the span's parent current again without ending the span."""
+    if span._token is None:
+        return
+    try:
+        _current_span.reset(span._token)
+    except ValueError:
+        # Detached from a different context than it was started in
+        _current_span.set(span._parent)
+    span._token = None
+
+
+def end_span(span):
+    """Detach the span and finish it."""
+    detach_span(span)
+    span.end()
+
+
+@contextmanager
+def traced(name, kind="internal", **attributes):
+    """
+    Run the block inside a new span.
+
+    Usage:
+        with traced("add_strategy v5", strategy="v5") as span:
+            result = add_mac_to_static_host_list_v5(...)
+            span.set_attribute("success", result.get("success"))
+    """
+    span = start_span(name, kind=kind, **attributes)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(e)
+        raise
+    finally:
+        end_span(span)
+
+
+class FileExporter:
+    """Append spans to a file, one JSON object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict()) + '\n' for span in spans)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(lines)
+
+
+class OtlpHttpExporter:
+    """Post spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint, service_name="cpass-web", timeout=5):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans):
+        # Plain requests rather than the ClearPass session, so exports aren't traced themselves
+        requests.post(self.endpoint, json=self.payload(spans), timeout=self.timeout)
+
+    def payload(self, spans):
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": "api.tracing"},
+                    "spans": [_otlp_span(span) for span in spans]
+                }]
+            }]
+        }
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(span):
+    data = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_time),
+        "endTimeUnixNano": str(span.end_time),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": 2 if span.status == "ERROR" else 1}
+    }
+    if span.parent_id:
+        data["parentSpanId"] = span.parent_id
+    if span.status_message:
+        data["status"]["message"] = span.status_message
+    return data
+
+
+def get_exporters():
+    """
+    Return the configured exporters, creating them from the environment on first use.
+
+    Reads TRACE_EXPORTER, TRACE_FILE, OTLP_ENDPOINT and TRACE_SERVICE_NAME.
+    """
+    global _exporters
+
+    if _exporters is None:
+        with _exporters_lock:
+            if _exporters is None:
+                exporters = []
+                names = [name.strip().lower() for name in os.getenv("TRACE_EXPORTER", "").split(',') if name.strip()]
+                for name in names:
+                    if name == "file":
+                        exporters.append(FileExporter(os.getenv("TRACE_FILE", "traces.jsonl")))
+                    elif name == "otlp":
+                        exporters.append(OtlpHttpExporter(
+                            os.getenv("OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces"),
+                            service_name=os.getenv("TRACE_SERVICE_NAME", "cpass-web")
+                        ))
+                    else:
+                        logger.warning("Unknown trace exporter %r ignored", name)
+                _exporters = exporters
+
+    return _exporters
+
+
+def set_exporters(exporters):
+    """Replace the exporters, e.g. from a script that collects its own traces. None re-reads the environment."""
+    global _exporters
+
+    with _exporters_lock:
+        _exporters = list(exporters) if exporters is not None else None
+
+
+def reset_exporters():
+    """
+    Re-read the exporter configuration and start a fresh export queue.
+
+    Used in freshly forked workers, which don't inherit the parent's export thread.
+    """
+    global _exporters, _exporters_lock, _export_queue, _export_thread
+
+    _exporters_lock = threading.Lock()
+    _exporters = None
+    _export_queue = queue.Queue(maxsize=10000)
+    _export_thread = None
+
+
+def tracing_enabled():
+    return bool(get_exporters())
+
+
+def _export(span):
+    global _export_thread
+
+    if not tracing_enabled():
+        return
+
+    if _export_thread is None or not _export_thread.is_alive():
+        with _exporters_lock:
+            if _export_thread is None or not _export_thread.is_alive():
+                _export_thread = threading.Thread(target=_export_worker, name="trace-exporter", daemon=True)
+                _export_thread.start()
+
+    try:
+        _export_queue.put_nowait(span)
+    except queue.Full:
+        # Drop spans rather than slow requests down when the exporter falls behind
+        pass
+
+
+def _export_worker():
+    while True:
+        batch = [_export_queue.get()]
+        while len(batch) < 512:
+            try:
+                batch.append(_export_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        for exporter in get_exporters():
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning("Trace export to %s failed: %s", type(exporter).__name__, e)
+
+        for _ in batch:
+            _export_queue.task_done()
+
+
+def flush():
+    """Block until every span finished so far has been exported."""
+    if _export_thread is not None and _export_thread.is_alive():
+        _export_queue.join()
+
+
+def _record_upstream_call(method, url, status_code, elapsed, error):
+    parent = _current_span.get()
+    if parent is None:
+        return
+
+    end_time = time.time_ns()
+    span = Span(
+        f"{method} {path_template(url)}",
+        kind="client",
+        parent=parent,
+        attributes={
+            "http.method": method,
+            "http.url": url.split('?', 1)[0],
+            "http.status_code": status_code
+        },
+        start_time=end_time - int(elapsed * 1e9)
+    )
+    if error is not None:
+        span.set_error(error)
+    elif status_code >= 400:
+        span.set_error(f"HTTP {status_code}")
+    span.end(end_time)
+
+
+add_request_listener(_record_upstream_call)
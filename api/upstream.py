@@ -0,0 +1,94 @@
+import contextvars
+import re
+import threading
+import urllib.parse
+from collections import Counter
+
+from api.session import add_request_listener
+
+# Accounting object for the current web request, if any
+_current_calls = contextvars.ContextVar("upstream_calls", default=None)
+
+# Numeric IDs and MAC addresses in a path, replaced so calls group by route
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+_MAC_SEGMENT = re.compile(r'/[0-9A-Fa-f]{2}([:-]?[0-9A-Fa-f]{2}){5}(?=/|$)')
+
+
+def path_template(url):
+    """
+    Reduce a ClearPass URL to its route, e.g. /api/static-host-list/{id}.
+
+    Query strings are dropped and numeric IDs and MAC addresses are replaced by
+    placeholders, so calls to the same route are counted together.
+    """
+    path = urllib.parse.urlsplit(url).path or '/'
+    path = _MAC_SEGMENT.sub('/{mac}', path)
+    return _ID_SEGMENT.sub('/{id}', path)
+
+
+class UpstreamCalls:
+    """
+    Tally of ClearPass calls made while serving one web request.
+
+    Calls are grouped by (method, path template, status); status is "error" for calls
+    that raised instead of returning a response. Worker threads may record into the
+    same instance, so updates are locked.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.count = 0
+        self.total_time = 0.0
+
+    def record(self, method, url, status_code, elapsed):
+        key = (method, path_template(url), str(status_code) if status_code is not None else "error")
+        with self._lock:
+            self.calls[key] += 1
+            self.count += 1
+            self.total_time += elapsed
+
+    def summary(self):
+        """Return the grouped calls as a compact string for log lines."""
+        with self._lock:
+            return ", ".join(
+                f"{method} {path} {status} x{count}"
+                for (method, path, status), count in sorted(self.calls.items())
+            )
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_time": self.total_time,
+                "calls": [
+                    {"method": method, "path": path, "status": status, "count": count}
+                    for (method, path, status), count in sorted(self.calls.items())
+                ]
+            }
+
+
+def start_accounting():
+    """Begin counting ClearPass calls for the current context and return the tally."""
+    calls = UpstreamCalls()
+    _current_calls.set(calls)
+    return calls
+
+
+def stop_accounting():
+    """Stop counting ClearPass calls for the current context."""
+    _current_calls.set(None)
+
+
+def current_accounting():
+    """Return the tally for the current context, or None outside a web request."""
+    return _current_calls.get()
+
+
+def _record_call(method, url, status_code, elapsed, error):
+    calls = _current_calls.get()
+    if calls is not None:
+        calls.record(method, url, status_code, elapsed)
+
+
+add_request_listener(_record_call)
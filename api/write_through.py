@@ -0,0 +1,140 @@
+"""
+Keeps the local caches in step with the app's own writes to ClearPass.
+
+Every successful write made through the ClearPass session passes through
+apply_write(), whichever of the add strategies or device functions made it, so a
+new mutation path can't forget to update the caches. api.clearpass registers it, so
+it applies to any code that uses the ClearPass client, not just the web app:
+
+    PATCH/PUT of a whole static host list   the sent host_entries are applied to the
+                                            cached list and to the mirror (the reverse
+                                            MAC index); appends insert only new rows
+    other writes under a static host list   the MAC that was sent is added to the
+    (host sub-resources, uploads)           mirror, and the cached list is dropped since
+                                            the stored entry format isn't known
+    POST of a new static host list          the created list is cached and mirrored,
+                                            and added to its logical list's cached shards
+    endpoint and device writes              the endpoint lookup for the MAC is dropped
+
+Cached reads therefore reflect the app's own writes immediately, without an extra GET.
+"""
+import logging
+import re
+import urllib.parse
+
+from api.clearpass import get_list_cache, invalidate_endpoint_cache
+from api.metrics import CACHE_WRITE_THROUGH
+from api.mirror import get_list_mirror
+from api.sharding import note_list_created
+from api.snapshot import host_entries, mac_to_int
+
+logger = logging.getLogger(__name__)
+
+# /static-host-list/{id} or /static-host-lists/{id}, optionally followed by a sub-resource
+_LIST_PATH = re.compile(r'/static-host-lists?/(\d+)(/.*)?$')
+_LIST_COLLECTION_PATH = re.compile(r'/static-host-lists?/?$')
+_MAC_IN_PATH = re.compile(r'/([0-9A-Fa-f]{2}(?:[:-]?[0-9A-Fa-f]{2}){5})(?=/|$)')
+
+# Payload keys that carry a MAC address in endpoint, device and host payloads
+_MAC_KEYS = ("mac_address", "mac", "host_address")
+
+
+def _payload_macs(url, payload):
+    """Return the MAC addresses a write was about, from its JSON payload and URL."""
+    macs = []
+    if isinstance(payload, dict):
+        for key in _MAC_KEYS:
+            value = payload.get(key)
+            if isinstance(value, str) and mac_to_int(value) is not None:
+                macs.append(value)
+    macs.extend(_MAC_IN_PATH.findall(urllib.parse.urlsplit(url).path))
+    return macs
+
+
+def _apply_list_write(list_id, payload):
+    """Apply a write that sent a whole list (read-modify-write)."""
+    entries = host_entries(payload)
+    fields = {k: v for k, v in payload.items() if k not in ('host_entries', 'hosts', 'id')}
+
+    cache = get_list_cache()
+    cached = cache.get(str(list_id)) if 'host_entries' in payload else None
+    if cached is not None:
+        cached.update(fields)
+        cached['host_entries'] = payload['host_entries']
+        cache.set(str(list_id), cached)
+        CACHE_WRITE_THROUGH.inc(cache="static_host_list", action="update")
+    else:
+        cache.invalidate(str(list_id))
+        CACHE_WRITE_THROUGH.inc(cache="static_host_list", action="invalidate")
+
+    mirror = get_list_mirror()
+    if mirror is not None and mirror.store.set_entries(list_id, entries, fields):
+        CACHE_WRITE_THROUGH.inc(cache="list_mirror", action="update")
+
+
+def _apply_host_write(list_id, url, payload):
+    """Apply a write that added hosts to a list without sending the whole list."""
+    get_list_cache().invalidate(str(list_id))
+    CACHE_WRITE_THROUGH.inc(cache="static_host_list", action="invalidate")
+
+    mirror = get_list_mirror()
+    if mirror is None:
+        return
+    description = ''
+    if isinstance(payload, dict):
+        description = payload.get('host_address_desc') or payload.get('description') or ''
+    entries = [(mac, description) for mac in _payload_macs(url, payload)]
+    if isinstance(payload, dict):
+        entries.extend(host_entries(payload))
+    if entries and mirror.store.add_entries(list_id, entries):
+        CACHE_WRITE_THROUGH.inc(cache="list_mirror", action="update")
+
+
+def _apply_list_create(response):
+    """Apply a write that created a list (such as a new shard), from the list ClearPass returned."""
+    try:
+        host_list = response.json()
+    except ValueError:
+        return
+    if not isinstance(host_list, dict) or 'id' not in host_list:
+        return
+
+    get_list_cache().set(str(host_list['id']), host_list)
+    CACHE_WRITE_THROUGH.inc(cache="static_host_list", action="update")
+    note_list_created(host_list)
+
+    mirror = get_list_mirror()
+    if mirror is not None and mirror.store.replace_lists([host_list], complete=False):
+        CACHE_WRITE_THROUGH.inc(cache="list_mirror", action="update")
+
+
+def apply_write(method, url, payload, response):
+    """Write listener: update or drop cached data touched by a successful ClearPass write."""
+    path = urllib.parse.urlsplit(url).path
+    if method == "POST" and _LIST_COLLECTION_PATH.search(path):
+        _apply_list_create(response)
+        return
+
+    match = _LIST_PATH.search(path)
+    if match:
+        list_id, subpath = match.group(1), match.group(2)
+        whole_list = (
+            not subpath and method in ("PATCH", "PUT") and isinstance(payload, dict)
+            and ('host_entries' in payload or 'hosts' in payload)
+        )
+        if whole_list:
+            _apply_list_write(list_id, payload)
+        elif method == "DELETE":
+            # The app doesn't delete hosts; drop the cached copy and let the next sync fix the mirror
+            get_list_cache().invalidate(str(list_id))
+            CACHE_WRITE_THROUGH.inc(cache="static_host_list", action="invalidate")
+        else:
+            _apply_host_write(list_id, url, payload)
+        logger.debug("Applied %s %s to the list caches", method, path)
+        return
+
+    if '/endpoint' in path or '/device' in path:
+        for mac in _payload_macs(url, payload):
+            invalidate_endpoint_cache(mac)
+            CACHE_WRITE_THROUGH.inc(cache="endpoint", action="invalidate")
+
@@ -1,73 +1,224 @@
-from flask import Flask, request, render_template, jsonify
+import time
+
+# Measured from here to the end of create_app() and exported as app_startup_seconds
+_import_started = time.perf_counter()
+
+from flask import Blueprint, Flask, current_app, request, render_template, jsonify, Response, stream_with_context, url_for, g
 from api.clearpass import (
-    add_endpoint, get_endpoint, get_static_host_lists, search_static_host_list, 
+    add_endpoint, get_endpoint, lookup_endpoints, create_endpoints_bulk, ENDPOINT_STATUSES,
+    get_clearpass_token, get_static_host_lists, search_static_host_list, 
     search_mac_across_all_static_host_lists, explore_api_endpoints, 
     get_static_host_list_details, add_mac_to_static_host_list,
     add_mac_to_static_host_list_v2, add_mac_to_static_host_list_v3, add_mac_to_static_host_list_v4,
     add_mac_to_static_host_list_v5, create_endpoint_mac_and_add_to_static_host_list, 
     check_if_mac_already_in_list, add_multiple_macs_to_static_host_list,
-    register_guest_device, register_device_with_mpsk, create_device_direct, set_device_mpsk
+    register_guest_device, register_device_with_mpsk, create_device_direct, set_device_mpsk,
+    generate_pronounceable_mpsk, provision_device_with_mpsk, static_host_list_version
+)
+from api.jobs import start_job, get_job
+from api.mpsk import get_mpsk_pool, generate_mpsk_batch
+from api.mirror import get_list_mirror
+from api.list_queries import (
+    RANGE_QUERY_LIMIT, SetQuery, find_macs_in_ranges, parse_mac_prefix, search_macs_across_all_static_host_lists,
+    vendor_ranges
+)
+from api.snapshot import mac_to_int
+from api.sharding import (
+    add_macs_to_sharded_list, choose_shard, logical_matches, search_sharded_list, shard_size, sharded_list_details,
+    sharded_list_version
 )
+from api.upstream import start_accounting, stop_accounting
+from api.metrics import APP_STARTUP_SECONDS, HTTP_REQUEST_DURATION, render as render_metrics
+from api.tracing import start_span, detach_span, traced
+from api.logs import configure_logging
+from api.profiler import profile
+from api.json_provider import FastJSONProvider
+from api.responses import compress_response, conditional
+from api.lifecycle import shutdown
 import os
+import hmac
+import io
+import csv
+import atexit
+import secrets
+import string
 import logging
+import traceback
+from functools import wraps
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Set up logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# One line per request with its ClearPass call breakdown
+access_logger = logging.getLogger('app.access')
+
+# Pages and API routes; registered on the app by create_app()
+bp = Blueprint('web', __name__)
+
+@bp.before_app_request
+def begin_upstream_accounting():
+    """Start counting the ClearPass calls made while serving this request."""
+    g.request_started = time.perf_counter()
+    g.upstream_calls = start_accounting()
+
+@bp.after_app_request
+def report_upstream_calls(response):
+    """Add upstream call headers and log the request once the response is finished."""
+    calls = g.get('upstream_calls')
+    if calls is None:
+        return response
+    
+    response.headers['X-Upstream-Calls'] = str(calls.count)
+    response.headers['X-Upstream-Time'] = f"{calls.total_time:.3f}"
+    
+    # Streamed responses keep calling ClearPass after the headers are sent,
+    # so the access log line is written when the response is closed
+    method, path, started = request.method, request.path, g.request_started
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = response.status_code
+    
+    def log_access():
+        elapsed = time.perf_counter() - started
+        HTTP_REQUEST_DURATION.observe(elapsed, method=method, route=route, status=str(status))
+        access_logger.info(
+            "%s %s %s %.1fms upstream_calls=%d upstream_time=%.3fs upstream=[%s]",
+            method, path, status, elapsed * 1000,
+            calls.count, calls.total_time, calls.summary()
+        )
+    
+    response.call_on_close(log_access)
+    return response
+
+@bp.teardown_app_request
+def end_upstream_accounting(exc):
+    stop_accounting()
 
-# Create Flask app
-app = Flask(__name__)
+@bp.before_app_request
+def begin_trace():
+    """Open the root span for this request; ClearPass calls and strategy attempts nest under it."""
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.trace_span = start_span(
+        f"{request.method} {route}",
+        kind="server",
+        **{"http.method": request.method, "http.route": route, "http.target": request.path}
+    )
 
-# Print environment variables for debugging (except secrets)
-print("=== Environment Configuration ===")
-print(f"CLEARPASS_BASE_URL: {os.getenv('CLEARPASS_BASE_URL')}")
-print(f"CLEARPASS_CLIENT_ID: {os.getenv('CLEARPASS_CLIENT_ID')}")
-# Don't log the secret
-print(f"CLEARPASS_CLIENT_SECRET: {'*' * 8 if os.getenv('CLEARPASS_CLIENT_SECRET') else 'Not set'}")
-print("===============================")
+@bp.after_app_request
+def finish_trace(response):
+    """Tag the response with its trace ID and end the root span once the response is finished."""
+    span = g.get('trace_span')
+    if span is None:
+        return response
+    
+    span.set_attribute("http.status_code", response.status_code)
+    if response.status_code >= 500:
+        span.set_error(f"HTTP {response.status_code}")
+    response.headers['X-Trace-Id'] = span.trace_id
+    
+    # Streamed responses are still running here, so the span ends when the response is closed
+    response.call_on_close(span.end)
+    g.trace_closing = True
+    return response
 
-# Configure Flask logger
-app.logger.setLevel(logging.DEBUG)
+@bp.teardown_app_request
+def end_trace(exc):
+    span = g.get('trace_span')
+    if span is None:
+        return
+    detach_span(span)
+    if not g.get('trace_closing'):
+        # after_request never ran, e.g. an unhandled exception
+        if exc is not None:
+            span.set_error(exc)
+        span.end()
+
+def admin_required(view):
+    """
+    Restrict a view to callers presenting ADMIN_TOKEN in the X-Admin-Token header.
+    
+    Admin views are disabled (404) when ADMIN_TOKEN is not set.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        admin_token = os.getenv('ADMIN_TOKEN')
+        if not admin_token:
+            return jsonify({"success": False, "message": "Admin endpoints are disabled"}), 404
+        
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(supplied.encode(), admin_token.encode()):
+            return jsonify({"success": False, "message": "Admin token required"}), 403
+        
+        return view(*args, **kwargs)
+    return wrapper
 
-@app.route('/')
+@bp.route('/admin/profile')
+@admin_required
+def admin_profile():
+    """
+    Sample every thread in this process for a few seconds and return collapsed stacks.
+    
+    Query parameters: seconds (default 10, capped by PROFILE_MAX_SECONDS), interval_ms
+    (default 5) and idle=1 to keep threads that are only waiting for work.
+    """
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval_ms = float(request.args.get('interval_ms', 5))
+    except ValueError:
+        return jsonify({"success": False, "message": "seconds and interval_ms must be numbers"}), 400
+    
+    max_seconds = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+    if not 0 < seconds <= max_seconds:
+        return jsonify({"success": False, "message": f"seconds must be between 0 and {max_seconds:g}"}), 400
+    if not 1 <= interval_ms <= 1000:
+        return jsonify({"success": False, "message": "interval_ms must be between 1 and 1000"}), 400
+    
+    profiler = profile(seconds, interval=interval_ms / 1000, include_idle=request.args.get('idle') == '1')
+    if profiler is None:
+        return jsonify({"success": False, "message": "Another profile is already running"}), 409
+    
+    logger.info("Profiled %.1fs: %d samples, %d distinct stacks", profiler.elapsed, profiler.samples, len(profiler.stacks))
+    response = Response(profiler.collapsed(), mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(profiler.samples)
+    response.headers['X-Profile-Seconds'] = f"{profiler.elapsed:.3f}"
+    response.headers['Content-Disposition'] = 'attachment; filename=profile.collapsed'
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Expose request, ClearPass, cache, pool and job metrics in Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
 def index():
     return render_template('index.html')
     
-@app.route('/lookup')
+@bp.route('/lookup')
 def lookup():
     return render_template('lookup.html')
     
-@app.route('/static-hosts')
+@bp.route('/static-hosts')
 def static_hosts():
     return render_template('static_hosts.html')
     
-@app.route('/view-static-host-list')
+@bp.route('/view-static-host-list')
 def view_static_host_list():
     return render_template('view_static_host_list.html')
     
-@app.route('/add-to-static-host-list')
+@bp.route('/add-to-static-host-list')
 def add_to_static_host_list():
     return render_template('add_to_static_host_list.html')
     
-@app.route('/batch-upload')
+@bp.route('/batch-upload')
 def batch_upload():
     return render_template('batch_upload.html')
     
-@app.route('/mpsk-generator')
+@bp.route('/mpsk-generator')
 def mpsk_generator():
     return render_template('mpsk_generator.html')
 
-@app.route('/test-connection')
+@bp.route('/test-connection')
 def test_connection():
     """Test route to verify ClearPass API connectivity."""
-    from api.clearpass import get_clearpass_token
-    
     try:
         # Attempt to get a token
         token = get_clearpass_token()
@@ -78,9 +229,8 @@ def test_connection():
         })
     except Exception as e:
         # Log the error
-        import traceback
-        app.logger.error(f"API connection test failed: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("API connection test failed: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return error response
         return jsonify({
@@ -88,7 +238,7 @@ def test_connection():
             "message": f"Failed to connect to ClearPass API: {str(e)}"
         }), 500
 
-@app.route('/api/add-endpoint', methods=['POST'])
+@bp.route('/api/add-endpoint', methods=['POST'])
 def api_add_endpoint():
     data = request.json
     mac_address = data.get('mac_address')
@@ -117,14 +267,13 @@ def api_add_endpoint():
         
     except ValueError as e:
         # Handle validation errors
-        app.logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         return jsonify({"success": False, "message": str(e)}), 400
         
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error adding endpoint: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error adding endpoint: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -132,7 +281,8 @@ def api_add_endpoint():
             "message": f"Failed to add endpoint: {str(e)}"
         }), 500
         
-@app.route('/api/get-endpoint', methods=['GET'])
+@bp.route('/api/get-endpoint', methods=['GET'])
+@conditional
 def api_get_endpoint():
     mac_address = request.args.get('mac_address')
     
@@ -160,14 +310,13 @@ def api_get_endpoint():
         
     except ValueError as e:
         # Handle validation errors
-        app.logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         return jsonify({"success": False, "message": str(e)}), 400
         
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error getting endpoint: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error getting endpoint: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -175,7 +324,245 @@ def api_get_endpoint():
             "message": f"Failed to get endpoint details: {str(e)}"
         }), 500
         
-@app.route('/api/static-host-lists', methods=['GET'])
+def clean_csv_row(row):
+    """
+    Strip the keys and values of a csv.DictReader row; missing trailing fields become ''.
+    
+    Raises:
+        ValueError: If the row has more fields than the header
+    """
+    if None in row:
+        raise ValueError(f"Row has {len(row[None])} more field(s) than the header")
+    return {(key or '').strip(): (value or '').strip() for key, value in row.items()}
+
+def read_mac_addresses(file_field='file'):
+    """
+    Read a list of MAC addresses from the current request.
+    
+    Accepts either an uploaded CSV/TXT file with one MAC address per line (first
+    column; blank lines and # comments are skipped) or a JSON body {"mac_addresses": [...]}.
+    
+    Raises:
+        ValueError: If the upload is unusable or no MAC addresses were provided
+    """
+    mac_addresses = []
+    
+    if file_field in request.files:
+        file = request.files[file_field]
+        if file.filename == '':
+            raise ValueError("No file selected")
+        
+        try:
+            content = file.read().decode('utf-8')
+        except UnicodeDecodeError:
+            raise ValueError("File must be UTF-8 encoded text")
+        
+        for line in content.splitlines():
+            # Skip empty lines and comments
+            if not line.strip() or line.strip().startswith('#'):
+                continue
+            
+            # First column, split by comma or tab
+            parts = line.split(',') if ',' in line else line.split('\t')
+            mac_addresses.append(parts[0].strip())
+    else:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object")
+        mac_addresses = data.get('mac_addresses', [])
+        
+        if not isinstance(mac_addresses, list):
+            raise ValueError("mac_addresses must be a list")
+    
+    if not mac_addresses:
+        raise ValueError("No MAC addresses provided")
+    
+    return mac_addresses
+
+@bp.route('/api/endpoints/lookup', methods=['POST'])
+def api_lookup_endpoints():
+    """
+    Look up many endpoints at once.
+    
+    Accepts either a JSON body {"mac_addresses": [...]} or an uploaded CSV/TXT file
+    with one MAC address per line (first column). Results are streamed back as
+    NDJSON, one JSON object per line, in the order they complete.
+    """
+    try:
+        mac_addresses = read_mac_addresses()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    # Validate MAC address format up front, reporting invalid ones in the stream
+    valid_macs = []
+    invalid_macs = []
+    for mac_address in mac_addresses:
+        mac = str(mac_address).replace(':', '').replace('-', '').replace('.', '')
+        if len(mac) != 12 or not all(c in '0123456789ABCDEFabcdef' for c in mac):
+            invalid_macs.append(str(mac_address))
+        else:
+            valid_macs.append(mac)
+    
+    logger.info("Bulk endpoint lookup for %s MAC addresses (%s invalid)", len(valid_macs), len(invalid_macs))
+    
+    dumps = current_app.json.dumps
+    
+    def generate():
+        for mac_address in invalid_macs:
+            yield dumps({"mac_address": mac_address, "error": "Invalid MAC address format"}) + "\n"
+        
+        try:
+            for result in lookup_endpoints(valid_macs):
+                yield dumps(result) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure as a final line
+            logger.error("Bulk endpoint lookup failed: %s", e)
+            yield dumps({"error": f"Bulk lookup aborted: {str(e)}"}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/api/endpoints/bulk', methods=['POST'])
+def api_create_endpoints_bulk():
+    """
+    Create many endpoints at once from a CSV file or JSON payload.
+    
+    CSV files have a header row with a mac_address column and optional status and
+    description columns; any other column becomes an endpoint attribute. JSON bodies
+    look like {"endpoints": [{"mac_address": ..., "status": ..., "attributes": {...}}],
+    "skip_existing": true}. Every item is validated before anything is sent to ClearPass.
+    """
+    skip_existing = False
+    items = []
+    row_errors = {}
+    
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"success": False, "message": "No file selected"}), 400
+        
+        skip_existing = request.form.get('skip_existing', '').lower() in ('1', 'true', 'yes', 'on')
+        
+        try:
+            content = file.read().decode('utf-8')
+        except UnicodeDecodeError:
+            return jsonify({"success": False, "message": "File must be UTF-8 encoded text"}), 400
+        
+        lines = [line for line in content.splitlines() if line.strip() and not line.strip().startswith('#')]
+        reader = csv.DictReader(io.StringIO('\n'.join(lines)))
+        if not reader.fieldnames or 'mac_address' not in [name.strip() for name in reader.fieldnames]:
+            return jsonify({"success": False, "message": "CSV file must have a header row with a mac_address column"}), 400
+        
+        for row in reader:
+            try:
+                row = clean_csv_row(row)
+            except ValueError as e:
+                row_errors[len(items)] = {
+                    "mac_address": (row.get('mac_address') or '').strip() or None,
+                    "status": "invalid",
+                    "message": str(e)
+                }
+                items.append({})
+                continue
+            attributes = {
+                key: value for key, value in row.items()
+                if key and key not in ('mac_address', 'status', 'description') and value
+            }
+            items.append({
+                "mac_address": row.get('mac_address', ''),
+                "status": row.get('status') or None,
+                "description": row.get('description') or None,
+                "attributes": attributes or None
+            })
+    else:
+        data = request.get_json(silent=True) or {}
+        skip_existing = bool(data.get('skip_existing', False))
+        items = data.get('endpoints', [])
+        
+        if not isinstance(items, list):
+            return jsonify({"success": False, "message": "endpoints must be a list"}), 400
+    
+    if not items:
+        return jsonify({"success": False, "message": "No endpoints provided"}), 400
+    
+    # Validate the whole batch before creating anything
+    valid_items = []
+    invalid_results = {}
+    seen_macs = set()
+    for index, item in enumerate(items):
+        if index in row_errors:
+            invalid_results[index] = row_errors[index]
+            continue
+        
+        if not isinstance(item, dict) or not item.get('mac_address'):
+            invalid_results[index] = {"mac_address": None, "status": "invalid", "message": "MAC address is required"}
+            continue
+        
+        mac_address = str(item['mac_address'])
+        mac = mac_address.replace(':', '').replace('-', '').replace('.', '')
+        if len(mac) != 12 or not all(c in '0123456789ABCDEFabcdef' for c in mac):
+            invalid_results[index] = {"mac_address": mac_address, "status": "invalid", "message": "Invalid MAC address format"}
+            continue
+        
+        status = item.get('status') or "Known"
+        if status not in ENDPOINT_STATUSES:
+            invalid_results[index] = {
+                "mac_address": mac_address,
+                "status": "invalid",
+                "message": f"Invalid status '{status}'. Expected one of: {', '.join(ENDPOINT_STATUSES)}"
+            }
+            continue
+        
+        attributes = item.get('attributes')
+        if attributes is not None and not isinstance(attributes, dict):
+            invalid_results[index] = {"mac_address": mac_address, "status": "invalid", "message": "attributes must be an object"}
+            continue
+        
+        if mac.lower() in seen_macs:
+            invalid_results[index] = {"mac_address": mac_address, "status": "invalid", "message": "Duplicate MAC address in batch"}
+            continue
+        seen_macs.add(mac.lower())
+        
+        valid_items.append((index, {
+            "mac_address": mac_address,
+            "status": status,
+            "description": item.get('description'),
+            "attributes": attributes
+        }))
+    
+    logger.info("Bulk endpoint creation: %s valid, %s invalid, skip_existing=%s", len(valid_items), len(invalid_results), skip_existing)
+    
+    try:
+        created_results = create_endpoints_bulk([item for _, item in valid_items], skip_existing=skip_existing) if valid_items else []
+    except Exception as e:
+        # Log the full exception for debugging
+        logger.error("Error creating endpoints in bulk: %s", e)
+        logger.error(traceback.format_exc())
+        
+        return jsonify({
+            "success": False,
+            "message": f"Failed to create endpoints: {str(e)}"
+        }), 500
+    
+    # Merge outcomes back into input order
+    results = dict(invalid_results)
+    for (index, _), result in zip(valid_items, created_results):
+        results[index] = result
+    ordered_results = [results[index] for index in sorted(results)]
+    
+    summary = {"total": len(ordered_results), "created": 0, "skipped": 0, "failed": 0, "invalid": 0}
+    for result in ordered_results:
+        summary[result["status"]] += 1
+    
+    return jsonify({
+        "success": summary["failed"] == 0 and summary["invalid"] == 0,
+        "message": f"Created {summary['created']} endpoint(s), skipped {summary['skipped']}, "
+                   f"failed {summary['failed']}, invalid {summary['invalid']}",
+        "summary": summary,
+        "results": ordered_results
+    })
+
+@bp.route('/api/static-host-lists', methods=['GET'])
+@conditional
 def api_get_static_host_lists():
     """Get all static host lists."""
     try:
@@ -190,9 +577,8 @@ def api_get_static_host_lists():
         })
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error getting static host lists: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error getting static host lists: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -200,7 +586,8 @@ def api_get_static_host_lists():
             "message": f"Failed to get static host lists: {str(e)}"
         }), 500
 
-@app.route('/api/search-static-host-list', methods=['GET'])
+@bp.route('/api/search-static-host-list', methods=['GET'])
+@conditional
 def api_search_static_host_list():
     """Search for a MAC address across all static host lists."""
     mac_address = request.args.get('mac_address')
@@ -220,7 +607,10 @@ def api_search_static_host_list():
         
         # If list_id is provided, search just that list (for backward compatibility)
         if list_id:
-            result = search_static_host_list(list_id, mac_address)
+            if shard_size():
+                result = search_sharded_list(list_id, mac_address)
+            else:
+                result = search_static_host_list(list_id, mac_address)
             
             return jsonify({
                 "success": True,
@@ -230,21 +620,25 @@ def api_search_static_host_list():
                 "list_details": result.get("list_details", {})
             })
         
-        # Otherwise, search across all lists
+        # Otherwise, search across all lists, from the local mirror when it is fresh
         else:
-            result = search_mac_across_all_static_host_lists(mac_address)
+            mirror = get_list_mirror()
+            result = mirror.search_mac(mac_address) if mirror else None
+            if result is None:
+                result = search_mac_across_all_static_host_lists(mac_address)
+            if shard_size():
+                logical_matches(result.get("matches", []))
             
             return jsonify(result)
             
     except ValueError as e:
         # Handle validation errors
-        app.logger.error(f"Validation error: {str(e)}")
+        logger.error("Validation error: %s", e)
         return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error searching for MAC address: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error searching for MAC address: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -252,7 +646,161 @@ def api_search_static_host_list():
             "message": f"Failed to search for MAC address: {str(e)}"
         }), 500
         
-@app.route('/api/view-static-host-list', methods=['GET'])
+@bp.route('/api/static-host-lists/search', methods=['POST'])
+def api_search_static_host_lists_bulk():
+    """
+    Search every static host list for many MAC addresses at once.
+    
+    Accepts the same input as /api/endpoints/lookup and returns a mapping from each
+    MAC address to the list entries found for it. Every list is read once per request
+    (from the mirror when it is fresh), however many MAC addresses are searched.
+    """
+    try:
+        mac_addresses = read_mac_addresses()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    invalid_macs = [str(mac_address) for mac_address in mac_addresses if mac_to_int(str(mac_address)) is None]
+    if invalid_macs:
+        return jsonify({
+            "success": False,
+            "message": f"{len(invalid_macs)} invalid MAC address(es)",
+            "invalid": invalid_macs[:100]
+        }), 400
+    
+    try:
+        return jsonify(search_macs_across_all_static_host_lists(mac_addresses))
+    except Exception as e:
+        logger.error("Bulk static host list search failed: %s", e)
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "success": False,
+            "message": f"Error searching static host lists: {str(e)}"
+        }), 500
+
+@bp.route('/api/static-host-lists/macs', methods=['GET'])
+@conditional
+def api_find_macs_in_static_host_lists():
+    """
+    Find list entries by MAC prefix, MAC range or vendor, across all static host lists.
+    
+    Takes exactly one of prefix (e.g. an OUI such as 00:1A:2B), start and end (a MAC
+    range, inclusive) or vendor (part of a vendor name from the OUI table), plus
+    optional group_by=vendor and limit.
+    """
+    prefix = request.args.get('prefix')
+    start = request.args.get('start')
+    end = request.args.get('end')
+    vendor = request.args.get('vendor')
+    
+    try:
+        if sum(1 for given in (prefix, start or end, vendor) if given) != 1:
+            raise ValueError("Provide exactly one of prefix, start and end, or vendor")
+        
+        limit = int(request.args.get('limit', RANGE_QUERY_LIMIT))
+        if not 1 <= limit <= RANGE_QUERY_LIMIT:
+            raise ValueError(f"limit must be between 1 and {RANGE_QUERY_LIMIT}")
+        
+        if prefix:
+            ranges = [parse_mac_prefix(prefix)]
+        elif vendor:
+            ranges = vendor_ranges(vendor)
+            if not ranges:
+                return jsonify({
+                    "success": False,
+                    "message": f"No vendor matching '{vendor}' in the OUI table"
+                }), 404
+        else:
+            low, high = mac_to_int(start or ''), mac_to_int(end or '')
+            if low is None or high is None or low > high:
+                raise ValueError("start and end must be MAC addresses with start <= end")
+            ranges = [(low, high)]
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    try:
+        return jsonify(find_macs_in_ranges(ranges, limit, group_by_vendor=request.args.get('group_by') == 'vendor'))
+    except Exception as e:
+        logger.error("Static host list MAC range query failed: %s", e)
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "success": False,
+            "message": f"Error searching static host lists: {str(e)}"
+        }), 500
+
+@bp.route('/api/static-host-lists/compare', methods=['POST'])
+def api_compare_static_host_lists():
+    """
+    Run a set operation over static host lists and stream the matching MACs.
+    
+    Takes a JSON body {"operation": ..., "list_ids": [...], "mac_addresses": [...]} or
+    a multipart form with operation, comma-separated list_ids and, for the inventory
+    operation, a file of MAC addresses. Results are streamed back as NDJSON in MAC
+    order, one MAC per line, followed by a final {"summary": {...}} line.
+    """
+    data = request.get_json(silent=True) if request.is_json else request.form
+    data = data or {}
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "message": "Request body must be a JSON object"}), 400
+    operation = data.get('operation', '')
+    list_ids = data.get('list_ids') or []
+    if isinstance(list_ids, str):
+        list_ids = [list_id.strip() for list_id in list_ids.split(',') if list_id.strip()]
+    
+    try:
+        if not isinstance(list_ids, list) or not all(str(list_id).isdigit() for list_id in list_ids):
+            raise ValueError("list_ids must be a list of static host list IDs")
+        
+        inventory = None
+        if operation == 'inventory':
+            inventory = read_mac_addresses()
+            invalid_macs = [str(mac_address) for mac_address in inventory if mac_to_int(str(mac_address)) is None]
+            if invalid_macs:
+                return jsonify({
+                    "success": False,
+                    "message": f"{len(invalid_macs)} invalid MAC address(es)",
+                    "invalid": invalid_macs[:100]
+                }), 400
+        
+        # Loads the lists now, so a bad request or unreachable ClearPass gets a proper status
+        query = SetQuery(operation, list_ids, inventory)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except Exception as e:
+        logger.error("Static host list comparison failed: %s", e)
+        logger.error(traceback.format_exc())
+        return jsonify({
+            "success": False,
+            "message": f"Error loading static host lists: {str(e)}"
+        }), 500
+    
+    logger.info("Static host list %s over %s list(s) via %s", operation, len(query.lists), query.source)
+    
+    dumps = current_app.json.dumps
+    
+    def generate():
+        count = 0
+        try:
+            for row in query.rows():
+                count += 1
+                yield dumps(row) + "\n"
+            yield dumps({"summary": dict(query.summary(), count=count)}) + "\n"
+        except Exception as e:
+            # Headers are already sent, so report the failure as a final line
+            logger.error("Static host list comparison failed: %s", e)
+            yield dumps({"error": f"Comparison aborted: {str(e)}"}) + "\n"
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def static_host_list_view_version():
+    """ETag and Last-Modified of /api/view-static-host-list from the list cache, or None."""
+    list_id = request.args.get('list_id')
+    if not list_id:
+        return None
+    return sharded_list_version(list_id) if shard_size() else static_host_list_version(list_id)
+
+@bp.route('/api/view-static-host-list', methods=['GET'])
+@conditional(version=static_host_list_view_version)
 def api_view_static_host_list():
     """Get all devices in a static host list."""
     list_id = request.args.get('list_id')
@@ -261,17 +809,19 @@ def api_view_static_host_list():
         return jsonify({"success": False, "message": "Static host list ID is required"}), 400
     
     try:
-        # Get the static host list details
-        result = get_static_host_list_details(list_id)
+        # Get the static host list details, with every shard's entries when lists are sharded
+        if shard_size():
+            result = sharded_list_details(list_id)
+        else:
+            result = get_static_host_list_details(list_id)
         
         # Return response with all hosts
         return jsonify(result)
         
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error getting static host list details: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error getting static host list details: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -279,7 +829,16 @@ def api_view_static_host_list():
             "message": f"Failed to get static host list details: {str(e)}"
         }), 500
         
-@app.route('/api/add-to-static-host-list', methods=['POST'])
+def run_add_strategy(name, strategy, list_id, mac_address, description):
+    """Run one method of the add cascade in its own trace span."""
+    with traced(f"add_strategy {name}", strategy=name, list_id=list_id) as span:
+        result = strategy(list_id, mac_address, description)
+        span.set_attribute("success", bool(result.get("success")))
+        if not result.get("success"):
+            span.set_attribute("message", str(result.get("message", ""))[:200])
+        return result
+
+@bp.route('/api/add-to-static-host-list', methods=['POST'])
 def api_add_to_static_host_list():
     """Add a MAC address to a static host list."""
     data = request.json
@@ -305,12 +864,21 @@ def api_add_to_static_host_list():
         # Format MAC with colons for comparison/display
         formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
         
-        app.logger.info(f"Starting attempt to add MAC {formatted_mac} to list {list_id}")
+        logger.info("Starting attempt to add MAC %s to list %s", formatted_mac, list_id)
+        
+        # With sharded lists, add to the shard with room (or let a new shard take the MAC)
+        if shard_size():
+            shard_id, result = choose_shard(list_id, formatted_mac, description)
+            if result is not None:
+                return jsonify(result)
+            list_id = shard_id
         
         # First check if the MAC is already in the list
-        is_present, existing_host = check_if_mac_already_in_list(list_id, formatted_mac)
+        with traced("precheck", list_id=list_id) as span:
+            is_present, existing_host = check_if_mac_already_in_list(list_id, formatted_mac)
+            span.set_attribute("present", is_present)
         if is_present:
-            app.logger.info(f"MAC {formatted_mac} is already in list {list_id}")
+            logger.info("MAC %s is already in list %s", formatted_mac, list_id)
             return jsonify({
                 "success": True,
                 "message": f"MAC address {formatted_mac} is already in the static host list",
@@ -320,43 +888,45 @@ def api_add_to_static_host_list():
         # Try all methods in sequence until one works
         
         # First try the new v5 method with the correct host_entries format
-        app.logger.info("Trying new host_entries format method (v5)")
-        result = add_mac_to_static_host_list_v5(list_id, mac_address, description)
+        logger.info("Trying new host_entries format method (v5)")
+        result = run_add_strategy("v5", add_mac_to_static_host_list_v5, list_id, mac_address, description)
         
         # If that fails, try creating the endpoint and then adding to static host list
         if not result.get("success"):
-            app.logger.info("v5 method failed, creating endpoint and then adding to static host list")
-            result = create_endpoint_mac_and_add_to_static_host_list(list_id, mac_address, description)
+            logger.info("v5 method failed, creating endpoint and then adding to static host list")
+            result = run_add_strategy("endpoint", create_endpoint_mac_and_add_to_static_host_list, list_id, mac_address, description)
         
         # If that fails, try the v3 brute force method
         if not result.get("success"):
-            app.logger.info("Endpoint creation approach failed, trying brute force method (v3)")
-            result = add_mac_to_static_host_list_v3(list_id, mac_address, description)
+            logger.info("Endpoint creation approach failed, trying brute force method (v3)")
+            result = run_add_strategy("v3", add_mac_to_static_host_list_v3, list_id, mac_address, description)
         
         # If that fails, try the management API method (v4)
         if not result.get("success"):
-            app.logger.info("Brute force method failed, trying management API method (v4)")
-            result = add_mac_to_static_host_list_v4(list_id, mac_address, description)
+            logger.info("Brute force method failed, trying management API method (v4)")
+            result = run_add_strategy("v4", add_mac_to_static_host_list_v4, list_id, mac_address, description)
         
         # If still no success, try the earlier methods as a last resort
         if not result.get("success"):
-            app.logger.info("Advanced methods failed, trying original methods")
-            result = add_mac_to_static_host_list_v2(list_id, mac_address, description)
+            logger.info("Advanced methods failed, trying original methods")
+            result = run_add_strategy("v2", add_mac_to_static_host_list_v2, list_id, mac_address, description)
             
             if not result.get("success"):
-                app.logger.info("Trying final method")
-                result = add_mac_to_static_host_list(list_id, mac_address, description)
+                logger.info("Trying final method")
+                result = run_add_strategy("v1", add_mac_to_static_host_list, list_id, mac_address, description)
             
         # Log the final result
         if result.get("success"):
-            app.logger.info(f"Successfully added MAC {formatted_mac} to list {list_id}")
+            logger.info("Successfully added MAC %s to list %s", formatted_mac, list_id)
         else:
-            app.logger.error(f"All methods failed to add MAC {formatted_mac} to list {list_id}")
+            logger.error("All methods failed to add MAC %s to list %s", formatted_mac, list_id)
         
         # Try to check if MAC is in the list, but don't override success if it was already successful
-        is_present, existing_host = check_if_mac_already_in_list(list_id, formatted_mac)
+        with traced("verify", list_id=list_id) as span:
+            is_present, existing_host = check_if_mac_already_in_list(list_id, formatted_mac)
+            span.set_attribute("present", is_present)
         if is_present:
-            app.logger.info(f"Final verification: MAC {formatted_mac} is in list {list_id}")
+            logger.info("Final verification: MAC %s is in list %s", formatted_mac, list_id)
             return jsonify({
                 "success": True,
                 "message": f"MAC address {formatted_mac} has been added to the static host list (verified)",
@@ -365,7 +935,7 @@ def api_add_to_static_host_list():
         elif result.get("success") and "v5" not in str(result.get("message", "")):
             # For non-v5 methods, verify and report failure if needed
             # For v5 method, we trust the API response even without verification
-            app.logger.info(f"API reported success but MAC not found in list. This is expected with this ClearPass instance.")
+            logger.info("API reported success but MAC not found in list. This is expected with this ClearPass instance.")
             # Return success with note about verification delay
             result["message"] = f"MAC address {formatted_mac} has been added to the static host list (changes may take a few minutes to appear in the API)"
         
@@ -374,9 +944,8 @@ def api_add_to_static_host_list():
         
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error adding to static host list: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error adding to static host list: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -384,7 +953,7 @@ def api_add_to_static_host_list():
             "message": f"Failed to add MAC to static host list: {str(e)}"
         }), 500
         
-@app.route('/api/batch-upload', methods=['POST'])
+@bp.route('/api/batch-upload', methods=['POST'])
 def api_batch_upload():
     """Add multiple MAC addresses to a static host list from a CSV/TXT file or JSON payload."""
     # Check if list_id is in form data or JSON data
@@ -437,14 +1006,16 @@ def api_batch_upload():
                 return jsonify({"success": False, "message": "No valid MAC addresses found in the file"}), 400
             
             # Add the MACs to the static host list
-            result = add_multiple_macs_to_static_host_list(list_id, mac_list)
+            if shard_size():
+                result = add_macs_to_sharded_list(list_id, mac_list)
+            else:
+                result = add_multiple_macs_to_static_host_list(list_id, mac_list)
             return jsonify(result)
             
         except Exception as e:
             # Log the full exception for debugging
-            import traceback
-            app.logger.error(f"Error processing file upload: {str(e)}")
-            app.logger.error(traceback.format_exc())
+            logger.error("Error processing file upload: %s", e)
+            logger.error(traceback.format_exc())
             
             # Return a user-friendly error message
             return jsonify({
@@ -482,13 +1053,17 @@ def api_batch_upload():
             return jsonify({"success": False, "message": "No valid MAC addresses found in the payload"}), 400
         
         # Add the MACs to the static host list
-        result = add_multiple_macs_to_static_host_list(list_id, valid_macs)
+        if shard_size():
+            result = add_macs_to_sharded_list(list_id, valid_macs)
+        else:
+            result = add_multiple_macs_to_static_host_list(list_id, valid_macs)
         return jsonify(result)
     
     else:
         return jsonify({"success": False, "message": "No file or MAC addresses provided"}), 400
         
-@app.route('/api/explore')
+@bp.route('/api/explore')
+@conditional
 def api_explore_endpoints():
     """Explore available API endpoints in ClearPass."""
     try:
@@ -503,9 +1078,8 @@ def api_explore_endpoints():
         })
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        app.logger.error(f"Error exploring API endpoints: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error exploring API endpoints: %s", e)
+        logger.error(traceback.format_exc())
         
         # Return a user-friendly error message
         return jsonify({
@@ -513,7 +1087,7 @@ def api_explore_endpoints():
             "message": f"Failed to explore API endpoints: {str(e)}"
         }), 500
         
-@app.route('/api/generate-mpsk', methods=['POST'])
+@bp.route('/api/generate-mpsk', methods=['POST'])
 def api_generate_mpsk():
     """Generate MPSK for a device and send email."""
     data = request.json
@@ -540,39 +1114,33 @@ def api_generate_mpsk():
         formatted_mac = ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)])
         
         # Log the registration attempt
-        app.logger.info(f"Creating device and setting MPSK for {formatted_mac} with email {email}")
-        
-        # Create the device and set MPSK using direct method
-        from api.clearpass import register_device_with_mpsk, create_device_direct, set_device_mpsk
+        logger.info("Creating device and setting MPSK for %s with email %s", formatted_mac, email)
         
         # Set the role_id to 2
         role_id = 2
         
-        # Import our helper function to generate pronounceable passwords
-        from api.clearpass import generate_pronounceable_mpsk
-
         # Generate a new pronounceable password directly
         mpsk_password = generate_pronounceable_mpsk(20)
-        app.logger.info(f"Generated new pronounceable MPSK: {mpsk_password}")
+        logger.info("Generated new pronounceable MPSK: %s", mpsk_password)
         
         # Register the device with the MPSK from the API
         result = register_device_with_mpsk(formatted_mac, email, device_name, mpsk_password, role_id)
         
-        app.logger.info(f"Device creation and MPSK setting result: {result}")
+        logger.info("Device creation and MPSK setting result: %s", result)
         
         # Verify the MPSK was correctly passed through the process
         result_mpsk = result.get('mpsk_password')
-        app.logger.info(f"MPSK at start: {mpsk_password}")
-        app.logger.info(f"MPSK in result: {result_mpsk}")
+        logger.info("MPSK at start: %s", mpsk_password)
+        logger.info("MPSK in result: %s", result_mpsk)
         
         # Ensure we're returning the generated MPSK
         if result_mpsk != mpsk_password:
-            app.logger.warning(f"MPSK mismatch - input: {mpsk_password}, output: {result_mpsk}")
+            logger.warning("MPSK mismatch - input: %s, output: %s", mpsk_password, result_mpsk)
             # Set to make sure we return the correct one
             result['mpsk_password'] = mpsk_password
         
         # In a real implementation, we would send an email with the password
-        app.logger.info(f"Would send email to {email} with the password: {result['mpsk_password']}")
+        logger.info("Would send email to %s with the password: %s", email, result['mpsk_password'])
         
         # TODO: Implement email sending functionality
         
@@ -586,9 +1154,9 @@ def api_generate_mpsk():
         mpsk_setting_success = mpsk_setting_result.get('success', False)
         
         # Log detailed information
-        app.logger.info(f"MPSK generation complete. Password: {mpsk_password}")
-        app.logger.info(f"Device creation success: {device_creation_success}")
-        app.logger.info(f"MPSK setting success: {mpsk_setting_success}")
+        logger.info("MPSK generation complete. Password: %s", mpsk_password)
+        logger.info("Device creation success: %s", device_creation_success)
+        logger.info("MPSK setting success: %s", mpsk_setting_success)
         
         # Even if API calls failed, we still return success=True so user can see the generated password
         return jsonify({
@@ -616,29 +1184,26 @@ def api_generate_mpsk():
         
     except Exception as e:
         # Log the full exception for debugging
-        import traceback
-        import random
-        import string
         
-        app.logger.error(f"Error generating MPSK: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        logger.error("Error generating MPSK: %s", e)
+        logger.error(traceback.format_exc())
         
         # Generate an emergency password
         def generate_emergency_password(length=12):
             characters = string.ascii_letters + string.digits + "!@#$%^&*()-_=+"
             # Ensure we have at least one of each type
-            password = random.choice(string.ascii_lowercase)
-            password += random.choice(string.ascii_uppercase)
-            password += random.choice(string.digits)
-            password += random.choice("!@#$%^&*()-_=+")
+            password = secrets.choice(string.ascii_lowercase)
+            password += secrets.choice(string.ascii_uppercase)
+            password += secrets.choice(string.digits)
+            password += secrets.choice("!@#$%^&*()-_=+")
             
             # Fill the rest with random characters
             remaining_length = length - 4
-            password += ''.join(random.choice(characters) for _ in range(remaining_length))
+            password += ''.join(secrets.choice(characters) for _ in range(remaining_length))
             
             # Shuffle the password characters
             password_list = list(password)
-            random.shuffle(password_list)
+            secrets.SystemRandom().shuffle(password_list)
             return ''.join(password_list)
             
         emergency_password = generate_emergency_password()
@@ -658,16 +1223,171 @@ def api_generate_mpsk():
         })
 
 
-@app.route('/random-mpsk', methods=['GET', 'POST'])
-def random_mpsk():
-    """Generate a random MPSK password."""
-    from api.clearpass import generate_pronounceable_mpsk
+# Columns written to bulk MPSK provisioning reports, in order
+MPSK_REPORT_COLUMNS = [
+    "mac_address", "email", "device_name", "role_id", "mpsk_password",
+    "device_created", "mpsk_set", "status", "message"
+]
 
-    # Generate a new pronounceable password
-    mpsk_password = generate_pronounceable_mpsk(20)
+@bp.route('/api/mpsk/bulk', methods=['POST'])
+def api_bulk_mpsk_provisioning():
+    """
+    Start a bulk MPSK provisioning job.
+    
+    Accepts a CSV upload with a header row of mac_address, email, device_name and
+    role_id (device_name and role_id optional), or a JSON body {"devices": [...]} with
+    the same keys. Passwords are generated for the whole batch up front; device creation
+    and MPSK setting run in the background on a bounded worker pool.
+    """
+    rows = []
+    row_errors = {}
+    
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"success": False, "message": "No file selected"}), 400
+        
+        try:
+            content = file.read().decode('utf-8')
+        except UnicodeDecodeError:
+            return jsonify({"success": False, "message": "File must be UTF-8 encoded text"}), 400
+        
+        lines = [line for line in content.splitlines() if line.strip() and not line.strip().startswith('#')]
+        reader = csv.DictReader(io.StringIO('\n'.join(lines)))
+        fieldnames = [name.strip() for name in (reader.fieldnames or [])]
+        if 'mac_address' not in fieldnames or 'email' not in fieldnames:
+            return jsonify({"success": False, "message": "CSV file must have a header row with mac_address and email columns"}), 400
+        
+        for row in reader:
+            try:
+                rows.append(clean_csv_row(row))
+            except ValueError as e:
+                row_errors[len(rows) + 1] = {
+                    "row": len(rows) + 1,
+                    "mac_address": (row.get('mac_address') or '').strip(),
+                    "message": str(e)
+                }
+                rows.append({})
+    else:
+        data = request.get_json(silent=True) or {}
+        rows = data.get('devices', [])
+        
+        if not isinstance(rows, list):
+            return jsonify({"success": False, "message": "devices must be a list"}), 400
+    
+    if not rows:
+        return jsonify({"success": False, "message": "No devices provided"}), 400
+    
+    # Validate the whole batch before starting the job
+    devices = []
+    errors = []
+    seen_macs = set()
+    for line_number, row in enumerate(rows, start=1):
+        if line_number in row_errors:
+            errors.append(row_errors[line_number])
+            continue
+        
+        if not isinstance(row, dict):
+            errors.append({"row": line_number, "message": "Device must be an object"})
+            continue
+        
+        mac_address = str(row.get('mac_address') or '')
+        mac = mac_address.replace(':', '').replace('-', '').replace('.', '')
+        if len(mac) != 12 or not all(c in '0123456789ABCDEFabcdef' for c in mac):
+            errors.append({"row": line_number, "mac_address": mac_address, "message": "Invalid MAC address format"})
+            continue
+        
+        if mac.lower() in seen_macs:
+            errors.append({"row": line_number, "mac_address": mac_address, "message": "Duplicate MAC address in batch"})
+            continue
+        
+        email = str(row.get('email') or '').strip()
+        if not email:
+            errors.append({"row": line_number, "mac_address": mac_address, "message": "Email address is required"})
+            continue
+        
+        role_id = row.get('role_id') or 2
+        try:
+            role_id = int(role_id)
+        except (TypeError, ValueError):
+            errors.append({"row": line_number, "mac_address": mac_address, "message": f"Invalid role_id '{role_id}'"})
+            continue
+        
+        seen_macs.add(mac.lower())
+        devices.append({
+            "mac_address": ':'.join([mac[i:i+2] for i in range(0, len(mac), 2)]),
+            "email": email,
+            "device_name": str(row.get('device_name') or '').strip(),
+            "role_id": role_id
+        })
+    
+    if errors:
+        return jsonify({
+            "success": False,
+            "message": f"{len(errors)} invalid row(s) in the batch; nothing was provisioned",
+            "errors": errors
+        }), 400
+    
+    # Generate every password in one batch before any ClearPass call is made
+    for device, mpsk_password in zip(devices, get_mpsk_pool().take(len(devices))):
+        device["mpsk_password"] = mpsk_password
+    
+    job = start_job("mpsk-provisioning", devices, provision_device_with_mpsk)
+    logger.info("Started MPSK provisioning job %s for %s device(s)", job.id, len(devices))
+    
+    return jsonify({
+        "success": True,
+        "message": f"Provisioning {len(devices)} device(s) in the background",
+        "job_id": job.id,
+        "status_url": url_for('.api_get_job', job_id=job.id),
+        "report_url": url_for('.api_get_job_report', job_id=job.id)
+    }), 202
+
+@bp.route('/api/jobs/<job_id>', methods=['GET'])
+def api_get_job(job_id):
+    """Get the status and progress of a background job."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@bp.route('/api/jobs/<job_id>/report', methods=['GET'])
+def api_get_job_report(job_id):
+    """Download the per-item report of a background job as CSV (default) or JSON."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    
+    if request.args.get('format') == 'json':
+        return jsonify({"success": True, "job": job.to_dict(include_results=True)})
+    
+    job_data = job.to_dict(include_results=True)
+    
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=MPSK_REPORT_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for item, result in zip(job.items, job_data["results"]):
+        if result is None:
+            # Not processed yet
+            writer.writerow({**item, "status": "pending"})
+        else:
+            writer.writerow({**item, **result})
+    
+    return Response(
+        output.getvalue(),
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename={job.kind}-{job.id}.csv"}
+    )
 
+@bp.route('/random-mpsk', methods=['GET', 'POST'])
+def random_mpsk():
+    """Generate one or more random MPSK passwords."""
     # If it's a GET request, return the password as JSON
     if request.method == 'GET':
+        # Generate a new pronounceable password
+        mpsk_password = generate_pronounceable_mpsk(20)
+
         return jsonify({
             "success": True,
             "mpsk_password": mpsk_password
@@ -678,6 +1398,32 @@ def random_mpsk():
         # You can parse any parameters sent in the request
         data = request.json or {}
         length = data.get('length', 20)  # Default to 20 if not specified
+        count = data.get('count')
+
+        try:
+            length = int(length)
+            if length < 3:
+                raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "length must be an integer of at least 3"}), 400
+
+        # Return a batch of passwords if a count was requested
+        if count is not None:
+            try:
+                count = int(count)
+                if not 1 <= count <= 10000:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "message": "count must be an integer between 1 and 10000"}), 400
+
+            pool = get_mpsk_pool()
+            mpsk_passwords = pool.take(count) if length == pool.length else generate_mpsk_batch(count, length)
+
+            return jsonify({
+                "success": True,
+                "mpsk_passwords": mpsk_passwords,
+                "parameters": data
+            })
 
         # Generate with the specified length
         mpsk_password = generate_pronounceable_mpsk(length)
@@ -688,5 +1434,55 @@ def random_mpsk():
             "parameters": data
         })
 
+@bp.route('/api/mpsk/pool', methods=['GET'])
+def api_mpsk_pool_stats():
+    """Get pre-generated MPSK pool levels and generation throughput."""
+    return jsonify({
+        "success": True,
+        "data": get_mpsk_pool().stats()
+    })
+
+def create_app(config=None):
+    """
+    Create and configure the Flask app.
+    
+    Loads .env, sets up logging and registers the routes. ClearPass clients, caches and
+    the MPSK pool are not created here; each is built on first use, so creating the app
+    (and forking workers from it) stays fast.
+    
+    Args:
+        config: Optional dictionary of Flask config values to apply
+        
+    Returns:
+        The Flask app
+    """
+    load_dotenv()
+    configure_logging()
+    
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    if config:
+        app.config.update(config)
+    
+    # Registered before the blueprint so it runs after the blueprint's response hooks
+    app.after_request(compress_response)
+    app.register_blueprint(bp)
+    
+    atexit.register(shutdown)
+    
+    startup_seconds = time.perf_counter() - _import_started
+    app.config['STARTUP_SECONDS'] = startup_seconds
+    APP_STARTUP_SECONDS.set(startup_seconds)
+    
+    # Don't log the secret
+    logger.info(
+        "App ready in %.1fms (CLEARPASS_BASE_URL=%s, CLEARPASS_CLIENT_ID=%s, CLEARPASS_CLIENT_SECRET %s, JSON encoder %s)",
+        startup_seconds * 1000, os.getenv('CLEARPASS_BASE_URL'), os.getenv('CLEARPASS_CLIENT_ID'),
+        'set' if os.getenv('CLEARPASS_CLIENT_SECRET') else 'not set', app.json.encoder
+    )
+    
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    # Development server only; use gunicorn with wsgi.py in production (see README)
+    create_app().run(debug=os.getenv('FLASK_DEBUG') == '1', port=int(os.getenv('PORT', '5001')))
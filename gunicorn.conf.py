@@ -0,0 +1,50 @@
+"""
+Gunicorn settings for serving the app in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be overridden from the environment (see README). Most request time
+is spent waiting on ClearPass, so workers are threaded (gthread) by default; set
+GUNICORN_WORKER_CLASS=gevent (requires the gevent package) for many slow concurrent
+requests per worker.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+# Caches, the token and background jobs are per process, so a few workers with
+# several threads each beat many single-threaded workers
+workers = int(os.getenv("GUNICORN_WORKERS", min(multiprocessing.cpu_count() + 1, 4)))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "200"))
+
+# Keep idle connections from the reverse proxy open longer than the proxy's own idle
+# timeout (60 s on common load balancers) so it never reuses a connection we just closed
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# The add cascade and bulk requests can take a while; jobs run in the background
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+
+# Recycle workers now and then to bound memory growth; jitter avoids restarting them all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Import the app once in the master and fork it, so workers start fast and share
+# read-only memory; post_fork gives each worker its own clients and caches
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# The app writes its own access log line (app.access) with upstream call details
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+
+def post_fork(server, worker):
+    from api.lifecycle import init_worker
+    init_worker()
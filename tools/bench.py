@@ -0,0 +1,323 @@
+"""
+Benchmark the web app's API routes against the local ClearPass stand-in.
+
+Starts the stand-in (tools/clearpass_standin.py) in a subprocess, serves the Flask app
+in-process on a threaded WSGI server, and drives each scenario at the requested
+concurrency. For every scenario it records latency percentiles, throughput, error
+counts and the number of upstream ClearPass calls per request; peak RSS of the
+benchmark process (app + driver) is recorded once for the run.
+
+Results are written as JSON so runs can be compared across commits:
+
+    python -m tools.bench --requests 200 --concurrency 8
+    python -m tools.bench --compare bench-results/<older>.json
+
+Scenarios: get-endpoint, search-static-host-list, view-static-host-list,
+add-to-static-host-list, batch-upload, generate-mpsk.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+SCENARIOS = [
+    "get-endpoint",
+    "search-static-host-list",
+    "view-static-host-list",
+    "add-to-static-host-list",
+    "batch-upload",
+    "generate-mpsk",
+]
+
+# Separate counter space per scenario so generated MACs never collide
+_SCENARIO_MAC_PREFIX = {name: 0x10 + index for index, name in enumerate(SCENARIOS)}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _mac(scenario, n):
+    """Deterministic, unique MAC address for request n of a scenario."""
+    value = (0x02 << 40) | (_SCENARIO_MAC_PREFIX[scenario] << 32) | n
+    return ':'.join(f"{(value >> shift) & 0xff:02x}" for shift in range(40, -8, -8))
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class StandinProcess:
+    """Runs tools.clearpass_standin in a subprocess for the duration of a benchmark."""
+
+    def __init__(self, args):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._command = [
+            sys.executable, '-m', 'tools.clearpass_standin',
+            '--port', str(self.port),
+            '--lists', str(args.lists),
+            '--list-size', str(args.list_size),
+            '--endpoints', str(args.endpoints),
+            '--latency-ms', str(args.latency_ms),
+            '--jitter-ms', str(args.jitter_ms),
+            '--error-rate', str(args.error_rate),
+        ]
+        self._process = None
+
+    def __enter__(self):
+        self._process = subprocess.Popen(self._command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f"{self.url}/_standin/stats", timeout=1)
+                return self
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.1)
+        self._process.kill()
+        raise RuntimeError("ClearPass stand-in did not start within 30 seconds")
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.wait(timeout=10)
+
+
+class AppServer:
+    """Serves the Flask app in-process on a threaded WSGI server."""
+
+    def __init__(self, flask_app):
+        self._server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="bench-app", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _build_request(scenario, n, context):
+    """Return (method, path, kwargs) for request n of a scenario."""
+    list_id = context["list_ids"][n % len(context["list_ids"])]
+
+    if scenario == "get-endpoint":
+        # Cycle over a small hot set, like help-desk lookups
+        return 'GET', '/api/get-endpoint', {"params": {"mac_address": _mac(scenario, n % 50)}}
+    if scenario == "search-static-host-list":
+        return 'GET', '/api/search-static-host-list', {"params": {"mac_address": _mac(scenario, n)}}
+    if scenario == "view-static-host-list":
+        return 'GET', '/api/view-static-host-list', {"params": {"list_id": list_id}}
+    if scenario == "add-to-static-host-list":
+        return 'POST', '/api/add-to-static-host-list', {"json": {"list_id": list_id, "mac_address": _mac(scenario, n)}}
+    if scenario == "batch-upload":
+        macs = [{"mac_address": _mac(scenario, n * 100 + i)} for i in range(context["batch_size"])]
+        return 'POST', '/api/batch-upload', {"json": {"list_id": list_id, "mac_list": macs}}
+    if scenario == "generate-mpsk":
+        return 'POST', '/api/generate-mpsk', {"json": {"mac_address": _mac(scenario, n), "email": f"bench{n}@example.com"}}
+    raise ValueError(f"Unknown scenario {scenario}")
+
+
+def run_scenario(scenario, app_url, standin_url, args, context):
+    """Drive one scenario and return its result dictionary."""
+    requests.post(f"{standin_url}/_standin/reset", json={}, timeout=10)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(n):
+        nonlocal errors
+        method, path, kwargs = _build_request(scenario, n, context)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, f"{app_url}{path}", timeout=args.timeout, **kwargs)
+            failed = response.status_code >= 400 or not response.json().get("success", True)
+        except (requests.exceptions.RequestException, ValueError):
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if failed:
+                errors += 1
+
+    count = args.requests_for.get(scenario, args.requests)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, range(count)))
+    duration = time.perf_counter() - started
+
+    stats = requests.get(f"{standin_url}/_standin/stats", timeout=10).json()
+    latencies.sort()
+    latency_ms = [value * 1000 for value in latencies]
+
+    return {
+        "requests": count,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "duration_seconds": duration,
+        "throughput_rps": count / duration if duration else None,
+        "latency_ms": {
+            "mean": sum(latency_ms) / len(latency_ms) if latency_ms else None,
+            "p50": _percentile(latency_ms, 0.50),
+            "p95": _percentile(latency_ms, 0.95),
+            "p99": _percentile(latency_ms, 0.99),
+            "max": latency_ms[-1] if latency_ms else None,
+        },
+        "upstream_calls_total": stats["total_calls"],
+        "upstream_calls_per_request": stats["total_calls"] / count if count else None,
+        "upstream_calls_by_route": stats["calls"],
+    }
+
+
+def compare(current, baseline_path):
+    """Print a per-scenario comparison of two result files."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\nComparison with {baseline_path} (commit {baseline.get('commit')}):")
+    print(f"{'scenario':<26}{'p50 ms':>18}{'p95 ms':>18}{'rps':>18}{'upstream/req':>18}")
+    for scenario, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+
+        def cell(new_value, old_value):
+            if new_value is None or old_value is None:
+                return f"{'n/a':>18}"
+            change = ((new_value - old_value) / old_value * 100) if old_value else 0.0
+            return f"{new_value:>10.1f} ({change:+.0f}%)".rjust(18)
+
+        print(f"{scenario:<26}"
+              f"{cell(result['latency_ms']['p50'], old['latency_ms']['p50'])}"
+              f"{cell(result['latency_ms']['p95'], old['latency_ms']['p95'])}"
+              f"{cell(result['throughput_rps'], old['throughput_rps'])}"
+              f"{cell(result['upstream_calls_per_request'], old['upstream_calls_per_request'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's API routes against the ClearPass stand-in.")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help="Comma-separated scenarios to run (default: all)")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per scenario")
+    parser.add_argument('--add-requests', type=int, default=None,
+                        help="Requests for add-to-static-host-list, which waits 2s per add (default: --requests)")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument('--batch-size', type=int, default=100, help="MACs per batch-upload request")
+    parser.add_argument('--lists', type=int, default=5)
+    parser.add_argument('--list-size', type=int, default=1000)
+    parser.add_argument('--endpoints', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--standin-url', default=None, help="Use an already running stand-in instead of starting one")
+    parser.add_argument('--output', default=None, help="Result file (default: bench-results/<timestamp>-<commit>.json)")
+    parser.add_argument('--compare', default=None, help="Earlier result file to compare against")
+    parser.add_argument('--verbose', action='store_true', help="Show the app's stdout and log output")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    args.requests_for = {}
+    if args.add_requests is not None:
+        args.requests_for["add-to-static-host-list"] = args.add_requests
+
+    standin = contextlib.nullcontext() if args.standin_url else StandinProcess(args)
+    with standin:
+        standin_url = args.standin_url or standin.url
+
+        os.environ["CLEARPASS_BASE_URL"] = standin_url
+        os.environ.setdefault("CLEARPASS_CLIENT_ID", "bench")
+        os.environ.setdefault("CLEARPASS_CLIENT_SECRET", "bench")
+
+        import app as app_module
+        flask_app = app_module.create_app()
+
+        if not args.verbose:
+            # Keep the formatting cost of the app's logging but discard the output
+            devnull = open(os.devnull, 'w')
+            for handler in logging.getLogger().handlers:
+                if isinstance(handler, logging.StreamHandler):
+                    handler.setStream(devnull)
+
+        stats = requests.get(f"{standin_url}/_standin/stats", timeout=10).json()
+        context = {
+            "list_ids": [str(list_id) for list_id in stats["static_host_lists"]] or ["3001"],
+            "batch_size": args.batch_size,
+        }
+
+        results = {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+            "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+            "scenarios": {},
+        }
+
+        with AppServer(flask_app) as app_server:
+            for scenario in scenarios:
+                print(f"Running {scenario}...", file=sys.stderr)
+                with contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext():
+                    result = run_scenario(scenario, app_server.url, standin_url, args, context)
+                results["scenarios"][scenario] = result
+                print(f"  p50 {result['latency_ms']['p50']:.1f} ms, p95 {result['latency_ms']['p95']:.1f} ms, "
+                      f"p99 {result['latency_ms']['p99']:.1f} ms, {result['throughput_rps']:.1f} req/s, "
+                      f"{result['upstream_calls_per_request']:.1f} upstream calls/req, {result['errors']} errors",
+                      file=sys.stderr)
+
+        results["peak_rss_kb"] = _peak_rss_kb()
+
+    output = args.output
+    if not output:
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join('bench-results', f"{stamp}-{results['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Peak RSS {results['peak_rss_kb']} KB. Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
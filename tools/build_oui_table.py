@@ -0,0 +1,55 @@
+"""
+Build the OUI vendor table used by api/oui.py from IEEE's registry.
+
+Download the MA-L registry (https://standards-oui.ieee.org/oui/oui.csv), then run:
+
+    python -m tools.build_oui_table oui.csv
+
+which writes api/data/oui.tsv, or pass --output to write the table elsewhere and
+point OUI_TABLE_PATH at it. Only MA-L (24-bit) assignments are kept; the smaller
+MA-M and MA-S blocks are left out, so their MACs report the vendor of the
+enclosing MA-L block (usually "IEEE Registration Authority").
+"""
+import argparse
+import csv
+import os
+
+from api.oui import DEFAULT_TABLE_PATH
+
+HEADER = """\
+# OUI vendor table: 6 hex digits, tab, organization name; sorted by OUI.
+# Built from the IEEE MA-L registry with tools/build_oui_table.py.
+"""
+
+
+def read_registry(path):
+    """Return (oui, organization) pairs from an IEEE registry CSV."""
+    entries = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get("Registry", "MA-L") != "MA-L":
+                continue
+            oui = row["Assignment"].strip().upper()
+            organization = " ".join(row["Organization Name"].split())
+            if len(oui) == 6 and organization:
+                entries[oui] = organization
+    return sorted(entries.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the OUI vendor table from IEEE's oui.csv.")
+    parser.add_argument("registry", help="Path to oui.csv from the IEEE registry")
+    parser.add_argument("--output", default=DEFAULT_TABLE_PATH, help="Table to write (default: the bundled table)")
+    args = parser.parse_args()
+
+    entries = read_registry(args.registry)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(HEADER)
+        for oui, organization in entries:
+            f.write(f"{oui}\t{organization}\n")
+    print(f"Wrote {len(entries)} OUIs to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,436 @@
+"""
+Local stand-in for the ClearPass REST API, for benchmarks and manual testing.
+
+Implements the subset of the API that api/clearpass.py depends on:
+
+    POST  /api/oauth
+    GET   /api/endpoint?filter=...        POST /api/endpoint
+    GET   /api/static-host-list           POST /api/static-host-list
+    GET   /api/static-host-list/<id>      PATCH/PUT /api/static-host-list/<id>
+    POST  /api/device                     PUT /api/device
+    GET   /api/device/mac/<mac>           PATCH/PUT /api/device/mac/<mac>
+
+Latency, error injection, throttling and list sizes are configurable from the command
+line or at runtime via POST /_standin/config. Per-route call counters are available
+from GET /_standin/stats and can be cleared with POST /_standin/reset.
+
+Run it with:
+
+    python -m tools.clearpass_standin --port 8443 --lists 5 --list-size 10000
+
+and point the web app at it with CLEARPASS_BASE_URL=http://127.0.0.1:8443.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+DEFAULT_CONFIG = {
+    "latency_ms": 0.0,          # Fixed delay added to every API call
+    "jitter_ms": 0.0,           # Extra uniformly distributed delay on top of latency_ms
+    "error_rate": 0.0,          # Fraction of API calls answered with HTTP 500
+    "rate_limit": 0.0,          # Requests per second before HTTP 429 (0 disables throttling)
+    "burst": 50,                # Token bucket size for rate_limit
+    "lists": 3,                 # Number of static host lists created at startup
+    "list_size": 100,           # Entries in each static host list at startup
+    "endpoints": 0,             # Endpoints created at startup
+    "token_lifetime": 28800,    # expires_in reported for OAuth tokens
+    "require_auth": True,       # Reject API calls without a token issued by /api/oauth
+    "seed": 1,                  # Seed for generated MAC addresses
+}
+
+# Replaces IDs and MAC addresses in paths so stats group by route
+_PATH_ID_PATTERN = re.compile(r'/(\d+|[0-9A-Fa-f]{2}([:-]?[0-9A-Fa-f]{2}){5})(?=/|$)')
+
+
+def _normalize_mac(mac_address):
+    return mac_address.replace(':', '').replace('-', '').replace('.', '').lower()
+
+
+def _random_mac(rng):
+    return '-'.join(f"{rng.randrange(256):02X}" for _ in range(6))
+
+
+class StandinState:
+    """In-memory ClearPass data plus call counters, guarded by one lock."""
+
+    def __init__(self, config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.lock = threading.Lock()
+        self.reset_data()
+
+    def reset_data(self):
+        """Recreate the generated lists and endpoints and clear all counters."""
+        rng = random.Random(self.config["seed"])
+        with self.lock:
+            self.tokens = set()
+            self.static_host_lists = {}
+            self.endpoints = {}
+            self.devices = {}
+            self.next_list_id = 3001
+            self.next_endpoint_id = 1
+            self.next_device_id = 1
+            self.calls = Counter()
+            self.statuses = Counter()
+            self.bucket_tokens = float(self.config["burst"])
+            self.bucket_updated = time.monotonic()
+
+            for n in range(int(self.config["lists"])):
+                list_id = self.next_list_id
+                self.next_list_id += 1
+                self.static_host_lists[list_id] = {
+                    "id": list_id,
+                    "name": f"Standin List {n + 1}",
+                    "description": "Generated by the ClearPass stand-in",
+                    "host_format": "list",
+                    "host_type": "MACAddress",
+                    "host_entries": [
+                        {"host_address": _random_mac(rng), "host_address_desc": f"Generated host {i + 1}"}
+                        for i in range(int(self.config["list_size"]))
+                    ]
+                }
+
+            for _ in range(int(self.config["endpoints"])):
+                mac = _random_mac(rng).replace('-', ':').lower()
+                self._create_endpoint({"mac_address": mac, "status": "Known"})
+
+    def _create_endpoint(self, data):
+        endpoint = dict(data)
+        endpoint["id"] = self.next_endpoint_id
+        self.next_endpoint_id += 1
+        self.endpoints[_normalize_mac(data["mac_address"])] = endpoint
+        return endpoint
+
+    def take_rate_token(self):
+        """Token-bucket throttle. Returns False if the caller should get a 429."""
+        rate = float(self.config["rate_limit"])
+        if rate <= 0:
+            return True
+
+        with self.lock:
+            now = time.monotonic()
+            burst = float(self.config["burst"])
+            self.bucket_tokens = min(burst, self.bucket_tokens + (now - self.bucket_updated) * rate)
+            self.bucket_updated = now
+            if self.bucket_tokens < 1:
+                return False
+            self.bucket_tokens -= 1
+            return True
+
+
+def create_standin_app(**config):
+    """
+    Build the stand-in Flask app.
+
+    Args:
+        **config: Overrides for DEFAULT_CONFIG
+
+    Returns:
+        The Flask app; its StandinState is available as app.config["STANDIN_STATE"]
+    """
+    app = Flask(__name__)
+    state = StandinState(config)
+    app.config["STANDIN_STATE"] = state
+
+    def error(status, detail):
+        return jsonify({"type": "about:blank", "title": "Error", "status": status, "detail": detail}), status
+
+    @app.before_request
+    def simulate_upstream():
+        if request.path.startswith('/_standin'):
+            return None
+
+        route = f"{request.method} {_PATH_ID_PATTERN.sub('/{id}', request.path)}"
+        with state.lock:
+            state.calls[route] += 1
+
+        cfg = state.config
+        delay = float(cfg["latency_ms"]) + random.uniform(0, float(cfg["jitter_ms"]))
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if not state.take_rate_token():
+            return error(429, "Too many requests")
+
+        if cfg["error_rate"] and random.random() < float(cfg["error_rate"]):
+            return error(500, "Injected error")
+
+        if cfg["require_auth"] and request.path != '/api/oauth':
+            auth = request.headers.get('Authorization', '')
+            token = auth[7:] if auth.startswith('Bearer ') else None
+            with state.lock:
+                valid = token in state.tokens
+            if not valid:
+                return error(401, "Invalid or missing access token")
+
+        return None
+
+    @app.after_request
+    def count_status(response):
+        if not request.path.startswith('/_standin'):
+            with state.lock:
+                state.statuses[str(response.status_code)] += 1
+        return response
+
+    @app.route('/api/oauth', methods=['POST'])
+    def oauth():
+        data = request.get_json(silent=True) or {}
+        if data.get('grant_type') != 'client_credentials' or not data.get('client_id'):
+            return error(400, "Invalid OAuth request")
+
+        token = uuid.uuid4().hex
+        with state.lock:
+            state.tokens.add(token)
+
+        return jsonify({
+            "access_token": token,
+            "expires_in": int(state.config["token_lifetime"]),
+            "token_type": "Bearer",
+            "scope": None
+        })
+
+    @app.route('/api/endpoint', methods=['GET'])
+    def list_endpoints():
+        items = []
+        with state.lock:
+            filter_arg = request.args.get('filter')
+            if filter_arg:
+                try:
+                    mac = json.loads(filter_arg).get('mac_address', '')
+                except (ValueError, AttributeError):
+                    return error(400, "Invalid filter")
+                endpoint = state.endpoints.get(_normalize_mac(mac))
+                if endpoint:
+                    items.append(endpoint)
+            else:
+                items = list(state.endpoints.values())[:int(request.args.get('limit', 25))]
+
+            return jsonify({"_embedded": {"items": items}})
+
+    @app.route('/api/endpoint', methods=['POST'])
+    def create_endpoint():
+        data = request.get_json(silent=True) or {}
+        if not data.get('mac_address'):
+            return error(422, "mac_address is required")
+
+        with state.lock:
+            if _normalize_mac(data['mac_address']) in state.endpoints:
+                return error(422, "Endpoint already exists")
+            return jsonify(state._create_endpoint(data)), 201
+
+    @app.route('/api/static-host-list', methods=['GET'])
+    def list_static_host_lists():
+        with state.lock:
+            return jsonify({"_embedded": {"items": list(state.static_host_lists.values())}})
+
+    @app.route('/api/static-host-list', methods=['POST'])
+    def create_static_host_list():
+        data = request.get_json(silent=True) or {}
+        if not data.get('name'):
+            return error(422, "name is required")
+
+        with state.lock:
+            list_id = state.next_list_id
+            state.next_list_id += 1
+            host_list = {
+                "id": list_id,
+                "name": data['name'],
+                "description": data.get('description', ''),
+                "host_format": data.get('host_format', 'list'),
+                "host_type": data.get('host_type', 'MACAddress'),
+                "host_entries": data.get('host_entries', [])
+            }
+            state.static_host_lists[list_id] = host_list
+            return jsonify(host_list), 201
+
+    @app.route('/api/static-host-list/<int:list_id>', methods=['GET'])
+    def get_static_host_list(list_id):
+        with state.lock:
+            host_list = state.static_host_lists.get(list_id)
+            if not host_list:
+                return error(404, f"Static host list {list_id} not found")
+            return jsonify(host_list)
+
+    @app.route('/api/static-host-list/<int:list_id>', methods=['PATCH', 'PUT'])
+    def update_static_host_list(list_id):
+        data = request.get_json(silent=True) or {}
+        with state.lock:
+            host_list = state.static_host_lists.get(list_id)
+            if not host_list:
+                return error(404, f"Static host list {list_id} not found")
+
+            if 'host_entries' in data and not isinstance(data['host_entries'], list):
+                return error(422, "host_entries must be a list")
+
+            for field in ("name", "description", "host_format", "host_type", "host_entries"):
+                if field in data:
+                    host_list[field] = data[field]
+            return jsonify(host_list)
+
+    @app.route('/api/device', methods=['POST', 'PUT'])
+    def create_device():
+        data = request.get_json(silent=True) or {}
+        mac = data.get('mac') or data.get('mac_address')
+        if not mac:
+            return error(422, "mac is required")
+
+        with state.lock:
+            key = _normalize_mac(mac)
+            if key in state.devices and request.method == 'POST':
+                return error(422, "Device already exists")
+
+            device = dict(data)
+            device["id"] = state.devices.get(key, {}).get("id") or state.next_device_id
+            if device["id"] == state.next_device_id:
+                state.next_device_id += 1
+            state.devices[key] = device
+            return jsonify(device), 201
+
+    @app.route('/api/device/mac/<mac>', methods=['GET'])
+    def get_device(mac):
+        with state.lock:
+            device = state.devices.get(_normalize_mac(mac))
+            if not device:
+                return error(404, f"Device {mac} not found")
+            return jsonify(device)
+
+    @app.route('/api/device/mac/<mac>', methods=['PATCH', 'PUT'])
+    def update_device(mac):
+        data = request.get_json(silent=True) or {}
+        with state.lock:
+            key = _normalize_mac(mac)
+            device = state.devices.get(key)
+            if not device:
+                return error(404, f"Device {mac} not found")
+
+            if request.method == 'PUT':
+                device = dict(data, id=device["id"])
+            else:
+                device.update(data)
+            state.devices[key] = device
+            return jsonify(device)
+
+    @app.route('/_standin/stats', methods=['GET'])
+    def stats():
+        with state.lock:
+            return jsonify({
+                "calls": dict(state.calls),
+                "statuses": dict(state.statuses),
+                "total_calls": sum(state.calls.values()),
+                "static_host_lists": {list_id: len(host_list["host_entries"]) for list_id, host_list in state.static_host_lists.items()},
+                "endpoints": len(state.endpoints),
+                "devices": len(state.devices)
+            })
+
+    @app.route('/_standin/reset', methods=['POST'])
+    def reset():
+        if (request.get_json(silent=True) or {}).get('data'):
+            state.reset_data()
+        else:
+            with state.lock:
+                state.calls.clear()
+                state.statuses.clear()
+        return jsonify({"success": True})
+
+    @app.route('/_standin/config', methods=['GET', 'POST'])
+    def configure():
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            unknown = set(data) - set(DEFAULT_CONFIG)
+            if unknown:
+                return jsonify({"success": False, "message": f"Unknown settings: {', '.join(sorted(unknown))}"}), 400
+            with state.lock:
+                state.config.update(data)
+        return jsonify({"success": True, "config": state.config})
+
+    @app.errorhandler(404)
+    def not_found(e):
+        return error(404, f"No route for {request.method} {request.path}")
+
+    @app.errorhandler(405)
+    def method_not_allowed(e):
+        return error(405, f"Method {request.method} not allowed for {request.path}")
+
+    return app
+
+
+class StandinServer:
+    """
+    Run the stand-in on a background thread, e.g. from a benchmark script.
+
+    Usage:
+        with StandinServer(latency_ms=20, list_size=5000) as server:
+            os.environ["CLEARPASS_BASE_URL"] = server.url
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, **config):
+        self.app = create_standin_app(**config)
+        self._server = make_server(host, port, self.app, threaded=True)
+        self.url = f"http://{host}:{self._server.server_port}"
+        self._thread = None
+
+    @property
+    def state(self):
+        return self.app.config["STANDIN_STATE"]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="clearpass-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the ClearPass REST API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG["latency_ms"])
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_CONFIG["jitter_ms"])
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_CONFIG["error_rate"])
+    parser.add_argument('--rate-limit', type=float, default=DEFAULT_CONFIG["rate_limit"],
+                        help="Requests per second before answering 429 (0 disables)")
+    parser.add_argument('--burst', type=int, default=DEFAULT_CONFIG["burst"])
+    parser.add_argument('--lists', type=int, default=DEFAULT_CONFIG["lists"])
+    parser.add_argument('--list-size', type=int, default=DEFAULT_CONFIG["list_size"])
+    parser.add_argument('--endpoints', type=int, default=DEFAULT_CONFIG["endpoints"])
+    parser.add_argument('--token-lifetime', type=int, default=DEFAULT_CONFIG["token_lifetime"])
+    parser.add_argument('--no-auth', action='store_true', help="Accept API calls without a token")
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG["seed"])
+    args = parser.parse_args()
+
+    app = create_standin_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        lists=args.lists,
+        list_size=args.list_size,
+        endpoints=args.endpoints,
+        token_lifetime=args.token_lifetime,
+        require_auth=not args.no_auth,
+        seed=args.seed
+    )
+
+    print(f"ClearPass stand-in listening on http://{args.host}:{args.port}")
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Local stand-in for an OTLP/HTTP trace collector, and a viewer for trace files.
+
+Accepts the JSON encoding of OTLP traces on POST /v1/traces, which is what the web
+app sends with TRACE_EXPORTER=otlp, and keeps the spans in memory:
+
+    GET  /_collector/traces              one summary per trace, newest first
+    GET  /_collector/traces/<trace_id>   the trace's spans, parents before children
+    POST /_collector/reset               forget everything
+
+Run it with:
+
+    python -m tools.trace_collector --port 4318 --print
+
+and point the web app at it with TRACE_EXPORTER=otlp. --print writes a tree of every
+request trace as it completes. Traces written by TRACE_EXPORTER=file can be viewed
+with the same layout:
+
+    python -m tools.trace_collector --file traces.jsonl
+"""
+import argparse
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+_KIND_NAMES = {1: "internal", 2: "server", 3: "client"}
+
+
+def _attribute_value(value):
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    if "intValue" in value:
+        return int(value["intValue"])
+    return None
+
+
+def _from_otlp(span):
+    """Convert an OTLP JSON span to the flat layout used by the file exporter."""
+    start, end = int(span["startTimeUnixNano"]), int(span["endTimeUnixNano"])
+    status = span.get("status", {})
+    return {
+        "trace_id": span["traceId"],
+        "span_id": span["spanId"],
+        "parent_span_id": span.get("parentSpanId") or None,
+        "name": span["name"],
+        "kind": _KIND_NAMES.get(span.get("kind"), "internal"),
+        "start_time_unix_nano": start,
+        "end_time_unix_nano": end,
+        "duration_ms": (end - start) / 1e6,
+        "attributes": {item["key"]: _attribute_value(item["value"]) for item in span.get("attributes", [])},
+        "status": {"code": "ERROR" if status.get("code") == 2 else "OK", "message": status.get("message")}
+    }
+
+
+def order_spans(spans):
+    """Return (depth, span) pairs with every span after its parent, siblings by start time."""
+    by_id = {span["span_id"]: span for span in spans}
+    children = {}
+    roots = []
+    for span in sorted(spans, key=lambda s: s["start_time_unix_nano"]):
+        parent_id = span.get("parent_span_id")
+        if parent_id and parent_id in by_id:
+            children.setdefault(parent_id, []).append(span)
+        else:
+            roots.append(span)
+
+    ordered = []
+    stack = [(0, span) for span in reversed(roots)]
+    while stack:
+        depth, span = stack.pop()
+        ordered.append((depth, span))
+        stack.extend((depth + 1, child) for child in reversed(children.get(span["span_id"], [])))
+    return ordered
+
+
+def format_trace(spans):
+    """Render a trace as an indented tree with each span's offset and duration."""
+    ordered = order_spans(spans)
+    if not ordered:
+        return ""
+
+    origin = min(span["start_time_unix_nano"] for span in spans)
+    lines = [f"trace {spans[0]['trace_id']}"]
+    for depth, span in ordered:
+        offset = (span["start_time_unix_nano"] - origin) / 1e6
+        flag = "  !" if span["status"]["code"] == "ERROR" else ""
+        lines.append(f"  {offset:9.1f}ms {span['duration_ms']:9.1f}ms  {'  ' * depth}{span['name']}{flag}")
+    return "\n".join(lines)
+
+
+class CollectorState:
+    """Spans received so far, grouped by trace ID."""
+
+    def __init__(self, max_traces=1000):
+        self.max_traces = max_traces
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, spans):
+        """Store spans and return the traces whose root span arrived in this batch."""
+        completed = []
+        with self.lock:
+            for span in spans:
+                trace = self.traces.setdefault(span["trace_id"], [])
+                trace.append(span)
+                if span["parent_span_id"] is None:
+                    completed.append(span["trace_id"])
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+            return [list(self.traces[trace_id]) for trace_id in completed if trace_id in self.traces]
+
+
+def create_collector_app(on_trace=None, max_traces=1000):
+    """
+    Build the collector Flask app.
+
+    Args:
+        on_trace: Optional function called with the spans of each trace when its root span arrives
+        max_traces: Traces kept in memory before the oldest are dropped
+    """
+    app = Flask(__name__)
+    state = CollectorState(max_traces)
+    app.config["COLLECTOR_STATE"] = state
+
+    @app.route('/v1/traces', methods=['POST'])
+    def receive_traces():
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return jsonify({"error": "Expected the OTLP JSON encoding"}), 415
+
+        spans = [
+            _from_otlp(span)
+            for resource_spans in payload.get("resourceSpans", [])
+            for scope_spans in resource_spans.get("scopeSpans", [])
+            for span in scope_spans.get("spans", [])
+        ]
+        for trace in state.add(spans):
+            if on_trace:
+                on_trace(trace)
+        return jsonify({"partialSuccess": {}})
+
+    @app.route('/_collector/traces')
+    def list_traces():
+        with state.lock:
+            traces = list(state.traces.items())
+        summaries = []
+        for trace_id, spans in reversed(traces):
+            root = next((span for span in spans if span["parent_span_id"] is None), None)
+            summaries.append({
+                "trace_id": trace_id,
+                "name": root["name"] if root else None,
+                "duration_ms": root["duration_ms"] if root else None,
+                "spans": len(spans),
+                "errors": sum(1 for span in spans if span["status"]["code"] == "ERROR")
+            })
+        return jsonify(summaries)
+
+    @app.route('/_collector/traces/<trace_id>')
+    def get_trace(trace_id):
+        with state.lock:
+            spans = list(state.traces.get(trace_id, []))
+        if not spans:
+            return jsonify({"error": "Unknown trace"}), 404
+        return jsonify([dict(span, depth=depth) for depth, span in order_spans(spans)])
+
+    @app.route('/_collector/reset', methods=['POST'])
+    def reset():
+        with state.lock:
+            state.traces.clear()
+        return jsonify({"success": True})
+
+    return app
+
+
+class CollectorServer:
+    """
+    Run the collector on a background thread.
+
+    Usage:
+        with CollectorServer() as collector:
+            os.environ["OTLP_ENDPOINT"] = f"{collector.url}/v1/traces"
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_trace=None):
+        self.app = create_collector_app(on_trace=on_trace)
+        self._server = make_server(host, port, self.app, threaded=True)
+        self.url = f"http://{host}:{self._server.server_port}"
+        self._thread = None
+
+    @property
+    def state(self):
+        return self.app.config["COLLECTOR_STATE"]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="trace-collector", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def print_trace_file(path):
+    """Print every trace in a TRACE_EXPORTER=file output file."""
+    traces = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                span = json.loads(line)
+                traces.setdefault(span["trace_id"], []).append(span)
+
+    for spans in traces.values():
+        print(format_trace(spans))
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OTLP/HTTP trace collector, or print a trace file.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--print', dest='print_traces', action='store_true',
+                        help="Print each trace as a tree when it completes")
+    parser.add_argument('--file', help="Print the traces in a JSONL trace file and exit")
+    args = parser.parse_args()
+
+    if args.file:
+        print_trace_file(args.file)
+        return
+
+    def show(spans):
+        print(format_trace(spans), flush=True)
+
+    app = create_collector_app(on_trace=show if args.print_traces else None)
+    print(f"Trace collector listening on http://{args.host}:{args.port}/v1/traces")
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+See gunicorn.conf.py for worker and keep-alive settings.
+"""
+from app import create_app
+
+app = application = create_app()